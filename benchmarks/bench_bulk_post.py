@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Provisioning time of 500 EPGs: one api_post per object versus api_post_bulk, on a mock APIC answering in 20ms.
+Run from the repository root: python -m benchmarks.bench_bulk_post
+"""
+
+import time
+from libs import apic
+from benchmarks.mock_server import MockServer
+
+OBJECTS = 500
+LATENCY = 0.02
+
+epgs = [{"fvAEPg": {"attributes": {"dn": f"uni/tn-Tenant{index % 5}/ap-App/epg-Epg{index}", "name": f"Epg{index}"},
+                    "children": [{"fvRsBd": {"attributes": {"tnFvBDName": f"Bd{index}"}}}]}}
+        for index in range(OBJECTS)]
+
+
+def run(label, call):
+    start = time.perf_counter()
+    failed = call()
+    print(f"{label:<28} {time.perf_counter() - start:>8.3f} s, {failed} failed")
+
+
+with MockServer(latency=LATENCY) as server:
+    with apic.Apic(server.address) as apic_conn:
+        apic_conn.url = f"http://{server.address}/api"
+        apic_conn.get_apic_token({"username": "admin", "password": "", "domain": ""})
+        run("api_post per object", lambda: sum(1 for epg in epgs
+                                               if not apic_conn.api_post(f"mo/{epg['fvAEPg']['attributes']['dn']}.json",
+                                                                         json_body=epg)))
+        run("api_post_bulk", lambda: sum(1 for result in apic_conn.api_post_bulk(epgs) if not result.success))
+        run("api_post_bulk 100 per POST", lambda: sum(1 for result in apic_conn.api_post_bulk(epgs, max_objects=100)
+                                                      if not result.success))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+CPU cost of extracting tags from DNs: the per-record re.findall calls used by the demos versus libs.dn. Each is run
+cold, the first poll with empty caches, then warm, the same fabric polled again, best of 3.
+Run from the repository root: python -m benchmarks.bench_dn_parse
+"""
+
+import re
+import time
+from libs import dn
+from benchmarks.mock_server import _ethpm_phys_if, _vlan_ckt_ep
+
+INTERFACES = 100000
+VLANS = 20000
+
+ports = [_ethpm_phys_if(index)["ethpmPhysIf"]["attributes"] for index in range(INTERFACES)]
+vlans = [_vlan_ckt_ep(index)["vlanCktEp"]["attributes"] for index in range(VLANS)]
+
+
+def with_findall():
+    for port in ports:
+        (re.findall(r"/pod-(\d+)/", port["dn"])[0], re.findall(r"/node-(\d+)/", port["dn"])[0],
+         re.findall(r"eth(\d+/\d+)]/", port["dn"])[0])
+    for vlan in vlans:
+        (re.findall(r"/pod-(\d+)/", vlan["dn"])[0], re.findall(r"/node-(\d+)/", vlan["dn"])[0],
+         re.findall(r"tn-([a-zA-Z0-9_.:-]+)/", vlan["epgDn"])[0], re.findall(r"ap-([a-zA-Z0-9_.:-]+)/", vlan["epgDn"])[0],
+         re.findall(r"epg-([a-zA-Z0-9_.:-]+)", vlan["epgDn"])[0], re.findall(r"vlan-(\d+)", vlan["dn"])[0])
+
+
+def with_dn_parser():
+    for port in dn.parse_many(port["dn"] for port in ports):
+        (port.pod, port.node, port.port)
+    for vlan in vlans:
+        parsed, epg = dn.parse(vlan["dn"]), dn.parse(vlan["epgDn"])
+        (parsed.pod, parsed.node, epg.tenant, epg.ap, epg.epg, parsed.vlan)
+
+
+def run(label, call, repeat=1):
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        elapsed.append(time.perf_counter() - start)
+    print(f"{label:<28} {min(elapsed):>8.3f} s")
+
+
+re.purge()
+dn.split.cache_clear()
+run("re.findall per record cold", with_findall)
+run("libs.dn cold", with_dn_parser)
+run("re.findall per record warm", with_findall, 3)
+run("libs.dn warm", with_dn_parser, 3)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+CPU time and peak memory of libs.jsonstream.iter_items on APIC like answers fed in 64 KiB chunks: many small
+records, and a single multi-MB record (an rsp-subtree=full query on a large tenant) spread over hundreds of chunks.
+Run from the repository root: python -m benchmarks.bench_jsonstream
+"""
+
+import json
+import time
+import tracemalloc
+from libs.jsonstream import iter_items
+from benchmarks.mock_server import _ethpm_phys_if
+
+CHUNK_SIZE = 65536
+RECORDS = 20000
+# Children of the single large record, about 5 MiB of json
+CHILDREN = 8000
+
+
+def document(records):
+    return json.dumps({"totalCount": str(len(records)), "imdata": records}).encode()
+
+
+def chunked(payload):
+    return (payload[start:start + CHUNK_SIZE] for start in range(0, len(payload), CHUNK_SIZE))
+
+
+def run(label, payload):
+    start = time.perf_counter()
+    items = sum(1 for _ in iter_items(chunked(payload), "imdata"))
+    elapsed = time.perf_counter() - start
+    # Traced separately, tracemalloc slows allocations down a lot
+    tracemalloc.start()
+    sum(1 for _ in iter_items(chunked(payload), "imdata"))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<28} {len(payload) / 2 ** 20:>6.1f} MiB {items:>8} items {elapsed:>8.3f} s  "
+          f"peak {peak / 2 ** 20:>6.1f} MiB")
+
+
+small = document([_ethpm_phys_if(index) for index in range(RECORDS)])
+large = document([{"fvTenant": {"attributes": {"dn": "uni/tn-large", "name": "large"},
+                                "children": [_ethpm_phys_if(index) for index in range(CHILDREN)]}}])
+run("many small records", small)
+run("one multi-MB record", large)
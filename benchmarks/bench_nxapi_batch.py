@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Latency of collecting 10 show outputs from a switch: one show_command per command versus a single show_commands
+batch, on a mock NX-API answering in 5ms and 20ms.
+Run from the repository root: python -m benchmarks.bench_nxapi_batch
+"""
+
+import time
+from libs import nxapi
+from benchmarks.mock_server import MockServer, MockNxapiHandler
+
+COMMANDS = ["show version", "show interface brief", "show vlan brief", "show ip route", "show mac address-table",
+            "show lldp neighbors", "show cdp neighbors", "show port-channel summary", "show vpc", "show ip arp"]
+ROUNDS = 20
+
+
+def run(label, call):
+    latencies = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"{label:<36} p50 {latencies[ROUNDS // 2] * 1000:>8.1f} ms  max {latencies[-1] * 1000:>8.1f} ms")
+
+
+for latency in (0.005, 0.02):
+    with MockServer(MockNxapiHandler, latency=latency) as server:
+        with nxapi.Nexus_api(server.address, {"username": "admin", "password": ""}) as switch:
+            switch.url = f"http://{server.address}/ins"
+            run(f"show_command x10, {latency * 1000:.0f}ms switch", lambda: [switch.show_command(command)
+                                                                          for command in COMMANDS])
+            run(f"show_commands, {latency * 1000:.0f}ms switch", lambda: switch.show_commands(COMMANDS))
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Peak client memory and time of a large show command: one answer, chunk mode reassembled, and chunk mode streamed
+row by row. The mock NX-API runs in its own process so its memory is not measured, its serving speed bounds the
+times.
+Run from the repository root: python -m benchmarks.bench_nxapi_stream
+"""
+
+import sys
+import json
+import time
+import subprocess
+import tracemalloc
+from libs import nxapi
+
+ROWS = 200000
+
+server = subprocess.Popen([sys.executable, "-m", "benchmarks.mock_server", "nxapi", "--counts",
+                           json.dumps({"rows": ROWS})], stdout=subprocess.PIPE, text=True)
+
+
+def run(label, call):
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = call()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<28} {rows:>8} rows {elapsed:>8.2f} s  peak {peak / 2 ** 20:>8.1f} MiB")
+
+
+try:
+    address = server.stdout.readline().strip()
+    with nxapi.Nexus_api(address, {"username": "admin", "password": ""}) as switch:
+        switch.url = f"http://{address}/ins"
+        run("show_command", lambda: len(switch.show_command("show mac")["TABLE_mac"]["ROW_mac"]))
+        run("show_command chunked", lambda: len(switch.show_command("show mac", chunked=True)["TABLE_mac"]["ROW_mac"]))
+        run("show_command_stream", lambda: sum(1 for _ in switch.show_command_stream("show mac", "ROW_mac")))
+finally:
+    server.terminate()
+    server.wait()
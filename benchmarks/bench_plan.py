@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Time of libs.apic_plan.diff on growing tenant trees, one object in ten modified: it should grow linearly.
+Run from the repository root: python -m benchmarks.bench_plan
+"""
+
+import time
+from libs.apic_plan import diff
+
+SIZES = (10000, 20000, 40000, 80000)
+
+
+def tenant(epgs, descr):
+    """A tenant with one application profile per 100 EPGs, every EPG with a BD relation"""
+    aps = []
+    for ap in range(0, epgs, 100):
+        aps.append({"fvAp": {"attributes": {"rn": f"ap-App{ap}", "name": f"App{ap}"}, "children": [
+            {"fvAEPg": {"attributes": {"rn": f"epg-Epg{index}", "name": f"Epg{index}",
+                                       "descr": descr if index % 10 == 0 else ""},
+                        "children": [{"fvRsBd": {"attributes": {"rn": "rsbd", "tnFvBDName": f"Bd{index}"}}}]}}
+            for index in range(ap, min(ap + 100, epgs))]}})
+    return [{"fvTenant": {"attributes": {"dn": "uni/tn-Bench", "name": "Bench"}, "children": aps}}]
+
+
+for size in SIZES:
+    current, desired = tenant(size, "old"), tenant(size, "new")
+    start = time.perf_counter()
+    plan = diff(current, desired, prune=True)
+    elapsed = time.perf_counter() - start
+    objects = size * 2 + size // 100 + 1
+    print(f"{objects:>8} objects {elapsed:>8.3f} s {elapsed / objects * 1e6:>6.2f} us/object "
+          f"{len(plan.modified)} modified")
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Bytes on the wire and parsed size of the demo queries, with and without narrowing the returned properties.
+Run from the repository root: python -m benchmarks.bench_query_size
+"""
+
+import json
+from libs import apic
+from libs.aci_query import AciQuery, ne, wcard
+from benchmarks.mock_server import MockServer
+
+QUERIES = {
+    "ports": AciQuery.for_class("ethpmPhysIf", properties=["dn", "operSt"]),
+    "faults": AciQuery.for_class("faultInfo", query_target_filter=ne("faultInfo.severity", "cleared"),
+                                 properties=["dn", "ack", "severity", "domain", "type", "code", "lc"]),
+    "vlans": AciQuery.for_class("vlanCktEp", query_target_filter=wcard("vlanCktEp.epgDn", "epg"),
+                                properties=["dn", "epgDn"]),
+    "tenants": AciQuery.for_class("fvTenant", rsp_prop_include="naming-only", properties=["dn", "name"]),
+}
+
+with MockServer() as server:
+    with apic.Apic(server.address) as apic_conn:
+        apic_conn.url = f"http://{server.address}/api"
+        apic_conn.get_apic_token({"username": "admin", "password": "", "domain": ""})
+        print(f"{'query':<10}{'full bytes':>12}{'narrowed bytes':>16}{'full parsed':>14}{'projected':>12}")
+        for name, query in QUERIES.items():
+            full = apic_conn.api_get(AciQuery(query.target).to_url(apic_conn.url))
+            narrowed = apic_conn.api_get(query.to_url(apic_conn.url))
+            projected = apic_conn.get_aci_object(query)
+            print(f"{name:<10}{len(full.content):>12}{len(narrowed.content):>16}"
+                  f"{len(json.dumps(full.json())):>14}{len(json.dumps(projected)):>12}")
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Requests/sec of one-shot requests.get calls versus the pooled session owned by an Apic handle.
+Run from the repository root: python -m benchmarks.bench_sessions
+"""
+
+import time
+import requests
+from libs import apic
+from benchmarks.mock_server import MockServer
+
+REQUESTS = 500
+
+
+def run(label, call):
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        call()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<20} {REQUESTS / elapsed:>10.1f} req/s")
+
+
+with MockServer() as server:
+    url = f"http://{server.address}/api"
+    run("requests.get", lambda: requests.get(f"{url}/class/fvTenant.json", cookies={"APIC-cookie": "x"}))
+
+    with apic.Apic(server.address) as apic_conn:
+        apic_conn.url = url
+        apic_conn.get_apic_token({"username": "admin", "password": "", "domain": ""})
+        run("Apic pooled session", lambda: apic_conn.api_get("class/fvTenant.json"))
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Minimal local emulation of the APIC, NDFC and NX-API REST APIs, used by the benchmarks.
+Speaks HTTP/1.1 so clients can keep connections alive. Result sizes and the answer latency are set per server:
+MockServer(MockApicHandler, counts={"ethpmPhysIf": 10000}, latency=0.02)
+"""
+
+import re
+import sys
+import json
+import time
+import base64
+import argparse
+import itertools
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Properties returned for rsp-prop-include=naming-only / config-only, on top of dn
+NAMING = {"fvTenant": ["name"], "vlanCktEp": ["encap"]}
+CONFIG = {"fvTenant": ["name", "descr", "nameAlias", "annotation"],
+          "vlanCktEp": ["encap", "name", "descr"]}
+
+
+def _ethpm_phys_if(index):
+    node, port = 101 + index // 48, 1 + index % 48
+    return {"ethpmPhysIf": {"attributes": {
+        "dn": f"topology/pod-1/node-{node}/sys/phys-[eth1/{port}]/phys", "operSt": "up" if index % 3 else "down",
+        "operSpeed": "10G", "operDuplex": "full", "operMode": "trunk", "operStQual": "none", "accessVlan": "vlan-1",
+        "allowedVlans": "10-20,100", "operVlans": "10-20", "nativeVlan": "vlan-1", "backplaneMac": "00:11:22:33:44:55",
+        "bundleIndex": "unspecified", "intfT": "phy", "iod": str(port), "media": "sfp", "resetCtr": "2",
+        "lastLinkStChg": "2023-06-21T10:00:00.000+00:00", "usage": "discovery", "childAction": "", "status": "",
+        "modTs": "never", "operRouterMac": "00:00:00:00:00:00", "primaryVlan": "unknown", "operFecMode": "auto",
+        "operErrDisQual": "none", "numOfSI": "0", "txT": "unknown", "dcxPfcOperSt": "off"}}}
+
+
+def _fault_inst(index):
+    return {"faultInst": {"attributes": {
+        "dn": f"topology/pod-1/node-{101 + index % 10}/sys/phys-[eth1/{1 + index % 48}]/fault-F{1000 + index}",
+        "ack": "no", "severity": ("major", "minor", "warning")[index % 3], "domain": "access", "type": "communications",
+        "code": f"F{1000 + index}", "lc": "raised", "cause": "interface-physical-down", "created": "2023-06-21T10:00:00",
+        "descr": "Port is down, reason:err-disabled(err-disabled), used by:EPG", "highestSeverity": "major",
+        "occur": "1", "origSeverity": "major", "prevSeverity": "major", "rule": "ethpm-if-port-down-infra",
+        "subject": "port-down", "lastTransition": "2023-06-21T10:00:00", "delegated": "no", "rn": f"fault-F{1000 + index}"}}}
+
+
+def _vlan_ckt_ep(index):
+    node, vlan = 101 + index % 10, 10 + index // 10
+    return {"vlanCktEp": {"attributes": {
+        "dn": f"topology/pod-1/node-{node}/sys/ctx-[vxlan-2162688]/bd-[vxlan-15826915]/vlan-[vlan-{vlan}]",
+        "epgDn": f"uni/tn-Tenant{index % 5}/ap-App{index % 3}/epg-Epg{vlan}", "encap": f"vlan-{vlan}",
+        "name": f"Tenant{index % 5}:App{index % 3}:Epg{vlan}", "descr": "", "adminSt": "active", "operSt": "up",
+        "fabEncap": f"vxlan-{8000 + vlan}", "pcTag": str(16000 + vlan), "ctrl": "", "modTs": "never"}}}
+
+
+def _fv_tenant(index):
+    name = "common" if index == 0 else f"Tenant{index}"
+    return {"fvTenant": {"attributes": {
+        "dn": f"uni/tn-{name}", "name": name, "descr": "", "nameAlias": "", "annotation": "", "childAction": "",
+        "lcOwn": "local", "modTs": "never", "monPolDn": "uni/tn-common/monepg-default", "ownerKey": "",
+        "ownerTag": "", "status": "", "uid": "15374", "userdom": ":all:"}}}
+
+
+RECORDS = {"ethpmPhysIf": _ethpm_phys_if, "faultInfo": _fault_inst, "faultInst": _fault_inst,
+           "vlanCktEp": _vlan_ckt_ep, "fvTenant": _fv_tenant}
+
+
+def include_props(record, rsp_prop_include):
+    """Emulates rsp-prop-include on a record"""
+    if rsp_prop_include not in ("naming-only", "config-only"):
+        return record
+    class_name, body = next(iter(record.items()))
+    keep = ["dn"] + (NAMING if rsp_prop_include == "naming-only" else CONFIG).get(class_name, [])
+    return {class_name: {"attributes": {prop: body["attributes"][prop] for prop in keep if prop in body["attributes"]}}}
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    # Seconds spent by the controller before every answer
+    latency = 0.0
+    counts = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _reply(self, body, code=200):
+        if self.latency:
+            time.sleep(self.latency)
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockApicHandler(_MockHandler):
+    # Number of objects returned by class queries
+    counts = {"ethpmPhysIf": 1000, "faultInfo": 200, "faultInst": 200, "vlanCktEp": 500, "fvTenant": 10}
+
+    def _login(self):
+        return {"totalCount": "1", "imdata": [{"aaaLogin": {"attributes": {
+            "token": "mock-token", "refreshTimeoutSeconds": "600"}}}]}
+
+    def _class_query(self, class_name, query):
+        total = self.counts.get(class_name, 0)
+        start, stop = 0, total
+        if "page" in query:
+            page_size = int(query.get("page-size", ["10000"])[0])
+            start = int(query["page"][0]) * page_size
+            stop = min(start + page_size, total)
+        rsp_prop_include = query.get("rsp-prop-include", [None])[0]
+        imdata = [include_props(RECORDS[class_name](index), rsp_prop_include) for index in range(start, stop)]
+        return {"totalCount": str(total), "imdata": imdata}
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path, query = url.path, parse_qs(url.query)
+        if path.endswith("/aaaRefresh.json"):
+            self._reply(self._login())
+        elif "/class/" in path and path.split("/class/")[1][:-len(".json")] in RECORDS:
+            self._reply(self._class_query(path.split("/class/")[1][:-len(".json")], query))
+        elif path.endswith("/mo/topology/health.json"):
+            self._reply({"totalCount": "1", "imdata": [{"fabricHealthTotal": {"attributes": {
+                "dn": "topology/health", "cur": "95", "maxSev": "major", "prev": "95"}}}]})
+        elif "/mo/" in path and query.get("target-subtree-class", [None])[0] in RECORDS:
+            self._reply(self._class_query(query["target-subtree-class"][0], query))
+        elif "/class/" in path or "/mo/" in path:
+            self._reply({"totalCount": "0", "imdata": []})
+        else:
+            self._reply({"totalCount": "0", "imdata": []}, code=404)
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path.endswith("/aaaLogin.json"):
+            self._reply(self._login())
+        elif b"invalid" in body:
+            # Like the APIC, a payload with one bad object is rejected as a whole
+            self._reply({"totalCount": "1", "imdata": [{"error": {"attributes": {
+                "code": "103", "text": "Property name of an object is invalid"}}}]}, code=400)
+        else:
+            self._reply({"totalCount": "0", "imdata": []})
+
+
+def _ndfc_switch(fabric, index):
+    return {"serialNumber": f"9{index:010d}", "hostName": f"{fabric}-LEAF{101 + index}", "fabricName": fabric,
+            "ipAddress": f"10.0.{index // 250}.{1 + index % 250}", "model": "N9K-C93180YC-FX", "release": "10.2(5)",
+            "switchRole": "leaf", "status": "ok", "mode": "Normal", "systemMode": "Normal", "vdcId": 0}
+
+
+def _ndfc_interface(serial, index):
+    name = f"Ethernet1/{1 + index}" if index % 10 else f"loopback{index // 10}"
+    return {"serialNo": serial, "ifName": name, "ifType": "INTERFACE_ETHERNET" if index % 10 else "INTERFACE_LOOPBACK",
+            "adminStatusStr": "up" if index % 4 else "down", "operStatusStr": "up" if index % 3 else "down",
+            "speedStr": "10Gb", "mode": "trunk", "allowedVLANs": "none", "nativeVlanId": 1, "mtu": 9216,
+            "policyName": "int_trunk_host", "description": "", "fabricName": ""}
+
+
+class MockNdfcHandler(_MockHandler):
+    """NDFC LAN fabric API: login, fabrics, switches of a fabric, interfaces of a switch and VRFs"""
+    # fabrics: number of fabrics, switches: switches per fabric, interfaces: interfaces per switch
+    counts = {"fabrics": 2, "switches": 20, "interfaces": 54}
+    PREFIX = "/appcenter/cisco/ndfc/api/v1/lan-fabric/rest/"
+
+    def _fabrics(self):
+        return [f"FABRIC-{index}" for index in range(self.counts["fabrics"])]
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        # Ndfc joins its URL and the URI with an extra slash
+        path, query = re.sub("/+", "/", url.path), parse_qs(url.query)
+        if not path.startswith(self.PREFIX):
+            return self._reply({"error": "not found"}, code=404)
+        parts = path[len(self.PREFIX):].strip("/").split("/")
+        if parts == ["control", "fabrics"]:
+            self._reply([{"fabricName": name, "fabricType": "Switch_Fabric", "fabricTechnology": "VXLANFabric"}
+                         for name in self._fabrics()])
+        elif parts[:2] == ["control", "fabrics"] and parts[3:] == ["inventory", "switchesByFabric"]:
+            fabric = parts[2]
+            if fabric not in self._fabrics():
+                return self._reply({"error": f"fabric {fabric} not found"}, code=404)
+            self._reply([_ndfc_switch(fabric, index) for index in range(self.counts["switches"])])
+        elif parts == ["interface", "detail"] and "serialNumber" in query:
+            serial = query["serialNumber"][0]
+            self._reply([_ndfc_interface(serial, index) for index in range(self.counts["interfaces"])])
+        elif parts[:2] == ["top-down", "fabrics"] and parts[3:] == ["vrfs"]:
+            self._reply([{"fabric": parts[2], "vrfName": f"VRF{index}", "vrfId": 50000 + index}
+                         for index in range(10)])
+        else:
+            self._reply({"error": "not found"}, code=404)
+
+    def do_POST(self):
+        self._read_body()
+        if self.path == "/login":
+            claims = json.dumps({"exp": int(time.time()) + 1200}).encode()
+            jwt = "e30.%s.mock" % base64.urlsafe_b64encode(claims).decode().rstrip("=")
+            self._reply({"jwttoken": jwt, "username": "admin"})
+        else:
+            self._reply({})
+
+
+class MockNxapiHandler(_MockHandler):
+    """NX-API /ins with the ins_api format: cli_show and cli_conf, commands separated by " ;", and chunk mode"""
+    # Rows of the table returned by every show command
+    counts = {"rows": 48}
+    # Characters of json output per answer in chunk mode
+    chunk_size = 65536
+    # sid: (json output, offset of the next piece) of the chunked commands in progress
+    _sessions = {}
+    _sids = itertools.count(1)
+    _sessions_lock = threading.Lock()
+
+    def _show(self, command):
+        if command.startswith("show version"):
+            return {"host_name": "mock-nxos", "nxos_ver_str": "10.2(5)", "chassis_id": "Nexus9000 C93180YC-FX"}
+        table = re.sub(r"\W+", "_", command.split()[1] if len(command.split()) > 1 else command)
+        return {f"TABLE_{table}": {f"ROW_{table}": [
+            {"interface": f"Ethernet1/{1 + index}", "state": "up" if index % 3 else "down", "vlan": str(10 + index),
+             "desc": f"row {index} of {command}"} for index in range(self.counts["rows"])]}}
+
+    def _output(self, kind, command):
+        if not command or command.startswith("invalid"):
+            return {"input": command, "msg": "Input CLI command error", "code": "400", "clierror": "% Invalid command\n"}
+        body = self._show(command) if kind == "cli_show" else {}
+        return {"input": command, "msg": "Success", "code": "200", "body": body}
+
+    def do_POST(self):
+        request = self._read_body()
+        if self.path != "/ins":
+            return self._reply({"error": "not found"}, code=404)
+        if not self.headers.get("Authorization", "").startswith("Basic "):
+            return self._reply({"error": "authentication required"}, code=401)
+        ins_api = json.loads(request)["ins_api"]
+        if ins_api.get("chunk") == "1":
+            return self._chunk(ins_api)
+        outputs = [self._output(ins_api["type"], command.strip()) for command in ins_api["input"].split(" ;")]
+        self._reply({"ins_api": {"type": ins_api["type"], "version": ins_api["version"], "sid": "eoc",
+                                 "outputs": {"output": outputs[0] if len(outputs) == 1 else outputs}}})
+
+    def _chunk(self, ins_api):
+        """Chunk mode: the json output is sent as text, chunk_size characters at a time, the sid of the first
+        answer is sent back to get the next piece, the last piece comes with sid eoc"""
+        command = ins_api["input"].strip()
+        with self._sessions_lock:
+            text, offset = self._sessions.pop(ins_api["sid"], (None, 0))
+        if text is None:
+            output = self._output(ins_api["type"], command)
+            if output["code"] != "200":
+                return self._reply({"ins_api": {"type": ins_api["type"], "version": ins_api["version"], "sid": "eoc",
+                                                "outputs": {"output": output}}})
+            text = json.dumps(output["body"])
+        piece, offset = text[offset:offset + self.chunk_size], offset + self.chunk_size
+        sid = "eoc"
+        if offset < len(text):
+            sid = f"sid_{next(self._sids)}"
+            with self._sessions_lock:
+                self._sessions[sid] = (text, offset)
+        self._reply({"ins_api": {"type": ins_api["type"], "version": ins_api["version"], "sid": sid, "outputs": {
+            "output": {"input": command, "msg": "Success", "code": "200", "body": piece}}}})
+
+
+class MockServer(object):
+    """Runs a mock controller on a background thread"""
+
+    def __init__(self, handler=MockApicHandler, host="127.0.0.1", port=0, counts=None, latency=None):
+        """
+        Args:
+            handler: MockApicHandler, MockNdfcHandler or MockNxapiHandler
+            counts (dict, optional): result sizes overriding the handler ones, e.g. {"ethpmPhysIf": 10000}
+            latency (float, optional): seconds slept before every answer. Defaults to the handler one (none).
+        """
+        if counts or latency is not None:
+            overrides = {"counts": dict(handler.counts, **(counts or {}))}
+            if latency is not None:
+                overrides["latency"] = latency
+            handler = type(handler.__name__, (handler,), overrides)
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def address(self):
+        """host:port the server is listening on"""
+        return "%s:%s" % self._server.server_address[:2]
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    # Standalone server, e.g. to keep its memory out of a client measurement:
+    # python -m benchmarks.mock_server nxapi --counts '{"rows": 100000}'
+    parser = argparse.ArgumentParser(description="Mock APIC, NDFC or NX-API server")
+    parser.add_argument("kind", choices=["apic", "ndfc", "nxapi"])
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency", type=float)
+    parser.add_argument("--counts", default="{}", help="JSON result sizes, e.g. '{\"ethpmPhysIf\": 10000}'")
+    args = parser.parse_args()
+    handlers = {"apic": MockApicHandler, "ndfc": MockNdfcHandler, "nxapi": MockNxapiHandler}
+    with MockServer(handlers[args.kind], port=args.port, counts=json.loads(args.counts), latency=args.latency) as server:
+        print(server.address, flush=True)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            sys.exit(0)
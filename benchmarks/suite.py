@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite of the controller clients and collector pipelines against the local mock servers, each running in
+its own process.
+Measures throughput, latency percentiles and peak memory of every case and writes a JSON report, which can be
+compared with the report of a previous run.
+Run from the repository root:
+python -m benchmarks.suite --output before.json
+python -m benchmarks.suite --output after.json --compare before.json
+python -m benchmarks.suite --latency 0.02 --iterations 5 --cases apic_paged,pipeline_ports
+"""
+
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+import subprocess
+from contextlib import ExitStack, contextmanager
+import requests
+from libs import apic, ndfc, nxapi
+from libs.aci_query import AciQuery
+from libs.influx_writer import InfluxWriter, timestamp
+from libs.collectors import FAULTS_QUERY, PORTS_QUERY, port_points, fault_points, ndfc_port_points
+
+CREDENTIALS = {"username": "admin", "password": "", "domain": ""}
+NDFC_FABRIC = "FABRIC-0"
+
+# name: (server, function(handle) returning the number of items processed)
+CASES = {}
+
+
+def case(name, server):
+    def register(function):
+        CASES[name] = (server, function)
+        return function
+    return register
+
+
+class _NullInflux(object):
+    """Stands in for InfluxDBClient so the pipelines measure the collection side only"""
+
+    def __init__(self):
+        self.points = 0
+
+    def write_points(self, points, **kwargs):
+        self.points += len(points)
+        return True
+
+
+def _pipeline(points):
+    """Writes points through an InfluxWriter, like collector.py does, and waits for the batches to be handed over"""
+    writer = InfluxWriter(_NullInflux(), batch_size=5000)
+    count = writer.write_all(points)
+    writer.close()
+    return count
+
+
+@case("apic_login", "apic")
+def apic_login(handle):
+    handle.get_apic_token(CREDENTIALS)
+    return 1
+
+
+@case("apic_class_query", "apic")
+def apic_class_query(handle):
+    return len(handle.get_aci_object(AciQuery.for_class("ethpmPhysIf"))["imdata"])
+
+
+@case("apic_paged", "apic")
+def apic_paged(handle):
+    return sum(1 for _ in handle.get_aci_object_paged(PORTS_QUERY, page_size=250))
+
+
+@case("apic_stream", "apic")
+def apic_stream(handle):
+    return sum(1 for _ in handle.get_aci_object_stream(PORTS_QUERY))
+
+
+@case("apic_parallel_queries", "apic")
+def apic_parallel_queries(handle):
+    results = handle.get_aci_objects({"ports": PORTS_QUERY, "faults": FAULTS_QUERY,
+                                      "vlans": "/class/vlanCktEp.json", "tenants": "/class/fvTenant.json"},
+                                     page_size=250)
+    return sum(len(result["imdata"]) for result in results.values() if result)
+
+
+@case("ndfc_interfaces", "ndfc")
+def ndfc_interfaces(handle):
+    return sum(len(result["interfaces"]) for result in handle.get_all_interfaces_by_fabric(NDFC_FABRIC)
+               if not result["error"])
+
+
+@case("nxapi_show_command", "nxapi")
+def nxapi_show_command(handle):
+    return len(handle.show_command("show interface brief")["TABLE_interface"]["ROW_interface"])
+
+
+@case("nxapi_show_stream", "nxapi")
+def nxapi_show_stream(handle):
+    return sum(1 for _ in handle.show_command_stream("show interface brief", "ROW_interface"))
+
+
+@case("pipeline_ports", "apic")
+def pipeline_ports(handle):
+    return _pipeline(port_points(handle.get_aci_object_paged(PORTS_QUERY), timestamp(), "BENCH"))
+
+
+@case("pipeline_faults", "apic")
+def pipeline_faults(handle):
+    return _pipeline(fault_points(handle.get_aci_object_paged(FAULTS_QUERY), timestamp(), "BENCH"))
+
+
+@case("pipeline_ndfc_ports", "ndfc")
+def pipeline_ndfc_ports(handle):
+    return _pipeline(ndfc_port_points(handle.get_all_interfaces_by_fabric(NDFC_FABRIC), timestamp(), "BENCH"))
+
+
+@contextmanager
+def _mock_server(kind, counts, latency):
+    """Runs a mock server in its own process, so its CPU and memory are not measured with the client ones"""
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.mock_server", kind, "--counts", json.dumps(counts),
+                               "--latency", str(latency)], stdout=subprocess.PIPE, text=True)
+    try:
+        yield server.stdout.readline().strip()
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def _handles(stack, latency, counts):
+    """Starts the mock servers and returns a handle on each of them"""
+    addresses = {kind: stack.enter_context(_mock_server(kind, counts.get(kind, {}), latency))
+                 for kind in ("apic", "ndfc", "nxapi")}
+    apic_conn = stack.enter_context(apic.Apic(addresses["apic"]))
+    apic_conn.url = f"http://{addresses['apic']}/api"
+    apic_conn.get_apic_token(CREDENTIALS)
+    ndfc_conn = stack.enter_context(ndfc.Ndfc(addresses["ndfc"], api_key={"api_key": "x", "username": "admin"}))
+    ndfc_conn.url = f"http://{addresses['ndfc']}//appcenter/cisco/ndfc/api/v1/lan-fabric/rest/"
+    nxapi_conn = stack.enter_context(nxapi.Nexus_api(addresses["nxapi"], CREDENTIALS))
+    nxapi_conn.url = f"http://{addresses['nxapi']}/ins"
+    return {"apic": apic_conn, "ndfc": ndfc_conn, "nxapi": nxapi_conn}
+
+
+def percentile(values, q):
+    """Nearest rank percentile of sorted values"""
+    return values[min(len(values) - 1, max(0, int(round(q / 100 * len(values))) - 1))]
+
+
+def measure(function, handle, iterations, warmup):
+    """Runs a case: warmup runs, timed runs, then one run under tracemalloc for the peak memory"""
+    for _ in range(warmup):
+        function(handle)
+    latencies, items = [], 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        call_start = time.perf_counter()
+        items += function(handle)
+        latencies.append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - start
+    # Traced separately, tracemalloc slows allocations down a lot
+    tracemalloc.start()
+    function(handle)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    latencies.sort()
+    return {"iterations": iterations, "items_per_op": items / iterations,
+            "ops_per_second": iterations / elapsed, "items_per_second": items / elapsed,
+            "latency_ms": {"mean": sum(latencies) / len(latencies) * 1000,
+                           **{f"p{q}": percentile(latencies, q) * 1000 for q in (50, 90, 95, 99)},
+                           "max": latencies[-1] * 1000},
+            "peak_memory_bytes": peak}
+
+
+def environment():
+    """What the numbers depend on besides the code"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "platform": platform.platform(), "machine": platform.machine(), "requests": requests.__version__,
+            "commit": commit}
+
+
+def compare(report, previous, threshold):
+    """Prints the change of every case against a previous report, returns the regressed cases"""
+    regressions = []
+    print(f"\n{'case':<24}{'p50 ms':>18}{'p95 ms':>18}{'ops/s':>18}{'peak KiB':>20}")
+    for name, result in report["results"].items():
+        before = previous["results"].get(name)
+        if not before:
+            print(f"{name:<24}{'new case':>18}")
+            continue
+        cells = []
+        for value, old, higher_is_better in ((result["latency_ms"]["p50"], before["latency_ms"]["p50"], False),
+                                             (result["latency_ms"]["p95"], before["latency_ms"]["p95"], False),
+                                             (result["ops_per_second"], before["ops_per_second"], True),
+                                             (result["peak_memory_bytes"] / 1024,
+                                              before["peak_memory_bytes"] / 1024, False)):
+            change = (value - old) / old * 100 if old else 0.0
+            worse = -change if higher_is_better else change
+            if worse > threshold and name not in regressions:
+                regressions.append(name)
+            cells.append(f"{value:.1f} ({change:+.0f}%){'!' if worse > threshold else ' '}")
+        print(f"{name:<24}" + "".join(f"{cell:>18}" for cell in cells[:3]) + f"{cells[3]:>20}")
+    if previous.get("settings") != report["settings"]:
+        print("Warning: the reports were produced with different settings, the numbers are not comparable")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Client and collector benchmarks on the local mock servers")
+    parser.add_argument("--output", help="JSON report path")
+    parser.add_argument("--compare", help="previous JSON report to compare with")
+    parser.add_argument("--threshold", type=float, default=10,
+                        help="percent of degradation reported as a regression. Defaults to 10")
+    parser.add_argument("--cases", help="comma separated case names, defaults to all: " + ", ".join(CASES))
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the mock servers wait before answering")
+    parser.add_argument("--counts", default="{}",
+                        help='JSON result sizes per server, e.g. \'{"apic": {"ethpmPhysIf": 10000}, '
+                             '"ndfc": {"switches": 100}, "nxapi": {"rows": 1000}}\'')
+    args = parser.parse_args()
+    names = args.cases.split(",") if args.cases else list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error("unknown cases: %s" % ", ".join(unknown))
+    counts = json.loads(args.counts)
+
+    report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "environment": environment(),
+              "settings": {"iterations": args.iterations, "warmup": args.warmup, "latency": args.latency,
+                           "counts": counts},
+              "results": {}}
+    print(f"{'case':<24}{'items/op':>10}{'ops/s':>10}{'items/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'peak KiB':>10}")
+    with ExitStack() as stack:
+        handles = _handles(stack, args.latency, counts)
+        for name in names:
+            server, function = CASES[name]
+            result = report["results"][name] = measure(function, handles[server], args.iterations, args.warmup)
+            latency = result["latency_ms"]
+            print(f"{name:<24}{result['items_per_op']:>10.0f}{result['ops_per_second']:>10.1f}"
+                  f"{result['items_per_second']:>12.0f}{latency['p50']:>10.2f}{latency['p95']:>10.2f}"
+                  f"{latency['p99']:>10.2f}{result['peak_memory_bytes'] / 1024:>10.0f}")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if args.compare:
+        with open(args.compare) as previous:
+            regressions = compare(report, json.load(previous), args.threshold)
+        if regressions:
+            print("Regressions over %s%%: %s" % (args.threshold, ", ".join(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
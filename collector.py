@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Long running collector: logs in once, then polls the APIC and NDFC on a schedule and writes to InfluxDB.
+Replaces running demo_4/demo_5 from cron.
+Usage: python collector.py [--inventory inventory.json] [--database aci_db_stable]
+See inventory.example.json for the inventory format.
+"""
+
+import os
+import signal
+import logging
+import argparse
+from libs import variables
+from libs.inventory import Inventory
+from libs.scheduler import Scheduler
+from libs.influx_writer import InfluxWriter, timestamp
+from libs.instrumentation import Instruments
+from libs.collectors import (HEALTH_QUERY, FAULTS_QUERY, PORTS_QUERY, VLANS_QUERY,
+                             health_points, fault_points, port_points, vlan_points, ndfc_port_points)
+from influxdb import InfluxDBClient
+
+LOG = logging.getLogger("collector")
+
+
+def collect_health(target, writer):
+    return writer.write_all(health_points(target.handle.get_aci_object(HEALTH_QUERY), timestamp(), target.fabric))
+
+
+def collect_faults(target, writer):
+    return writer.write_all(fault_points(target.handle.get_aci_object_paged(FAULTS_QUERY), timestamp(), target.fabric))
+
+
+def collect_ports(target, writer):
+    return writer.write_all(port_points(target.handle.get_aci_object_paged(PORTS_QUERY), timestamp(), target.fabric))
+
+
+def collect_vlans(target, writer):
+    return writer.write_all(vlan_points(target.handle.get_aci_object_paged(VLANS_QUERY), timestamp(), target.fabric))
+
+
+def collect_ndfc_ports(target, writer):
+    return sum(writer.write_all(ndfc_port_points(target.handle.get_all_interfaces_by_fabric(fabric), timestamp(),
+                                                 target.fabric))
+               for fabric in target.options.get("fabrics", []))
+
+
+def export_http_metrics(instruments, writer, prometheus_file):
+    """Writes the controller request histograms to InfluxDB and, if asked, to a Prometheus textfile"""
+    writer.write_all(instruments.influx_points(timestamp()))
+    if prometheus_file:
+        with open(prometheus_file + ".tmp", "w") as metrics:
+            metrics.write(instruments.prometheus())
+        os.replace(prometheus_file + ".tmp", prometheus_file)
+
+
+def fan_out(inventory, function, kind, timeout, writer):
+    """Runs a collector on every fabric of a kind. Failed fabrics are logged, the others are written"""
+    for result in inventory.run(function, kind=kind, timeout=timeout, args=(writer,)):
+        if result.error:
+            LOG.warning("%s on %s failed: %s" % (function.__name__, result.fabric, result.error))
+        else:
+            LOG.debug("%s on %s: %s points in %.2fs" % (function.__name__, result.fabric, result.result,
+                                                        result.latency))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ACI/NDFC to InfluxDB collector")
+    parser.add_argument("--database", default="aci_db_stable")
+    parser.add_argument("--influx-host", default="localhost")
+    parser.add_argument("--inventory", help="JSON inventory of the controllers, see libs/inventory.py. "
+                                            "Defaults to the APIC of libs/variables.py plus --ndfc-host")
+    parser.add_argument("--ndfc-host", default="10.50.129.123")
+    parser.add_argument("--ndfc-fabric", default="AMS-CML-VXLAN", help="empty to disable the NDFC jobs")
+    parser.add_argument("--health-interval", type=float, default=30)
+    parser.add_argument("--faults-interval", type=float, default=60)
+    parser.add_argument("--ports-interval", type=float, default=300)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--metrics-interval", type=float, default=60,
+                        help="seconds between two exports of the controller request metrics")
+    parser.add_argument("--prometheus-file", help="also export the request metrics to this Prometheus textfile")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(threadName)s %(message)s")
+
+    client = InfluxDBClient(host=args.influx_host, port=8086, username="admin", password=variables.influx_password)
+    client.switch_database(args.database)
+
+    # Handles are created once, APIC tokens are refreshed in the background instead of logging in every cycle
+    if args.inventory:
+        inventory = Inventory.from_file(args.inventory)
+    else:
+        inventory = Inventory.from_variables(ndfc_address=args.ndfc_host if args.ndfc_fabric else None,
+                                             ndfc_fabrics=[args.ndfc_fabric])
+    inventory.connect()
+    instruments = Instruments()
+    for target in inventory.targets():
+        target.handle.policy.add_hook(instruments)
+
+    writer = InfluxWriter(client)
+    scheduler = Scheduler(max_workers=args.workers)
+    jobs = [("health", collect_health, "apic", args.health_interval),
+            ("faults", collect_faults, "apic", args.faults_interval),
+            ("ports", collect_ports, "apic", args.ports_interval),
+            ("vlans", collect_vlans, "apic", args.ports_interval),
+            ("ndfc_ports", collect_ndfc_ports, "ndfc", args.ports_interval)]
+    for name, function, kind, interval in jobs:
+        if inventory.targets(kind):
+            # A fabric has until the next run to answer
+            scheduler.add_job(name, fan_out, interval, args=(inventory, function, kind, interval, writer))
+    scheduler.add_job("http_metrics", export_http_metrics, args.metrics_interval,
+                      args=(instruments, writer, args.prometheus_file))
+
+    def shutdown(signum, frame):
+        LOG.info("Received signal %s, stopping" % signum)
+        scheduler.stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    LOG.info("Collector started")
+    try:
+        scheduler.run_forever()
+    finally:
+        scheduler.stop()
+        writer.close()
+        inventory.close()
+        LOG.info("Collector stopped. Jobs: %s Writer: %s" % (scheduler.stats, writer.metrics))
+
+
+if __name__ == "__main__":
+    main()
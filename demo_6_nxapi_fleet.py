@@ -0,0 +1,25 @@
+import sys
+import json
+from libs.nxapi_fleet import Fleet, summarize
+
+# Usage: python demo_6_nxapi_fleet.py switches.txt "show version" "show interface brief"
+# switches.txt holds one switch address per line, credentials come from libs/variables.py
+with open(sys.argv[1]) as switches:
+    addresses = [line.strip() for line in switches if line.strip() and not line.startswith("#")]
+commands = sys.argv[2:] or ["show version"]
+
+results = []
+with Fleet(addresses, max_workers=32, timeout=30) as fleet:
+    for result in fleet.run(commands):
+        print(json.dumps({"switch": result.address, "latency": round(result.latency, 3), "errors": result.errors,
+                          "outputs": result.outputs}))
+        results.append(result)
+
+summary = summarize(results)
+line = f"{summary['succeeded']}/{summary['devices']} switches answered every command"
+# Latencies are None when no switch was queried
+if summary["latency"]["p50"] is not None:
+    line += f", latency p50 {summary['latency']['p50']:.2f}s p95 {summary['latency']['p95']:.2f}s"
+print(line, file=sys.stderr)
+for address, errors in summary["failures"].items():
+    print(f"{address}: {errors}", file=sys.stderr)
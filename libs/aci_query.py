@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+import logging
+from urllib.parse import quote
+
+LOG = logging.getLogger("__name__")
+
+# Query options supported by the APIC REST API, in the order they are written in the URL
+OPTIONS = ("query_target", "target_subtree_class", "query_target_filter", "rsp_subtree", "rsp_subtree_class",
+			"rsp_subtree_filter", "rsp_subtree_include", "rsp_prop_include", "order_by", "page", "page_size",
+			"subscription", "refresh_timeout")
+
+
+def _value(value) -> str:
+	"""Formats a filter value, strings are double quoted"""
+	if isinstance(value, str):
+		return '"%s"' % value.replace('"', '\\"')
+	return str(value)
+
+
+def eq(prop:str, value) -> str:
+	"""eq(fvTenant.name,"common")"""
+	return "eq(%s,%s)" % (prop, _value(value))
+
+
+def ne(prop:str, value) -> str:
+	"""ne(faultInfo.severity,"cleared")"""
+	return "ne(%s,%s)" % (prop, _value(value))
+
+
+def lt(prop:str, value) -> str:
+	"""lt(prop,value)"""
+	return "lt(%s,%s)" % (prop, _value(value))
+
+
+def le(prop:str, value) -> str:
+	"""le(prop,value)"""
+	return "le(%s,%s)" % (prop, _value(value))
+
+
+def gt(prop:str, value) -> str:
+	"""gt(prop,value)"""
+	return "gt(%s,%s)" % (prop, _value(value))
+
+
+def ge(prop:str, value) -> str:
+	"""ge(prop,value)"""
+	return "ge(%s,%s)" % (prop, _value(value))
+
+
+def bw(prop:str, low, high) -> str:
+	"""bw(prop,low,high)"""
+	return "bw(%s,%s,%s)" % (prop, _value(low), _value(high))
+
+
+def wcard(prop:str, value:str) -> str:
+	"""wcard(vlanCktEp.epgDn,"epg")"""
+	return "wcard(%s,%s)" % (prop, _value(value))
+
+
+def and_(*expressions:str) -> str:
+	"""and(expression,expression,...)"""
+	return "and(%s)" % ",".join(expressions)
+
+
+def or_(*expressions:str) -> str:
+	"""or(expression,expression,...)"""
+	return "or(%s)" % ",".join(expressions)
+
+
+def not_(expression:str) -> str:
+	"""not(expression)"""
+	return "not(%s)" % expression
+
+
+def project(record:dict, properties) -> dict:
+	"""Keeps only the listed properties in an imdata record. Children, if any, are left untouched.
+
+	Args:
+		record (dict): an imdata record like {"fvTenant": {"attributes": {...}}}
+		properties (list): property names to keep
+
+	Returns:
+		dict: a new record
+	"""
+	return {class_name: dict(body, attributes={
+		prop: body["attributes"][prop] for prop in properties if prop in body["attributes"]})
+		for class_name, body in record.items()}
+
+
+class AciQuery(object):
+	"""
+	Describes a class or MO query and formats it as a correctly encoded URL.
+	Example:
+	AciQuery.for_class("faultInfo", query_target_filter=ne("faultInfo.severity", "cleared"),
+						properties=["dn", "severity"])
+	"""
+
+	def __init__(self, target:str, properties=None, **options):
+		"""
+		Args:
+			target (str): path below /api, like "class/fvTenant.json" or "mo/uni/tn-common.json".
+				A query string already in the path is kept as it is
+			properties (list, optional): property names the caller is interested in. APIC has no option to select
+				single properties, so records are projected client side. Combine it with rsp_prop_include to
+				reduce what is sent on the wire
+			options: any of OPTIONS, e.g. query_target_filter, rsp_subtree, page_size
+		"""
+		unknown = set(options) - set(OPTIONS)
+		if unknown:
+			raise ValueError("Unknown query options: %s" % ", ".join(sorted(unknown)))
+		self._target = target
+		self._properties = list(properties) if properties else None
+		self._options = {option: value for option, value in options.items() if value is not None}
+
+	@classmethod
+	def for_class(cls, class_name:str, **options):
+		"""Query all the objects of a class"""
+		return cls("class/%s.json" % class_name, **options)
+
+	@classmethod
+	def for_dn(cls, dn:str, **options):
+		"""Query an object by its dn"""
+		return cls("mo/%s.json" % dn, **options)
+
+	@property
+	def target(self):
+		"""Get target"""
+		return self._target
+
+	@property
+	def class_name(self):
+		"""Class name for class queries, None for MO queries"""
+		path = self._target.split("?")[0].lstrip("/")
+		if path.startswith("class/") and path.endswith(".json"):
+			return path[len("class/"):-len(".json")]
+		return None
+
+	@property
+	def properties(self):
+		"""Get properties"""
+		return self._properties
+
+	@property
+	def options(self):
+		"""Get a copy of the query options"""
+		return dict(self._options)
+
+	def replace(self, **options):
+		"""Returns a copy of the query with some options changed. Options set to None are left as they are"""
+		merged = dict(self._options)
+		merged.update({option: value for option, value in options.items() if value is not None})
+		return AciQuery(self._target, properties=self._properties, **merged)
+
+	def to_url(self, base:str ="") -> str:
+		"""
+		Args:
+			base (str, optional): APIC API root, e.g. https://apic/api
+
+		Returns:
+			str: the query URL, every option value percent encoded
+		"""
+		query_string = "&".join("%s=%s" % (option.replace("_", "-"), quote(str(self._options[option]), safe="(),"))
+								for option in OPTIONS if option in self._options)
+		if query_string:
+			query_string = "%s%s" % ("&" if "?" in self._target else "?", query_string)
+		if base:
+			return "%s/%s%s" % (base, self._target, query_string)
+		return "%s%s" % (self._target, query_string)
+
+	def __str__(self):
+		return self.to_url()
+
+	def __repr__(self):
+		return "AciQuery(%s)" % self.to_url()
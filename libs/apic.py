@@ -1,30 +1,74 @@
 #!/usr/bin/env python3
 
 import json
+import math
 import time
 import logging
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
+from .session import build_session, set_cookies
+from .jsonstream import iter_items
+from .aci_query import AciQuery, project
+from .cache import normalize
+from .policy import RequestPolicy
+from .apic_bulk import plan_batches, mo_dn, PostResult
+from .apic_plan import diff
 
 LOG = logging.getLogger("__name__")
 
 
 class Apic(object):
 
-	def __init__(self, address, credentials=None):
+	def __init__(self, address, credentials=None, pool_maxsize=10, max_retries=0, pool_block=False, cache=None,
+				policy=None):
+		"""
+		:param address: IP Address or FQDN
+		:param credentials: a dictionary like {'username': '', 'password': '', 'domain': ''}
+		:param pool_maxsize: max number of keep-alive connections towards the APIC
+		:param max_retries: connection level retries
+		:param pool_block: wait for a free pooled connection instead of opening a new one
+		:param cache: optional libs.cache.ResponseCache used by api_get. Writes invalidate the affected entries
+		:param policy: optional libs.policy.RequestPolicy with timeouts, retries and rate limit. Defaults to
+				RequestPolicy()
+		"""
 		requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 		LOG.debug("Creating a new APIC handle on %s address" % address)
 
 		# Attribute initialization
+		self._session = build_session(pool_maxsize=pool_maxsize, max_retries=max_retries, pool_block=pool_block)
 		self._address = address
 		self._url = "https://%s/api" % address
 		self._token = None
 		self._top_system = None
 		self._token_timeout = None
 		self._credentials = credentials
+		self._cache = cache
+		self._policy = policy or RequestPolicy()
+		self._token_lock = threading.Lock()
+		self._token_refreshes = 0
+		self._token_relogins = 0
+		self._refresher = None
+		self._refresher_stop = threading.Event()
 		if credentials:
 			self.get_apic_token(self.credentials)
 
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def close(self):
+		"""
+		Closes all the pooled connections towards the APIC
+		:return: Nothing
+		"""
+		LOG.debug("Closing APIC handle on %s address" % self.address)
+		self.stop_token_refresher()
+		self._session.close()
+
 	@property
 	def address(self):
 		"""Get credentials"""
@@ -52,8 +96,10 @@ class Apic(object):
 
 	@token.setter
 	def token(self, value):
-		"""Set the token"""
+		"""Set the token. The cookie is shared by every call made through the session"""
 		self._token = value
+		if value:
+			set_cookies(self._session, value)
 
 	@property
 	def token_timeout(self):
@@ -65,6 +111,26 @@ class Apic(object):
 		"""Set the token_timeout"""
 		self._token_timeout = value
 
+	@property
+	def cache(self):
+		"""Get the response cache"""
+		return self._cache
+
+	@property
+	def policy(self):
+		"""Get the request policy"""
+		return self._policy
+
+	@property
+	def token_refreshes(self):
+		"""Number of aaaRefresh calls done by the handle"""
+		return self._token_refreshes
+
+	@property
+	def token_relogins(self):
+		"""Number of times the handle had to authenticate again"""
+		return self._token_relogins
+
 	@property
 	def url(self):
 		"""Get url"""
@@ -83,7 +149,7 @@ class Apic(object):
 		[1] if [0] si False will return the reason why connection failed. Else will return a set of domains.
 		"""
 		try:
-			r = requests.get("%s/aaaListDomains.json" % self.url, verify=False, timeout=2)
+			r = self._request("GET", "%s/aaaListDomains.json" % self.url, timeout=2)
 		except requests.exceptions.Timeout:
 			return False, "Timeout reaching the APIC"
 		if not r.status_code == 200:
@@ -94,21 +160,29 @@ class Apic(object):
 			domains.add(record["name"])
 		return True, domains
 
-	def get_apic_token(self, credentials):
+	@staticmethod
+	def _auth_payload(credentials):
 		"""
-		Gets and Sets APIC Cookie. Cookie will be maintained active across script usage on a clock base check
 		:param credentials: a dictionary like {'username': '', 'password': '', 'domain': ''}
-		:return: Bool
+		:return: aaaLogin body
 		"""
-		if not self.credentials:
-			self._credentials = credentials
 		if credentials["domain"] == "":
 			auth = {"aaaUser": {"attributes": {"name": "%s" % (
 				credentials["username"]), "pwd": "%s" % (credentials["password"])}}}
 		else:
 			auth = {"aaaUser": {"attributes": {"name": "apic:%s\\\\%s" % (
 				credentials["domain"], credentials["username"]), "pwd": "%s" % (credentials["password"])}}}
-		r = requests.post("%s/aaaLogin.json" % self.url, json=auth, verify=False)
+		return auth
+
+	def get_apic_token(self, credentials):
+		"""
+		Gets and Sets APIC Cookie. Cookie will be maintained active across script usage on a clock base check
+		:param credentials: a dictionary like {'username': '', 'password': '', 'domain': ''}
+		:return: Bool
+		"""
+		if not self.credentials:
+			self._credentials = credentials
+		r = self._request("POST", "%s/aaaLogin.json" % self.url, json=self._auth_payload(credentials))
 		if not r.status_code == 200:
 			LOG.error("APIC %s authentication failed. Code: %s. Error %s" % (
 				self.address, r.status_code, r.text))
@@ -118,42 +192,143 @@ class Apic(object):
 		self.token = {"APIC-cookie": "%s" % (r_json["imdata"][0]["aaaLogin"]["attributes"]["token"])}
 		self.token_timeout = int(r_json["imdata"][0]["aaaLogin"]["attributes"]["refreshTimeoutSeconds"]) + int(
 			time.time())
-
-
 		return True
 
 	def check_token_validity(self):
 		"""
 		This function will reset the token if timeout is less than 100 seconds from now
-		If timeout is expired it will re-auth
-		:return: Nothing
+		If timeout is expired it will re-auth.
+		Refresh is single flight: one thread refreshes while the others keep using the current token as long as
+		it is still valid. Threads only wait for the refreshing one when the token is about to expire.
+		:return: Bool
 		"""
 		LOG.debug(f"Current Token Timeout: {self.token_timeout}")
-		if self.token_timeout - int(time.time()) > 100:
+		remaining = self.token_timeout - int(time.time())
+		if remaining > 100:
 			return True
-		elif 100 > self.token_timeout - int(time.time()) > 5:
-			LOG.debug("Token Valid for %s seconds, refreshing" % (self.token_timeout - int(time.time())))
-			r = requests.get("%s/aaaRefresh.json" % self.url, cookies=self.token, verify=False)
-			if not 199 < r.status_code < 300:
-				return False
-			r_json = r.json()
-			self.token = {"APIC-cookie": "%s" % (r_json["imdata"][0]["aaaLogin"]["attributes"]["token"])}
-			self.token_timeout = int(r_json["imdata"][0]["aaaLogin"]["attributes"]["refreshTimeoutSeconds"]) + int(
-				time.time())
-		else:
-			LOG.debug("Token invalid, re-authentication required")
-			self.get_apic_token(self.credentials)
+		if not self._token_lock.acquire(blocking=remaining <= 5):
+			return True
+		try:
+			return self._renew_token(100)
+		finally:
+			self._token_lock.release()
+
+	def _renew_token(self, margin):
+		"""
+		Refreshes the token if it expires in less than margin seconds, re-authenticates if it already expired
+		or the refresh failed. Must be called holding the token lock.
+		:param margin: seconds
+		:return: Bool
+		"""
+		# Another thread may have renewed the token while we were waiting for the lock
+		remaining = self.token_timeout - int(time.time())
+		if remaining > margin:
+			return True
+		if remaining > 5:
+			LOG.debug("Token Valid for %s seconds, refreshing" % remaining)
+			r = self._request("GET", "%s/aaaRefresh.json" % self.url)
+			if 199 < r.status_code < 300:
+				r_json = r.json()
+				self.token = {"APIC-cookie": "%s" % (r_json["imdata"][0]["aaaLogin"]["attributes"]["token"])}
+				self.token_timeout = int(r_json["imdata"][0]["aaaLogin"]["attributes"]["refreshTimeoutSeconds"]) + int(
+					time.time())
+				self._token_refreshes += 1
+				return True
+			LOG.warning("APIC %s token refresh failed. Code: %s" % (self.address, r.status_code))
+		LOG.debug("Token invalid, re-authentication required")
+		if not self.get_apic_token(self.credentials):
+			return False
+		self._token_relogins += 1
+		return True
+
+	def start_token_refresher(self, margin=120):
+		"""
+		Refreshes the token on a background thread margin seconds before it expires, so API calls always find
+		a valid token and never have to renew it themselves. Margin must be above 100 seconds for that.
+		:param margin: seconds
+		:return: Bool
+		"""
+		if not self.token_timeout:
+			LOG.warning("APIC %s token refresher needs an authenticated handle" % self.address)
+			return False
+		if self._refresher:
+			return True
+		self._refresher_stop.clear()
+		self._refresher = threading.Thread(target=self._token_refresher, args=(margin,), daemon=True,
+											name="apic-token-%s" % self.address)
+		self._refresher.start()
+		return True
+
+	def stop_token_refresher(self):
+		"""
+		:return: Nothing
+		"""
+		refresher = self._refresher
+		if refresher:
+			self._refresher_stop.set()
+			refresher.join()
+			self._refresher = None
+
+	def _token_refresher(self, margin):
+		"""
+		Background thread body. A failed renewal is retried after 5 seconds, doubled on every consecutive failure
+		up to 5 minutes, so an unreachable APIC is not sent a login every second once the token expired
+		:param margin: seconds
+		:return: Nothing
+		"""
+		failures = 0
+		try:
+			while True:
+				if failures:
+					delay = min(5 * 2 ** (failures - 1), 300)
+				else:
+					delay = max(self.token_timeout - margin - time.time(), 1)
+				if self._refresher_stop.wait(delay):
+					break
+				try:
+					with self._token_lock:
+						renewed = self._renew_token(margin)
+				except requests.exceptions.RequestException as e:
+					LOG.warning("APIC %s token renewal failed: %s" % (self.address, e))
+					renewed = False
+				failures = 0 if renewed else failures + 1
+		finally:
+			if self._refresher is threading.current_thread():
+				self._refresher = None
+
+	def _request(self, method, url, **kwargs):
+		"""
+		Every HTTP call towards the APIC goes through here so it reuses the pooled session and applies the
+		request policy
+		:param method: HTTP method
+		:param url: A well formatted URL
+		:return: A requests answer
+		"""
+		return self._policy.send(self._session.request, method, url, **kwargs)
 
-	def api_get(self, url):
+	def api_get(self, url, stream=False):
 		"""
 		:param url: A well formatted URL
+		:param stream: do not download the body upfront, it will be read through the answer iter_content().
+				Streamed answers are never cached
+		:return: A requests answer if status_code == 200
+		"""
+		if self._cache and not stream:
+			return self._cache.get(url.replace(self.url, ""), lambda: self._api_get(url))
+		return self._api_get(url, stream)
+
+	def _api_get(self, url, stream=False):
+		"""
+		api_get without the cache
+		:param url: A well formatted URL
+		:param stream: do not download the body upfront
 		:return: A requests answer if status_code == 200
 		"""
 		self.check_token_validity()
 		if self.url not in url:
 			url = "%s/%s" % (self.url, url)
 		LOG.debug("Getting: %s" % url)
-		result = requests.get(url, cookies=self.token, verify=False)
+		result = self._request("GET", url, stream=stream)
 		if not 199 < result.status_code < 300:
 			LOG.warning("API GET failed. URL: %s ; Code %s and Error: %s" % (
 				url, result.status_code, result.text))
@@ -161,6 +336,32 @@ class Apic(object):
 		else:
 			return result
 
+	def _invalidate_cache(self, url):
+		"""
+		Drops the cached answers a write may have changed: MO queries on the written dn, its ancestors and
+		descendants, plus every class query as they can't be mapped to a dn.
+		:param url: the URL written to
+		:return: Nothing
+		"""
+		if not self._cache:
+			return
+		path = normalize(url.replace(self.url, "")).split("?")[0]
+		if not path.startswith("mo/"):
+			self._cache.clear()
+			return
+		dn = path[len("mo/"):].rsplit(".", 1)[0]
+
+		def affected(key):
+			key_path = key.split("?")[0]
+			if key_path.startswith("class/"):
+				return True
+			if not key_path.startswith("mo/"):
+				return False
+			key_dn = key_path[len("mo/"):].rsplit(".", 1)[0]
+			return key_dn == dn or key_dn.startswith(dn + "/") or dn.startswith(key_dn + "/")
+
+		self._cache.invalidate(affected)
+
 	def api_delete(self, url):
 		"""
 		:param url: A well formatted URL
@@ -170,7 +371,8 @@ class Apic(object):
 		if self.url not in url:
 			url = "%s/%s" % (self.url, url)
 		LOG.debug("Deleting: %s" % url)
-		result = requests.delete(url, cookies=self.token, verify=False)
+		result = self._request("DELETE", url)
+		self._invalidate_cache(url)
 		if not 199 < result.status_code < 300:
 			LOG.warning("API DELETE failed. URL: %s ; Code %s and Error: %s" % (
 				url, result.status_code, result.text))
@@ -194,12 +396,13 @@ class Apic(object):
 			if debug:
 				LOG.debug("POST Body: %s " % json_body)
 			headers = {'content-type': 'application/json'}
-			result = requests.post(url, cookies=self.token, json=json_body, verify=False, headers=headers)
+			result = self._request("POST", url, json=json_body, headers=headers)
 		else:
 			if debug:
 				LOG.debug("POST Body: %s " % xml_body)
 			headers = {'content-type': 'application/xml'}
-			result = requests.post(url, cookies=self.token, data=xml_body, verify=False, headers=headers)
+			result = self._request("POST", url, data=xml_body, headers=headers)
+		self._invalidate_cache(url)
 
 		if not 199 < result.status_code < 300:
 			LOG.debug("API POST FAILED. URL: %s ; Code %s and Error: %s" % (
@@ -210,11 +413,146 @@ class Apic(object):
 				url, result.status_code, result.text))
 			return result
 
+	def api_post_bulk(self, objects, max_objects=500, max_workers=4):
+		"""
+		Posts many MOs with as few requests as possible. Objects of the same tenant (or first container under uni)
+		are nested under a single polUni, up to max_objects per POST, see libs.apic_bulk.plan_batches. Unrelated
+		subtrees are posted in parallel. The APIC applies a POST as one transaction: when a batch is rejected its
+		objects are posted one at a time, so every object gets its own outcome.
+		Ancestors missing from objects are sent with their dn only, so unlike api_post a missing parent is created.
+		Example:
+		results = apic_conn.api_post_bulk([{"fvAEPg": {"attributes": {"dn": "uni/tn-T/ap-A/epg-E%s" % i}}}
+											for i in range(500)])
+		failed = [result for result in results if not result.success]
+		:param objects: list of MO dictionaries, each with a dn attribute
+		:param max_objects: max objects per POST, nested children included
+		:param max_workers: max number of concurrent POSTs towards this APIC
+		:return: A list of libs.apic_bulk.PostResult, in the order of objects
+		"""
+		plans, invalid = plan_batches(objects, max_objects)
+		results = [None] * len(objects)
+		for index in invalid:
+			results[index] = PostResult(None, False, "missing dn attribute", False)
+		LOG.debug("Bulk POST of %s objects in %s requests" % (len(objects), sum(len(batches) for batches in plans)))
+		# Make sure the token is valid once, before workers start sharing it
+		self.check_token_validity()
+		with ThreadPoolExecutor(max_workers=max_workers) as executor:
+			for future in [executor.submit(self._post_batches, objects, batches) for batches in plans]:
+				for index, result in future.result():
+					results[index] = result
+		return results
+
+	def _post_batches(self, objects, batches):
+		"""
+		Posts the batches of a partition in order, falling back to one POST per object when a batch is rejected
+		:param objects: the api_post_bulk objects
+		:param batches: list of libs.apic_bulk.Batch
+		:return: A list of (object index, PostResult)
+		"""
+		outcomes = []
+		for batch in batches:
+			error = self._post_json(batch.url, batch.body)
+			if error is None or len(batch.indexes) == 1:
+				outcomes.extend((index, PostResult(mo_dn(objects[index]), error is None, error, len(batch.indexes) > 1))
+								for index in batch.indexes)
+				continue
+			LOG.warning("Bulk POST of %s objects failed (%s), posting them one at a time" % (len(batch.indexes), error))
+			for index in batch.indexes:
+				dn = mo_dn(objects[index])
+				error = self._post_json("mo/%s.json" % dn, objects[index])
+				outcomes.append((index, PostResult(dn, error is None, error, False)))
+		return outcomes
+
+	def _post_json(self, url, body):
+		"""
+		:param url: URL relative to the API root, e.g. mo/uni.json
+		:param body: json payload
+		:return: None on success, otherwise the reason of the failure
+		"""
+		self.check_token_validity()
+		url = "%s/%s" % (self.url, url)
+		try:
+			result = self._request("POST", url, json=body, headers={'content-type': 'application/json'})
+		except requests.exceptions.RequestException as e:
+			return str(e)
+		finally:
+			self._invalidate_cache(url)
+		if 199 < result.status_code < 300:
+			return None
+		try:
+			text = result.json()["imdata"][0]["error"]["attributes"]["text"]
+		except (ValueError, KeyError, IndexError, TypeError):
+			text = result.text
+		return "HTTP %s: %s" % (result.status_code, text)
+
+	def plan_config(self, desired, prune=False):
+		"""
+		Compares a desired configuration with the APIC one, see libs.apic_plan.diff. The current subtree of every
+		desired top level object is fetched once with rsp-subtree=full and config-only properties, bypassing the cache.
+		Example:
+		plan = apic_conn.plan_config({"fvTenant": {"attributes": {"dn": "uni/tn-T", "descr": "prod"}, "children": [
+					{"fvAp": {"attributes": {"rn": "ap-A"}}}]}})
+		print(plan.summary())
+		apic_conn.apply_config(plan)
+		:param desired: A MO dictionary, or a list of them, with nested children
+		:param prune: also delete the objects missing from desired, for the classes desired contains
+		:return: A libs.apic_plan.Plan, False if a current subtree could not be fetched
+		"""
+		if isinstance(desired, dict):
+			desired = [desired]
+		current = []
+		for dn in dict.fromkeys(mo_dn(mo) for mo in desired):
+			if dn is None:
+				raise ValueError("Top level desired objects need a dn")
+			# The cache may predate a write made by someone else, a plan needs the live configuration
+			data = self._api_get(self._aci_object_url("mo/%s.json" % dn, rsp_subtree="full",
+														rsp_prop_include="config-only"))
+			if not data:
+				LOG.warning("Unable to fetch the current configuration of %s" % dn)
+				return False
+			current.extend(data.json()["imdata"])
+		return diff(current, desired, prune)
+
+	def apply_config(self, plan, max_objects=500, max_workers=4):
+		"""
+		Posts the objects of a plan, see api_post_bulk. Nothing is sent when the plan is empty
+		:param plan: A libs.apic_plan.Plan returned by plan_config
+		:param max_objects: max objects per POST
+		:param max_workers: max number of concurrent POSTs towards this APIC
+		:return: A list of libs.apic_bulk.PostResult
+		"""
+		if plan.empty:
+			return []
+		return self.api_post_bulk(plan.objects, max_objects=max_objects, max_workers=max_workers)
+
+	def _aci_object_url(self, dn, **query):
+		"""
+		Builds the URL for querying the MIT. Query options are passed with underscores, e.g. query_target_filter
+		:param dn: full MIT to reach the object or an AciQuery. It can already contain a query string
+		:param query: APIC query options. Options set to None are skipped
+		:return: A well formatted URL, option values are percent encoded
+		"""
+		if not isinstance(dn, AciQuery):
+			dn = AciQuery(dn)
+		return dn.replace(**query).to_url(self.url)
+
+	@staticmethod
+	def _project_result(dn, result):
+		"""
+		Applies the properties selection of an AciQuery to an imdata answer
+		:param dn: full MIT to reach the object or an AciQuery
+		:param result: json answer
+		:return: json answer
+		"""
+		if result and isinstance(dn, AciQuery) and dn.properties:
+			result["imdata"] = [project(record, dn.properties) for record in result["imdata"]]
+		return result
+
 	def get_aci_object(self, dn, query_target=None, target_subtree_class=None, query_target_filter=None,
 						rsp_subtree=None, rsp_prop_include=None, rsp_subtree_filter=None):
 		"""
 		This function prepares the URL formatting for querying the MIT
-		:param dn: full MIT to reach the object
+		:param dn: full MIT to reach the object, or an AciQuery carrying the options
 		:param query_target: Refer to Cisco APIC REST API Configuration Guide
 		:param target_subtree_class: Refer to Cisco APIC REST API Configuration Guide
 		:param query_target_filter: Refer to Cisco APIC REST API Configuration Guide
@@ -224,20 +562,176 @@ class Apic(object):
 		:param rsp_subtree_filter: Refer to Cisco APIC REST API Configuration Guide
 		:return: json
 		"""
+		url = self._aci_object_url(dn, query_target=query_target, target_subtree_class=target_subtree_class,
+									query_target_filter=query_target_filter, rsp_subtree=rsp_subtree,
+									rsp_prop_include=rsp_prop_include, rsp_subtree_filter=rsp_subtree_filter)
+		data = self.api_get(url)
+		return self._project_result(dn, data.json())
 
-		args = locals()
-		if rsp_subtree or rsp_prop_include or rsp_subtree_filter or query_target or target_subtree_class or query_target_filter:
-			url_filter = "?"
-		else:
-			url_filter = ""
-		for arg in args:
-			if arg in ["self", "dn"]:
+	@staticmethod
+	def _default_order_by(dn):
+		"""
+		Paging requires a stable order, class queries are sorted by dn unless told otherwise
+		:param dn: full MIT to reach the object or an AciQuery
+		:return: A sorting property or None
+		"""
+		if not isinstance(dn, AciQuery):
+			dn = AciQuery(dn)
+		if dn.class_name and "order_by" not in dn.options:
+			return "%s.dn" % dn.class_name
+		return None
+
+	def _get_aci_page(self, dn, page, page_size, **query):
+		"""
+		:param dn: full MIT to reach the object
+		:param page: page number, starting from 0
+		:param page_size: number of records per page
+		:param query: APIC query options
+		:return: json or False
+		"""
+		data = self.api_get(self._aci_object_url(dn, page=page, page_size=page_size, **query))
+		if not data:
+			return False
+		return self._project_result(dn, data.json())
+
+	def get_aci_object_paged(self, dn, page_size=1000, order_by=None, query_target=None, target_subtree_class=None,
+							query_target_filter=None, rsp_subtree=None, rsp_prop_include=None, rsp_subtree_filter=None):
+		"""
+		Paged version of get_aci_object meant for large class queries. Records are yielded one at a time and
+		the next page is requested while the current one is being consumed.
+		:param dn: full MIT to reach the object
+		:param page_size: number of records per page
+		:param order_by: sorting property like "ethpmPhysIf.dn". Paging requires a stable order so for class
+				queries it defaults to the class dn
+		:param query_target: Refer to Cisco APIC REST API Configuration Guide
+		:param target_subtree_class: Refer to Cisco APIC REST API Configuration Guide
+		:param query_target_filter: Refer to Cisco APIC REST API Configuration Guide
+		:param rsp_subtree: Specifies child object level included in the response
+		:param rsp_prop_include: Refer to Cisco APIC REST API Configuration Guide
+		:param rsp_subtree_filter: Refer to Cisco APIC REST API Configuration Guide
+		:return: A generator of imdata records
+		"""
+		query = {"query_target": query_target, "target_subtree_class": target_subtree_class,
+				"query_target_filter": query_target_filter, "rsp_subtree": rsp_subtree,
+				"rsp_prop_include": rsp_prop_include, "rsp_subtree_filter": rsp_subtree_filter,
+				"order_by": order_by or self._default_order_by(dn)}
+		with ThreadPoolExecutor(max_workers=1) as prefetch:
+			result = self._get_aci_page(dn, 0, page_size, **query)
+			if not result:
+				return
+			pages = math.ceil(int(result["totalCount"]) / page_size)
+			LOG.debug("Paged query on %s: %s records in %s pages" % (dn, result["totalCount"], pages))
+			for page in range(1, pages + 1):
+				next_page = prefetch.submit(self._get_aci_page, dn, page, page_size, **query) if page < pages else None
+				for record in result["imdata"]:
+					yield record
+				if not next_page:
+					return
+				result = next_page.result()
+				if not result:
+					LOG.warning("Paged query on %s stopped at page %s of %s" % (dn, page, pages))
+					return
+
+	def get_aci_object_stream(self, dn, attributes=None, chunk_size=65536, query_target=None,
+								target_subtree_class=None, query_target_filter=None, rsp_subtree=None,
+								rsp_prop_include=None, rsp_subtree_filter=None):
+		"""
+		Streaming version of get_aci_object: imdata is parsed while the answer is downloaded and records are
+		yielded one at a time, so memory does not grow with the size of the result.
+		:param dn: full MIT to reach the object or an AciQuery
+		:param attributes: optional list of attributes to keep in every record, e.g. ["dn", "operSt"].
+				Defaults to the AciQuery properties
+		:param chunk_size: bytes read from the socket at a time
+		:param query_target: Refer to Cisco APIC REST API Configuration Guide
+		:param target_subtree_class: Refer to Cisco APIC REST API Configuration Guide
+		:param query_target_filter: Refer to Cisco APIC REST API Configuration Guide
+		:param rsp_subtree: Specifies child object level included in the response
+		:param rsp_prop_include: Refer to Cisco APIC REST API Configuration Guide
+		:param rsp_subtree_filter: Refer to Cisco APIC REST API Configuration Guide
+		:return: A generator of imdata records
+		"""
+		url = self._aci_object_url(dn, query_target=query_target, target_subtree_class=target_subtree_class,
+									query_target_filter=query_target_filter, rsp_subtree=rsp_subtree,
+									rsp_prop_include=rsp_prop_include, rsp_subtree_filter=rsp_subtree_filter)
+		if not attributes and isinstance(dn, AciQuery):
+			attributes = dn.properties
+		data = self.api_get(url, stream=True)
+		if not data:
+			return
+		with data:
+			for record in iter_items(data.iter_content(chunk_size), "imdata"):
+				if attributes:
+					record = project(record, attributes)
+				yield record
+
+	def get_aci_objects(self, queries, page_size=1000, max_workers=4):
+		"""
+		Runs many MIT queries, and all their pages, in parallel over a bounded pool of workers.
+		Example:
+		queries = {"ports": "/class/ethpmPhysIf.json",
+					"vlans": {"dn": "/class/vlanCktEp.json", "query_target_filter": 'wcard(vlanCktEp.epgDn,"epg")'}}
+		:param queries: A dictionary of name: query. A query is either a dn, an AciQuery or a dictionary of
+				get_aci_object arguments. A list of dn is accepted too, the dn is then used as name
+		:param page_size: number of records per page
+		:param max_workers: max number of concurrent requests towards this APIC
+		:return: A dictionary of name: json with the same totalCount/imdata layout returned by get_aci_object.
+				A query is set to False if any of its pages failed
+		"""
+		if not isinstance(queries, dict):
+			queries = {str(dn): dn for dn in queries}
+		# Make sure the token is valid once, before workers start sharing it
+		self.check_token_validity()
+		prepared = {}
+		pages = {}
+		failed = set()
+		with ThreadPoolExecutor(max_workers=max_workers) as executor:
+			pending = {}
+			for name, query in queries.items():
+				query = dict(query) if isinstance(query, dict) else {"dn": query}
+				dn = query.pop("dn")
+				query.setdefault("order_by", self._default_order_by(dn))
+				prepared[name] = (dn, query)
+				pending[executor.submit(self._get_aci_page, dn, 0, page_size, **query)] = (name, 0)
+			while pending:
+				done, _ = wait(pending, return_when=FIRST_COMPLETED)
+				for future in done:
+					name, page = pending.pop(future)
+					result = future.result()
+					if name in failed:
+						continue
+					if not result:
+						LOG.warning("Query %s failed on page %s" % (name, page))
+						failed.add(name)
+						continue
+					pages.setdefault(name, {})[page] = result["imdata"]
+					if page == 0:
+						total = int(result["totalCount"])
+						dn, query = prepared[name]
+						for next_page in range(1, math.ceil(total / page_size)):
+							pending[executor.submit(self._get_aci_page, dn, next_page, page_size, **query)] = (
+								name, next_page)
+		results = {}
+		for name in queries:
+			if name in failed:
+				results[name] = False
 				continue
-			if args[arg]:
-				url_filter += "%s=%s&" % (arg.replace("_", "-"), args[arg])
-		url = "%s/%s%s" % (self.url, dn, url_filter)
-		data = self.api_get(url)
-		return data.json()
+			imdata = [record for page in sorted(pages[name]) for record in pages[name][page]]
+			results[name] = {"totalCount": str(len(imdata)), "imdata": imdata}
+		return results
+
+	def get_subscription_manager(self, refresh_interval=30, refresh_timeout=60, on_error=None):
+		"""
+		Creates a SubscriptionManager to receive change notifications instead of polling.
+		Requires the websocket-client package.
+		:param refresh_interval: seconds between two subscriptionRefresh rounds
+		:param refresh_timeout: seconds the APIC keeps a subscription alive without refresh
+		:param on_error: optional callable called with the exception when the event socket fails
+		:return: A libs.apic_subscription.SubscriptionManager, to be opened
+		"""
+		# Imported here so websocket-client is only needed by subscription users
+		from .apic_subscription import SubscriptionManager
+		return SubscriptionManager(self, refresh_interval=refresh_interval, refresh_timeout=refresh_timeout,
+									on_error=on_error)
 
 	def take_snapshot(self, description, timeout=15):
 		"""
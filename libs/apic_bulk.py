@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+import logging
+from collections import namedtuple
+from .dn import split
+
+LOG = logging.getLogger("__name__")
+
+# Outcome of one object of a bulk write. batched is True when the object shared its POST with other objects
+PostResult = namedtuple("PostResult", ["dn", "success", "error", "batched"])
+
+# One POST: url relative to the API root, json body, and the indexes of the input objects it carries
+Batch = namedtuple("Batch", ["url", "body", "indexes"])
+
+# Class of the container MOs an object can be nested in, by RN prefix. Objects below an RN missing from this table
+# can't be wrapped by their parents and are posted on their own
+PARENT_CLASSES = {
+	"uni": "polUni", "tn": "fvTenant", "ap": "fvAp", "epg": "fvAEPg", "esg": "fvESg", "BD": "fvBD", "ctx": "fvCtx",
+	"brc": "vzBrCP", "subj": "vzSubj", "flt": "vzFilter", "out": "l3extOut", "instP": "l3extInstP",
+	"lnodep": "l3extLNodeP", "lifp": "l3extLIfP", "infra": "infraInfra", "attentp": "infraAttEntityP",
+	"accportprof": "infraAccPortP", "nprof": "infraNodeP", "funcprof": "infraFuncP", "fabric": "fabricInst",
+	"vlanns": "fvnsVlanInstP", "phys": "physDomP", "l3dom": "l3extDomP",
+}
+
+
+def mo_dn(mo:dict) -> str:
+	"""dn attribute of a MO dictionary like {"fvTenant": {"attributes": {"dn": "uni/tn-common"}}}, None if missing"""
+	try:
+		_, body = next(iter(mo.items()))
+		return body["attributes"].get("dn") or None
+	except (StopIteration, AttributeError, KeyError, TypeError):
+		return None
+
+
+def mo_size(mo:dict) -> int:
+	"""Number of objects of a MO dictionary, nested children included"""
+	_, body = next(iter(mo.items()))
+	return 1 + sum(mo_size(child) for child in body.get("children", []))
+
+
+def _nestable(rns:tuple) -> bool:
+	"""True if every ancestor of the dn has a known class, i.e. the object can be nested under polUni"""
+	return len(rns) > 1 and rns[0] == "uni" and all(rn.split("-", 1)[0] in PARENT_CLASSES for rn in rns[1:-1])
+
+
+def _tree(objects:list, rns:dict, indexes:list) -> dict:
+	"""Builds the polUni payload of a batch. Ancestors that are not part of the batch only carry their dn, so
+	they are left untouched when they exist"""
+	root = {"children": {}, "mo": None}
+	for index in indexes:
+		node = root
+		for rn in rns[index][1:]:
+			node = node["children"].setdefault(rn, {"children": {}, "mo": None})
+		node["mo"] = objects[index]
+
+	def render(node, path):
+		if node["mo"] is not None:
+			class_name, body = next(iter(node["mo"].items()))
+			attributes, children = body["attributes"], list(body.get("children", []))
+		else:
+			class_name, attributes, children = PARENT_CLASSES[path[-1].split("-", 1)[0]], {"dn": "/".join(path)}, []
+		children.extend(render(child, path + (rn,)) for rn, child in node["children"].items())
+		rendered = {"attributes": attributes}
+		if children:
+			rendered["children"] = children
+		return {class_name: rendered}
+
+	return render(root, ("uni",))
+
+
+def plan_batches(objects:list, max_objects:int =500) -> tuple:
+	"""Groups MOs into as few POSTs as possible.
+	Objects are partitioned by tenant (or first RN under uni), partitions don't share any parent and can be posted
+	in parallel. Inside a partition objects are sorted by dn, so parents come before their children, and cut in
+	batches of up to max_objects nested under a single polUni posted to mo/uni.json. Batches of a partition must be
+	posted in order. Objects outside uni, or below a container missing from PARENT_CLASSES, get a POST of their own.
+
+	Args:
+		objects (list): MO dictionaries, each with a dn attribute
+		max_objects (int, optional): objects per POST, nested children included. Defaults to 500.
+
+	Returns:
+		tuple: (partitions, invalid) where partitions is a list of lists of Batch and invalid the indexes of the
+			objects without a dn
+	"""
+	rns, invalid, partitions = {}, [], {}
+	for index, mo in enumerate(objects):
+		dn = mo_dn(mo)
+		if dn is None:
+			invalid.append(index)
+			continue
+		rns[index] = split(dn)
+		partitions.setdefault(rns[index][:2], []).append(index)
+
+	plans = []
+	for key in sorted(partitions):
+		batches, current, size = [], [], 0
+		for index in sorted(partitions[key], key=lambda index: rns[index]):
+			nestable = _nestable(rns[index])
+			weight = mo_size(objects[index])
+			if current and (not nestable or size + weight > max_objects):
+				batches.append(Batch("mo/uni.json", _tree(objects, rns, current), tuple(current)))
+				current, size = [], 0
+			if not nestable:
+				batches.append(Batch("mo/%s.json" % mo_dn(objects[index]), objects[index], (index,)))
+				continue
+			current.append(index)
+			size += weight
+		if current:
+			batches.append(Batch("mo/uni.json", _tree(objects, rns, current), tuple(current)))
+		plans.append(batches)
+	return plans, invalid
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+
+import time
+import logging
+import threading
+import requests
+from .apic import Apic
+from .policy import RequestPolicy, _not_sent
+
+LOG = logging.getLogger("__name__")
+
+BALANCING = ("round_robin", "least_latency")
+
+
+class _Member(object):
+	"""One APIC of the cluster: its own handle, so its own session and token, plus health counters"""
+
+	def __init__(self, handle):
+		self.handle = handle
+		self.latency = None
+		self.requests = 0
+		self.failures = 0
+		self.consecutive_failures = 0
+		self.down_until = 0.0
+		self.last_error = None
+
+	def healthy(self, now):
+		return self.down_until <= now
+
+
+class ApicCluster(Apic):
+	"""
+	Apic handle spread over all the controllers of a cluster.
+	Every member has its own session and token. Reads go to the healthy members in turn (round_robin) or to the
+	fastest one (least_latency), and move on to the next member on connection errors, timeouts and 5xx answers.
+	A failing member is left aside for cooldown seconds, doubled on every consecutive failure.
+	Writes go to the first healthy member and only fail over when the request could not be sent.
+	Subscriptions are pinned to the first member, the one whose token opens the event socket.
+	Usage:
+	cluster = ApicCluster(["10.0.0.1", "10.0.0.2", "10.0.0.3"], credentials=variables.apic_credentials)
+	ports = cluster.get_aci_object_paged("/class/ethpmPhysIf.json")
+	print(cluster.health)
+	"""
+
+	def __init__(self, addresses, credentials=None, balancing="round_robin", cooldown=10, max_cooldown=300,
+				pool_maxsize=10, max_retries=0, pool_block=False, cache=None, policy=None):
+		"""
+		:param addresses: list of the cluster controllers, IP Address or FQDN
+		:param credentials: a dictionary like {'username': '', 'password': '', 'domain': ''}
+		:param balancing: round_robin or least_latency
+		:param cooldown: seconds a member is left aside after a failure
+		:param max_cooldown: max seconds a member is left aside after consecutive failures
+		:param pool_maxsize: max number of keep-alive connections towards each member
+		:param max_retries: connection level retries
+		:param pool_block: wait for a free pooled connection instead of opening a new one
+		:param cache: optional libs.cache.ResponseCache shared by the cluster
+		:param policy: optional libs.policy.RequestPolicy of the members. Failover only happens once its
+				retries are exhausted, so a policy with few retries fails over faster. Defaults to one retry
+		"""
+		if balancing not in BALANCING:
+			raise ValueError("Unknown balancing %s, use one of %s" % (balancing, ", ".join(BALANCING)))
+		if not addresses:
+			raise ValueError("An APIC cluster needs at least one address")
+		policy = policy or RequestPolicy(retries=1)
+		self._members = [_Member(Apic(address, pool_maxsize=pool_maxsize, max_retries=max_retries,
+										pool_block=pool_block, policy=policy)) for address in addresses]
+		self._balancing = balancing
+		self._cooldown = cooldown
+		self._max_cooldown = max_cooldown
+		self._next = 0
+		self._health_lock = threading.Lock()
+		# The cluster URL is the first member one, it is rewritten for the member serving each request
+		super().__init__(addresses[0], pool_maxsize=1, cache=cache, policy=policy)
+		self._credentials = credentials
+		if credentials:
+			self.get_apic_token(credentials)
+
+	def close(self):
+		"""
+		Closes the connections towards every member
+		:return: Nothing
+		"""
+		for member in self._members:
+			member.handle.close()
+		super().close()
+
+	@property
+	def members(self):
+		"""Get the member addresses"""
+		return [member.handle.address for member in self._members]
+
+	@property
+	def token(self):
+		"""Get the token of the first member, the one subscriptions are pinned to"""
+		return self._members[0].handle.token
+
+	@token.setter
+	def token(self, value):
+		"""Tokens are per member"""
+		pass
+
+	@property
+	def token_timeout(self):
+		"""Get the earliest token expiry of the members"""
+		timeouts = [member.handle.token_timeout for member in self._members if member.handle.token_timeout]
+		return min(timeouts) if timeouts else None
+
+	@token_timeout.setter
+	def token_timeout(self, value):
+		"""Tokens are per member"""
+		pass
+
+	@property
+	def token_refreshes(self):
+		"""Number of aaaRefresh calls done by all the members"""
+		return sum(member.handle.token_refreshes for member in self._members)
+
+	@property
+	def token_relogins(self):
+		"""Number of times members had to authenticate again"""
+		return sum(member.handle.token_relogins for member in self._members)
+
+	@property
+	def health(self):
+		"""
+		Get the health of every member
+		:return: {address: {"healthy", "score", "latency", "requests", "failures", "consecutive_failures",
+				"last_error"}}. score goes from 0 (every request failed) to 1
+		"""
+		now = time.monotonic()
+		with self._health_lock:
+			return {member.handle.address: {
+				"healthy": member.healthy(now),
+				"score": 1 - member.failures / member.requests if member.requests else 1.0,
+				"latency": member.latency, "requests": member.requests, "failures": member.failures,
+				"consecutive_failures": member.consecutive_failures, "last_error": member.last_error}
+				for member in self._members}
+
+	def get_apic_token(self, credentials):
+		"""
+		Authenticates every member. Members that can't be reached are left aside and retried later
+		:param credentials: a dictionary like {'username': '', 'password': '', 'domain': ''}
+		:return: Bool, True if at least one member is authenticated
+		"""
+		if not self.credentials:
+			self._credentials = credentials
+		authenticated = 0
+		for member in self._members:
+			if self._login(member):
+				authenticated += 1
+		LOG.info("APIC cluster authenticated on %s of %s members" % (authenticated, len(self._members)))
+		return authenticated > 0
+
+	def _login(self, member):
+		"""
+		:param member: the member to authenticate
+		:return: Bool
+		"""
+		try:
+			if member.handle.get_apic_token(self.credentials):
+				return True
+			self._record(member, "authentication failed")
+		except requests.exceptions.RequestException as e:
+			self._record(member, str(e))
+		return False
+
+	def check_token_validity(self):
+		"""
+		Tokens are checked per member, right before each request
+		:return: Bool
+		"""
+		return True
+
+	def start_token_refresher(self, margin=120):
+		"""
+		Starts the token refresher of every authenticated member
+		:param margin: seconds
+		:return: Bool
+		"""
+		return all([member.handle.start_token_refresher(margin) for member in self._members
+					if member.handle.token_timeout])
+
+	def stop_token_refresher(self):
+		"""
+		:return: Nothing
+		"""
+		for member in getattr(self, "_members", []):
+			member.handle.stop_token_refresher()
+
+	def _record(self, member, error=None, latency=None):
+		"""
+		Updates the health counters of a member after a request
+		:param member: the member
+		:param error: None on success, otherwise the reason of the failure
+		:param latency: seconds, on success
+		:return: Nothing
+		"""
+		with self._health_lock:
+			member.requests += 1
+			if error is None:
+				member.consecutive_failures = 0
+				member.latency = latency if member.latency is None else 0.8 * member.latency + 0.2 * latency
+				return
+			member.failures += 1
+			member.consecutive_failures += 1
+			member.last_error = error
+			cooldown = min(self._cooldown * 2 ** (member.consecutive_failures - 1), self._max_cooldown)
+			member.down_until = time.monotonic() + cooldown
+		LOG.warning("APIC %s failed (%s), left aside for %ss" % (member.handle.address, error, cooldown))
+
+	def _candidates(self, method, url):
+		"""
+		Orders the members for a request: healthy ones according to the balancing, then the others as a last resort.
+		Writes always prefer the first healthy member
+		:param method: HTTP method
+		:param url: the request URL
+		:return: list of members
+		"""
+		if "subscription" in url:
+			return [self._members[0]]
+		now = time.monotonic()
+		with self._health_lock:
+			healthy = [member for member in self._members if member.healthy(now)]
+			down = sorted((member for member in self._members if not member.healthy(now)),
+						key=lambda member: member.down_until)
+			if method != "GET":
+				pass
+			elif self._balancing == "least_latency":
+				healthy.sort(key=lambda member: member.latency or 0)
+			elif healthy:
+				start = self._next % len(healthy)
+				healthy = healthy[start:] + healthy[:start]
+				self._next += 1
+		return healthy + down
+
+	def _request(self, method, url, **kwargs):
+		"""
+		Sends a request to a member, failing over to the next one when it can't answer
+		:param method: HTTP method
+		:param url: A well formatted URL, on the cluster URL
+		:return: A requests answer
+		"""
+		path = url[len(self.url):] if url.startswith(self.url) else "/%s" % url.lstrip("/")
+		candidates = self._candidates(method, url)
+		error = None
+		for index, member in enumerate(candidates):
+			last = index == len(candidates) - 1
+			if not member.handle.token_timeout and not self._login(member):
+				continue
+			start = time.perf_counter()
+			try:
+				member.handle.check_token_validity()
+				result = member.handle._request(method, member.handle.url + path, **kwargs)
+			except requests.exceptions.ConnectionError as e:
+				self._record(member, str(e))
+				# A reset after the body was sent may have been applied: only a read, or a write that could not
+				# even be sent, is safe to send to another member
+				if method != "GET" and not _not_sent(e):
+					raise
+				error = e
+				continue
+			except requests.exceptions.Timeout as e:
+				self._record(member, str(e))
+				error = e
+				if method == "GET":
+					continue
+				raise
+			if result.status_code >= 500:
+				self._record(member, "HTTP %s" % result.status_code)
+				if method == "GET" and not last:
+					continue
+				return result
+			self._record(member, latency=time.perf_counter() - start)
+			return result
+		if error is None:
+			error = requests.exceptions.ConnectionError("No APIC cluster member could be authenticated")
+		raise error
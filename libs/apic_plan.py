@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+import logging
+from collections import namedtuple
+from .dn import split
+
+LOG = logging.getLogger("__name__")
+
+# Attributes that identify or act on an object, never compared
+_IDENTITY = frozenset(("dn", "rn", "status"))
+
+
+class Plan(namedtuple("Plan", ["added", "modified", "deleted", "unchanged", "previous"])):
+	"""
+	Outcome of diff: MO dictionaries ready to be posted, without children.
+	added and modified carry the full desired attributes and the changed ones only, deleted carries status deleted.
+	unchanged is the number of desired objects already in place, previous {dn: {attribute: current value}} the
+	values modified objects had.
+	"""
+	__slots__ = ()
+
+	@property
+	def objects(self) -> list:
+		"""Every object to post, see Apic.api_post_bulk"""
+		return self.added + self.modified + self.deleted
+
+	@property
+	def empty(self) -> bool:
+		"""True when the APIC is already in the desired state"""
+		return not (self.added or self.modified or self.deleted)
+
+	def summary(self) -> str:
+		"""Human readable plan, one line per object: + added, ~ modified with old and new values, - deleted"""
+		lines = []
+		for sign, objects in (("+", self.added), ("~", self.modified), ("-", self.deleted)):
+			for mo in objects:
+				class_name, body = next(iter(mo.items()))
+				dn = body["attributes"]["dn"]
+				line = "%s %s %s" % (sign, class_name, dn)
+				if sign == "~":
+					line += " " + ", ".join("%s: %r -> %r" % (name, self.previous[dn].get(name), value)
+											for name, value in sorted(body["attributes"].items())
+											if name not in _IDENTITY)
+				lines.append(line)
+		lines.append("%s to add, %s to modify, %s to delete, %s unchanged" % (
+			len(self.added), len(self.modified), len(self.deleted), self.unchanged))
+		return "\n".join(lines)
+
+
+def flatten(records) -> dict:
+	"""Indexes MO trees by dn, e.g. imdata records of an rsp-subtree=full query or the desired configuration.
+	Children are located by their dn, or by their rn below the parent dn. The tree is walked once, without recursion.
+
+	Args:
+		records (list): MO dictionaries like {"fvTenant": {"attributes": {"dn": ...}, "children": [...]}}
+
+	Raises:
+		ValueError: an object has neither dn nor rn, or a top level object has no dn
+
+	Returns:
+		dict: {dn: (class name, attributes)}. Attributes are the original dictionaries, children are dropped
+	"""
+	objects = {}
+	stack = [(record, None) for record in reversed(list(records))]
+	while stack:
+		record, parent_dn = stack.pop()
+		class_name, body = next(iter(record.items()))
+		attributes = body.get("attributes", {})
+		dn = attributes.get("dn")
+		if not dn:
+			if parent_dn is None or not attributes.get("rn"):
+				raise ValueError("%s object without dn%s" % (class_name, "" if parent_dn is None else
+																" or rn below %s" % parent_dn))
+			dn = "%s/%s" % (parent_dn, attributes["rn"])
+		objects[dn] = (class_name, attributes)
+		for child in reversed(body.get("children", [])):
+			stack.append((child, dn))
+	return objects
+
+
+def _deleted_ancestor(dn:str, deleted:set) -> bool:
+	"""True if an ancestor of dn is deleted, its deletion removes dn too"""
+	rns = split(dn)
+	return any("/".join(rns[:depth]) in deleted for depth in range(1, len(rns)))
+
+
+def diff(current, desired, prune:bool =False) -> Plan:
+	"""Compares the current configuration with the desired one, in a time linear in the number of objects.
+	Only the attributes set in the desired objects are compared, the others are left to the APIC. Values are
+	compared as strings, the way the APIC returns them. A desired object with status deleted is deleted if present.
+
+	Args:
+		current (list): imdata records of the current subtrees, queried with rsp-subtree=full
+		desired (list): desired MO trees, objects located by dn or by rn below their parent
+		prune (bool, optional): also delete the current objects missing from desired. Only classes that appear in
+			desired are pruned, the children the APIC creates on its own are kept. Defaults to False.
+
+	Returns:
+		Plan: what to post
+	"""
+	current, desired = flatten(current), flatten(desired)
+	added, modified, deleted, previous, unchanged = [], [], [], {}, 0
+	for dn, (class_name, attributes) in desired.items():
+		existing = current.get(dn)
+		if attributes.get("status") == "deleted":
+			if existing is not None:
+				deleted.append(dn)
+			continue
+		if existing is None:
+			added.append({class_name: {"attributes": dict(attributes, dn=dn)}})
+			continue
+		changed = {name: value for name, value in attributes.items()
+					if name not in _IDENTITY and str(value) != existing[1].get(name)}
+		if not changed:
+			unchanged += 1
+			continue
+		previous[dn] = {name: existing[1].get(name) for name in changed}
+		modified.append({class_name: {"attributes": dict(changed, dn=dn)}})
+	if prune:
+		managed = {class_name for class_name, _ in desired.values()}
+		deleted.extend(dn for dn, (class_name, _) in current.items() if class_name in managed and dn not in desired)
+	# The deletion of a parent covers its children
+	removed = set(deleted)
+	deleted = [{current[dn][0]: {"attributes": {"dn": dn, "status": "deleted"}}} for dn in deleted
+				if not _deleted_ancestor(dn, removed)]
+	LOG.debug("Plan: %s added, %s modified, %s deleted, %s unchanged" % (len(added), len(modified), len(deleted),
+																			unchanged))
+	return Plan(added, modified, deleted, unchanged, previous)
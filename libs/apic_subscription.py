@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+import re
+import ssl
+import json
+import queue
+import logging
+import threading
+from collections import namedtuple
+import websocket
+
+LOG = logging.getLogger("__name__")
+
+# status is one of created, modified, deleted. attributes only carries the properties that changed plus dn
+Event = namedtuple("Event", ["subscription_id", "class_name", "status", "dn", "attributes"])
+
+
+class SubscriptionManager(object):
+	"""
+	Receives APIC change notifications over the event WebSocket instead of polling.
+	Queries are sent with subscription=yes, the APIC then pushes created/modified/deleted objects on the socket.
+	Subscriptions are refreshed on a background thread before they expire. If the socket drops, events() ends,
+	on_error is called, error tells why, and the manager has to be opened again, subscriptions included.
+	Usage:
+	with apic_conn.get_subscription_manager() as subscriptions:
+		subscriptions.subscribe("/class/faultInst.json", callback=handle_fault)
+		for event in subscriptions.events():
+			...
+	"""
+
+	def __init__(self, apic, refresh_interval:int =30, refresh_timeout:int =60, on_error=None):
+		"""
+		Args:
+			apic (Apic): an authenticated handle. Its token is used to open the socket
+			refresh_interval (int, optional): seconds between two subscriptionRefresh rounds. Defaults to 30.
+			refresh_timeout (int, optional): seconds the APIC keeps a subscription alive without refresh. Defaults to 60.
+			on_error (callable, optional): called with the exception when the socket fails, from the reader thread.
+				Lets callback only users know they have to open the manager again.
+		"""
+		self._apic = apic
+		self._refresh_interval = refresh_interval
+		self._refresh_timeout = refresh_timeout
+		self._on_error = on_error
+		self._error = None
+		self._socket = None
+		self._subscriptions = {}
+		self._lock = threading.Lock()
+		# Serializes the deliveries of the reader thread and the replays of subscribe, so events keep their order
+		self._delivery = threading.RLock()
+		# Events of subscription ids not registered yet, kept while subscribe calls are in flight
+		self._subscribing = 0
+		self._pending = {}
+		self._events = queue.Queue()
+		self._closing = threading.Event()
+		self._reader = None
+		self._refresher = None
+
+	def __enter__(self):
+		self.open()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	@property
+	def subscriptions(self) -> dict:
+		"""Get a copy of the active subscriptions, {subscription id: query}"""
+		with self._lock:
+			return {subscription_id: subscription[0] for subscription_id, subscription in self._subscriptions.items()}
+
+	@property
+	def error(self):
+		"""Get the exception the event socket failed with, None while it is open or after a regular close"""
+		return self._error
+
+	def _socket_url(self) -> str:
+		"""wss://<apic>/socket<token>"""
+		base = re.sub(r"^http", "ws", self._apic.url)
+		base = re.sub(r"/api/?$", "", base)
+		return "%s/socket%s" % (base, self._apic.token["APIC-cookie"])
+
+	def open(self):
+		"""Opens the event socket and starts the reader and refresher threads
+		"""
+		self._apic.check_token_validity()
+		LOG.debug("Opening APIC %s event socket" % self._apic.address)
+		self._socket = websocket.create_connection(self._socket_url(), sslopt={"cert_reqs": ssl.CERT_NONE})
+		self._closing.clear()
+		self._error = None
+		# A fresh queue, the previous one may still hold the end marker of the last close or socket failure
+		self._events = queue.Queue()
+		self._reader = threading.Thread(target=self._read, daemon=True, name="apic-events-%s" % self._apic.address)
+		self._refresher = threading.Thread(target=self._refresh, daemon=True,
+											name="apic-subscriptions-%s" % self._apic.address)
+		self._reader.start()
+		self._refresher.start()
+
+	def close(self):
+		"""Stops refreshing the subscriptions, the APIC drops them once they time out, and closes the socket
+		"""
+		self._closing.set()
+		if self._socket:
+			self._socket.close()
+		for thread in (self._reader, self._refresher):
+			if thread:
+				thread.join()
+		self._reader = self._refresher = None
+		with self._lock:
+			self._subscriptions.clear()
+			self._pending.clear()
+		# Wake up consumers of events()
+		self._events.put(None)
+
+	def subscribe(self, dn, callback=None, **query):
+		"""Runs a query with subscription=yes. Events for it are delivered to callback if given, otherwise to events()
+
+		Args:
+			dn (str): full MIT to reach the object or an AciQuery, like for Apic.get_aci_object
+			callback (callable, optional): called with every Event, from the reader thread
+			query: get_aci_object query options
+
+		Returns:
+			dict: the query answer, with subscriptionId and the current imdata. False on failure
+		"""
+		url = self._apic._aci_object_url(dn, subscription="yes", refresh_timeout=self._refresh_timeout, **query)
+		# Events of the new subscription can reach the reader before the answer gives us its id, they are kept
+		# aside until then
+		with self._lock:
+			self._subscribing += 1
+		result, pending = None, []
+		try:
+			# Subscriptions must never be served from the response cache
+			data = self._apic._api_get(url)
+			if data:
+				result = data.json()
+		finally:
+			with self._delivery:
+				with self._lock:
+					self._subscribing -= 1
+					if result:
+						self._subscriptions[result["subscriptionId"]] = (dn, callback)
+						pending = self._pending.pop(result["subscriptionId"], [])
+					if not self._subscribing:
+						self._pending.clear()
+				for records in pending:
+					self._deliver(result["subscriptionId"], callback, records)
+		if not result:
+			LOG.warning("Subscription to %s failed" % dn)
+			return False
+		LOG.debug("Subscribed to %s with id %s" % (dn, result["subscriptionId"]))
+		return result
+
+	def unsubscribe(self, subscription_id:str):
+		"""Stops refreshing a subscription and delivering its events"""
+		with self._lock:
+			self._subscriptions.pop(subscription_id, None)
+
+	def events(self, timeout:float =None):
+		"""Yields events of all the subscriptions as they arrive
+
+		Args:
+			timeout (float, optional): stop after this many seconds without events. Defaults to waiting forever.
+
+		Yields:
+			Event: one per changed object
+		"""
+		while True:
+			try:
+				event = self._events.get(timeout=timeout)
+			except queue.Empty:
+				return
+			if event is None:
+				return
+			yield event
+
+	def _read(self):
+		"""Reader thread body"""
+		while not self._closing.is_set():
+			try:
+				message = json.loads(self._socket.recv())
+			except (websocket.WebSocketException, OSError, ValueError) as e:
+				if not self._closing.is_set():
+					LOG.error("APIC %s event socket failed: %s" % (self._apic.address, e))
+					self._error = e
+					self._events.put(None)
+					if self._on_error:
+						try:
+							self._on_error(e)
+						except Exception:
+							LOG.exception("Subscription error callback failed")
+				return
+			records = message.get("imdata", [])
+			for subscription_id in message.get("subscriptionId", []):
+				with self._delivery:
+					with self._lock:
+						subscription = self._subscriptions.get(subscription_id)
+						if not subscription and self._subscribing:
+							self._pending.setdefault(subscription_id, []).append(records)
+					if subscription:
+						self._deliver(subscription_id, subscription[1], records)
+
+	def _deliver(self, subscription_id:str, callback, records:list):
+		"""Hands the imdata records of a notification to the subscription callback, or to events()"""
+		for record in records:
+			for class_name, body in record.items():
+				attributes = body["attributes"]
+				event = Event(subscription_id, class_name, attributes.get("status"), attributes.get("dn"), attributes)
+				if not callback:
+					self._events.put(event)
+					continue
+				try:
+					callback(event)
+				except Exception:
+					LOG.exception("Subscription callback failed")
+
+	def _refresh(self):
+		"""Refresher thread body"""
+		while not self._closing.wait(self._refresh_interval):
+			for subscription_id in self.subscriptions:
+				if not self._apic._api_get("%s/subscriptionRefresh.json?id=%s" % (self._apic.url, subscription_id)):
+					LOG.warning("Subscription %s could not be refreshed, dropping it" % subscription_id)
+					self.unsubscribe(subscription_id)
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+
+import math
+import time
+import asyncio
+import logging
+import aiohttp
+from .apic import Apic
+
+LOG = logging.getLogger("__name__")
+
+
+class AsyncApic(object):
+	"""
+	asyncio counterpart of Apic. A single event loop can drive many of these handles.
+	Usage:
+	async with AsyncApic(address, credentials) as apic_conn:
+		ports = await apic_conn.get_aci_object("/class/ethpmPhysIf.json")
+	"""
+
+	# URL helpers do not do any I/O and are shared with the blocking client
+	_auth_payload = staticmethod(Apic._auth_payload)
+	_default_order_by = staticmethod(Apic._default_order_by)
+	_project_result = staticmethod(Apic._project_result)
+	_aci_object_url = Apic._aci_object_url
+
+	def __init__(self, address, credentials=None, pool_maxsize=10, max_concurrency=10, connect_timeout=5,
+				read_timeout=60):
+		"""
+		The HTTP session is created, and the login performed, when entering the context manager
+		:param address: IP Address or FQDN
+		:param credentials: a dictionary like {'username': '', 'password': '', 'domain': ''}
+		:param pool_maxsize: max number of keep-alive connections towards the APIC
+		:param max_concurrency: max number of requests in flight towards the APIC
+		:param connect_timeout: seconds to open a connection
+		:param read_timeout: seconds to wait for the APIC between two reads
+		"""
+		LOG.debug("Creating a new async APIC handle on %s address" % address)
+
+		# Attribute initialization
+		self._session = None
+		self._pool_maxsize = pool_maxsize
+		self._timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+		self._semaphore = asyncio.Semaphore(max_concurrency)
+		self._address = address
+		self._url = "https://%s/api" % address
+		self._token = None
+		self._token_timeout = None
+		self._credentials = credentials
+		self._token_lock = asyncio.Lock()
+
+	async def __aenter__(self):
+		await self.open()
+		return self
+
+	async def __aexit__(self, exc_type, exc_value, traceback):
+		await self.close()
+
+	async def open(self):
+		"""
+		Creates the pooled HTTP session and authenticates if credentials were given
+		:return: Nothing
+		"""
+		if self._session is None:
+			connector = aiohttp.TCPConnector(limit=self._pool_maxsize, ssl=False)
+			self._session = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar(),
+													timeout=self._timeout)
+		if self.credentials and not self.token:
+			await self.get_apic_token(self.credentials)
+
+	async def close(self):
+		"""
+		Closes all the pooled connections towards the APIC
+		:return: Nothing
+		"""
+		LOG.debug("Closing async APIC handle on %s address" % self.address)
+		if self._session is not None:
+			await self._session.close()
+			self._session = None
+
+	@property
+	def address(self):
+		"""Get address"""
+		return self._address
+
+	@property
+	def credentials(self):
+		"""Get credentials"""
+		return self._credentials
+
+	@credentials.setter
+	def credentials(self, value):
+		"""Set the credentials"""
+		self._credentials = value
+
+	@property
+	def token(self):
+		"""Get token"""
+		return self._token
+
+	@token.setter
+	def token(self, value):
+		"""Set the token"""
+		self._token = value
+
+	@property
+	def token_timeout(self):
+		"""Get token_timeout"""
+		return self._token_timeout
+
+	@token_timeout.setter
+	def token_timeout(self, value):
+		"""Set the token_timeout"""
+		self._token_timeout = value
+
+	@property
+	def url(self):
+		"""Get url"""
+		return self._url
+
+	@url.setter
+	def url(self, value):
+		"""Set the url"""
+		self._url = value
+
+	async def _request(self, method, url, **kwargs):
+		"""
+		Every HTTP call towards the APIC goes through here. Concurrency is bounded per controller.
+		:param method: HTTP method
+		:param url: A well formatted URL
+		:return: A tuple; [0] - HTTP status code, [1] - the answer body, parsed if json
+		"""
+		async with self._semaphore:
+			async with self._session.request(method, url, cookies=self.token, **kwargs) as response:
+				if response.content_type == "application/json":
+					return response.status, await response.json()
+				return response.status, await response.text()
+
+	async def get_aaa_domains(self):
+		"""
+		This APIC call can be run before authentication. It will list the available Auth domains
+		:return: A tuple;
+		[0] - bool - will tell if connection was good,
+		[1] if [0] si False will return the reason why connection failed. Else will return a set of domains.
+		"""
+		try:
+			status, r_json = await self._request("GET", "%s/aaaListDomains.json" % self.url,
+												timeout=aiohttp.ClientTimeout(total=2))
+		except asyncio.TimeoutError:
+			return False, "Timeout reaching the APIC"
+		if not status == 200:
+			return False, r_json
+		return True, set(record["name"] for record in r_json["imdata"])
+
+	async def get_apic_token(self, credentials):
+		"""
+		Gets and Sets APIC Cookie
+		:param credentials: a dictionary like {'username': '', 'password': '', 'domain': ''}
+		:return: Bool
+		"""
+		if not self.credentials:
+			self._credentials = credentials
+		status, r_json = await self._request("POST", "%s/aaaLogin.json" % self.url, json=self._auth_payload(credentials))
+		if not status == 200:
+			LOG.error("APIC %s authentication failed. Code: %s. Error %s" % (self.address, status, r_json))
+			return False
+		LOG.debug("APIC %s authentication succeeded " % self.address)
+		self._set_token(r_json)
+		return True
+
+	def _set_token(self, r_json):
+		"""
+		:param r_json: aaaLogin or aaaRefresh answer
+		:return: Nothing
+		"""
+		self.token = {"APIC-cookie": "%s" % (r_json["imdata"][0]["aaaLogin"]["attributes"]["token"])}
+		self.token_timeout = int(r_json["imdata"][0]["aaaLogin"]["attributes"]["refreshTimeoutSeconds"]) + int(
+			time.time())
+
+	async def check_token_validity(self):
+		"""
+		This function will reset the token if timeout is less than 100 seconds from now
+		If timeout is expired it will re-auth. Only one coroutine refreshes, the others wait for it.
+		Nothing is done before the first login, there is no token to renew yet.
+		:return: Bool
+		"""
+		if not self.token_timeout or self.token_timeout - int(time.time()) > 100:
+			return True
+		async with self._token_lock:
+			if self.token_timeout - int(time.time()) > 100:
+				return True
+			elif 100 > self.token_timeout - int(time.time()) > 5:
+				LOG.debug("Token Valid for %s seconds, refreshing" % (self.token_timeout - int(time.time())))
+				status, r_json = await self._request("GET", "%s/aaaRefresh.json" % self.url)
+				if 199 < status < 300:
+					self._set_token(r_json)
+					return True
+				LOG.warning("APIC %s token refresh failed. Code: %s" % (self.address, status))
+			LOG.debug("Token invalid, re-authentication required")
+			return await self.get_apic_token(self.credentials)
+
+	async def _api_call(self, method, url, **kwargs):
+		"""
+		:param method: HTTP method
+		:param url: A well formatted URL
+		:return: The json answer if status_code == 200, else False
+		"""
+		await self.check_token_validity()
+		if self.url not in url:
+			url = "%s/%s" % (self.url, url)
+		LOG.debug("%s: %s" % (method, url))
+		status, body = await self._request(method, url, **kwargs)
+		if not 199 < status < 300:
+			LOG.warning("API %s failed. URL: %s ; Code %s and Error: %s" % (method, url, status, body))
+			return False
+		return body
+
+	async def api_get(self, url):
+		"""
+		:param url: A well formatted URL
+		:return: The json answer if status_code == 200
+		"""
+		return await self._api_call("GET", url)
+
+	async def api_delete(self, url):
+		"""
+		:param url: A well formatted URL
+		:return: The json answer if status_code == 200
+		"""
+		return await self._api_call("DELETE", url)
+
+	async def api_post(self, url, json_body=None, xml_body=None):
+		"""
+		Json has preference over XML if both are set.
+		:param url: A well formatted URL
+		:param json_body: payload to post
+		:param xml_body: payload to post
+		:return: The json answer if status_code == 200
+		"""
+		if json_body:
+			return await self._api_call("POST", url, json=json_body)
+		return await self._api_call("POST", url, data=xml_body, headers={'content-type': 'application/xml'})
+
+	async def get_aci_object(self, dn, query_target=None, target_subtree_class=None, query_target_filter=None,
+							rsp_subtree=None, rsp_prop_include=None, rsp_subtree_filter=None):
+		"""
+		Refer to Apic.get_aci_object
+		:return: json
+		"""
+		url = self._aci_object_url(dn, query_target=query_target, target_subtree_class=target_subtree_class,
+									query_target_filter=query_target_filter, rsp_subtree=rsp_subtree,
+									rsp_prop_include=rsp_prop_include, rsp_subtree_filter=rsp_subtree_filter)
+		return self._project_result(dn, await self.api_get(url))
+
+	async def _get_aci_page(self, dn, page, page_size, **query):
+		"""
+		:param dn: full MIT to reach the object
+		:param page: page number, starting from 0
+		:param page_size: number of records per page
+		:param query: APIC query options
+		:return: json or False
+		"""
+		return self._project_result(dn, await self.api_get(self._aci_object_url(dn, page=page, page_size=page_size, **query)))
+
+	async def get_aci_object_paged(self, dn, page_size=1000, order_by=None, query_target=None,
+									target_subtree_class=None, query_target_filter=None, rsp_subtree=None,
+									rsp_prop_include=None, rsp_subtree_filter=None):
+		"""
+		Refer to Apic.get_aci_object_paged. The next page is requested while the current one is being consumed.
+		:return: An async generator of imdata records
+		"""
+		query = {"query_target": query_target, "target_subtree_class": target_subtree_class,
+				"query_target_filter": query_target_filter, "rsp_subtree": rsp_subtree,
+				"rsp_prop_include": rsp_prop_include, "rsp_subtree_filter": rsp_subtree_filter,
+				"order_by": order_by or self._default_order_by(dn)}
+		result = await self._get_aci_page(dn, 0, page_size, **query)
+		if not result:
+			return
+		pages = math.ceil(int(result["totalCount"]) / page_size)
+		next_page = None
+		try:
+			for page in range(1, pages + 1):
+				next_page = asyncio.ensure_future(
+					self._get_aci_page(dn, page, page_size, **query)) if page < pages else None
+				for record in result["imdata"]:
+					yield record
+				if not next_page:
+					return
+				result = await next_page
+				if not result:
+					LOG.warning("Paged query on %s stopped at page %s of %s" % (dn, page, pages))
+					return
+		finally:
+			# The consumer may stop early, do not leave the prefetch behind
+			if next_page and not next_page.done():
+				next_page.cancel()
+
+	async def get_aci_objects(self, queries, page_size=1000):
+		"""
+		Refer to Apic.get_aci_objects. Concurrency is bounded by max_concurrency.
+		:param queries: A dictionary of name: query. A query is either a dn or a dictionary of get_aci_object
+				arguments. A list of dn is accepted too, the dn is then used as name
+		:param page_size: number of records per page
+		:return: A dictionary of name: json. A query is set to False if any of its pages failed
+		"""
+		if not isinstance(queries, dict):
+			queries = {str(dn): dn for dn in queries}
+		await self.check_token_validity()
+
+		async def get_query(query):
+			query = dict(query) if isinstance(query, dict) else {"dn": query}
+			dn = query.pop("dn")
+			query.setdefault("order_by", self._default_order_by(dn))
+			first = await self._get_aci_page(dn, 0, page_size, **query)
+			if not first:
+				return False
+			others = await asyncio.gather(*[self._get_aci_page(dn, page, page_size, **query)
+											for page in range(1, math.ceil(int(first["totalCount"]) / page_size))])
+			if not all(others):
+				return False
+			imdata = [record for result in [first] + others for record in result["imdata"]]
+			return {"totalCount": str(len(imdata)), "imdata": imdata}
+
+		results = await asyncio.gather(*[get_query(query) for query in queries.values()])
+		return dict(zip(queries, results))
+
+	async def take_snapshot(self, description, timeout=15):
+		"""
+		Refer to Apic.take_snapshot
+		:param description: description to set in the snapshot
+		:param timeout: how much time we should wait before checking if it was completed
+		:return: Bool
+		"""
+		body = {"configExportP": {
+			"attributes": {"snapshot": "true", "status": "created,modified", "adminSt": "triggered",
+							"descr": description}}}
+
+		if await self.api_post("mo/uni/fabric/configexp-devnet-1369.json", json_body=body):
+			await asyncio.sleep(timeout)
+			current_snapshots = await self.get_aci_object(
+				"class/configSnapshot.json?query-target-filter=eq(configSnapshot.descr,\"%s\")" % description)
+			if not int(current_snapshots["totalCount"]) == 1:
+				LOG.warning("Unable to find any existing snapshot")
+				return False
+			else:
+				LOG.info("Snapshot completed")
+				return True
+		else:
+			LOG.warning("Snapshot failed")
+			return False
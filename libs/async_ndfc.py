@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import asyncio
+import logging
+import aiohttp
+from .ndfc import Ndfc
+
+LOG = logging.getLogger("__name__")
+
+class AsyncNdfc(object):
+    """
+    asyncio counterpart of Ndfc. A single event loop can drive many of these handles.
+    Usage:
+    async with AsyncNdfc(address, api_key=api_key) as ndfc_conn:
+        nodes = await ndfc_conn.get_all_nodes_by_fabric(fabric)
+    """
+
+    # Token helpers do not do any I/O and are shared with the blocking client
+    _jwt_expiry = staticmethod(Ndfc._jwt_expiry)
+    _file_positions = staticmethod(Ndfc._file_positions)
+
+    def __init__(self, address:str, credentials:dict=None, api_key:dict=None, pool_maxsize:int=10,
+                 max_concurrency:int=10, connect_timeout:float=5, read_timeout:float=60):
+        """Initialises an async NDFC API object. The HTTP session is created, and the login performed,
+        when entering the context manager
+
+        Args:
+            address (str): IP Address or FQDN
+            credentials (dict, optional): dictionay {"userName":"","userPasswd":"","domain":""}
+            api_key (dict, optional): A string to authorize all the API calls. Can be generated from the NDI Web UI
+            pool_maxsize (int, optional): Max number of keep-alive connections towards NDFC. Defaults to 10.
+            max_concurrency (int, optional): Max number of requests in flight towards NDFC. Defaults to 10.
+            connect_timeout (float, optional): seconds to open a connection. Defaults to 5.
+            read_timeout (float, optional): seconds to wait for NDFC between two reads. Defaults to 60.
+        """
+        LOG.info("A new async NDI Instance is being started")
+        # Attribute initialization
+        self._session = None
+        self._pool_maxsize = pool_maxsize
+        self._timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._address = address
+        self._url = "https://%s//appcenter/cisco/ndfc/api/v1/lan-fabric/rest/" % address
+        self._token = None
+        self._cookie = None
+        self._token_timeout = None
+        self._token_lock = asyncio.Lock()
+        self._login_failures = 0
+        self._login_retry_at = 0
+        self._credentials = credentials
+        if api_key:
+            # API KEY TAKES PRECEDENCE
+            LOG.info("Setting API Key")
+            self.token = {"X-Nd-Apikey": api_key["api_key"], "X-Nd-Username": api_key["username"]}
+
+    def __str__(self):
+        return "This is an async NDI object"
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def open(self):
+        """Creates the pooled HTTP session and authenticates if credentials were given
+        """
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self._pool_maxsize, ssl=False)
+            self._session = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar(),
+                                                  timeout=self._timeout)
+        if self.credentials and not self.token and not self.cookie:
+            LOG.info("Attempting NDI Auth with credentials")
+            await self.get_nd_token(self.credentials)
+
+    async def close(self):
+        """Closes all the pooled connections towards NDFC
+        """
+        LOG.debug(f"Closing async NDFC handle on {self.address}")
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def address(self):
+        """Get address"""
+        return self._address
+
+    @property
+    def credentials(self):
+        """Get credentials"""
+        return self._credentials
+
+    @credentials.setter
+    def credentials(self, value):
+        """Set the credentials"""
+        self._credentials = value
+
+    @property
+    def cookie(self):
+        """Get cookie"""
+        return self._cookie
+
+    @cookie.setter
+    def cookie(self, value):
+        """Set the cookie"""
+        self._cookie = value
+
+    @property
+    def token(self):
+        """Get token"""
+        return self._token
+
+    @token.setter
+    def token(self, value):
+        """Set the token"""
+        self._token = value
+
+    @property
+    def token_timeout(self):
+        """Get the JWT expiry, as epoch"""
+        return self._token_timeout
+
+    @token_timeout.setter
+    def token_timeout(self, value):
+        """Set the JWT expiry"""
+        self._token_timeout = value
+
+    @property
+    def url(self):
+        """Get url"""
+        return self._url
+
+    @url.setter
+    def url(self, value):
+        """Set the url"""
+        self._url = value
+
+    async def _request(self, method:str, url:str, **kwargs):
+        """Every HTTP call towards NDFC goes through here. Concurrency is bounded per controller.
+
+        Args:
+            method (str): HTTP method
+            url (str): full URL
+
+        Returns:
+            tuple: HTTP status code and the answer body, parsed if json
+        """
+        async with self._semaphore:
+            async with self._session.request(method, url, cookies=self.cookie, headers=self.token,
+                                             **kwargs) as response:
+                if response.content_type == "application/json":
+                    return response.status, await response.json()
+                return response.status, await response.text()
+
+    async def get_nd_token(self, credentials):
+        """
+        To be used in case you want to authenticate with user credentials. Token received will be
+        used as cookie. The JWT expiry is tracked so the handle can authenticate again before it expires.
+        :param credentials:
+        :return:  Bool()
+        """
+        auth_url = "https://%s/login" % self.address
+        LOG.debug(f"Running Auth query at {auth_url}")
+        status, body = await self._request("POST", auth_url, json=credentials)
+
+        if status == 200:
+            self.cookie = {"AuthCookie": body["jwttoken"]}
+            self.token_timeout = self._jwt_expiry(body["jwttoken"])
+            LOG.info(f"Authentication succeded")
+        else:
+            LOG.error(f"Authentication failed, {status}, {body}")
+            return  False
+        return True
+
+    def _uses_jwt(self) -> bool:
+        """True if the handle authenticates with credentials rather than with an API key"""
+        return bool(self.credentials) and not self.token
+
+    async def check_token_validity(self) -> bool:
+        """Authenticates again when the JWT expires in less than 60 seconds.
+        Only one coroutine logs in, the others wait for it and reuse the new cookie.
+
+        Returns:
+            bool: False if the re-authentication failed
+        """
+        if not self._uses_jwt() or not self.token_timeout or self.token_timeout - time.time() > 60:
+            return True
+        async with self._token_lock:
+            if self.token_timeout - time.time() > 60:
+                return True
+            LOG.info("JWT about to expire, authenticating again")
+            return await self._login()
+
+    async def _login(self) -> bool:
+        """Logs in again, called holding the token lock. A failed login is not attempted again before 5 seconds,
+        doubled on every consecutive failure up to 5 minutes, so an unreachable NDFC is not sent a login by every
+        call once the JWT expired
+
+        Returns:
+            bool: True if the login succeeded
+        """
+        if time.monotonic() < self._login_retry_at:
+            LOG.debug("Skipping the login, the previous one failed too recently")
+            return False
+        logged_in = False
+        try:
+            logged_in = await self.get_nd_token(self.credentials)
+            return logged_in
+        finally:
+            if logged_in:
+                self._login_failures = 0
+                self._login_retry_at = 0
+            else:
+                self._login_failures += 1
+                delay = min(5 * 2 ** (self._login_failures - 1), 300)
+                self._login_retry_at = time.monotonic() + delay
+                LOG.warning(f"Login to {self.address} failed, next attempt in {delay}s at the earliest")
+
+    async def _reauthenticate(self, rejected_cookie:dict) -> bool:
+        """Called when NDFC answers 401. Coroutines that got rejected with the same cookie trigger a single login.
+
+        Args:
+            rejected_cookie (dict): the cookie used by the rejected call
+
+        Returns:
+            bool: True if the call can be retried
+        """
+        async with self._token_lock:
+            if self.cookie != rejected_cookie:
+                return True
+            LOG.info("JWT rejected, authenticating again")
+            return await self._login()
+
+    @staticmethod
+    def _form_data(files) -> aiohttp.FormData:
+        """Builds the multipart body of an upload from a requests style files argument. A FormData can only be
+        sent once, a retry needs a new one
+
+        Args:
+            files: dict or list of (field, value), value being a file, a string or a tuple
+                (filename, file[, content_type])
+
+        Returns:
+            aiohttp.FormData: the form, one field per file
+        """
+        form = aiohttp.FormData()
+        for name, value in (files.items() if isinstance(files, dict) else files):
+            if isinstance(value, (tuple, list)):
+                form.add_field(name, value[1], filename=value[0], content_type=value[2] if len(value) > 2 else None)
+            else:
+                filename = getattr(value, "name", None)
+                form.add_field(name, value, filename=os.path.basename(filename) if isinstance(filename, str) else name)
+        return form
+
+    async def _authenticated_request(self, method:str, url:str, files=None, **kwargs):
+        """Same as _request, but keeps the JWT valid and retries once after re-authenticating on 401.
+        Uploaded files are rewound before the retry, a request with a stream that can't be rewound is not retried
+
+        Args:
+            method (str): HTTP method
+            url (str): full URL
+            files (optional): files to upload as multipart/form-data, see _form_data. Defaults to None.
+
+        Returns:
+            tuple: HTTP status code and the answer body, parsed if json
+        """
+        await self.check_token_validity()
+        cookie = self.cookie
+        positions = self._file_positions(files)
+        if files:
+            kwargs["data"] = self._form_data(files)
+        status, body = await self._request(method, url, **kwargs)
+        if status == 401 and self._uses_jwt() and await self._reauthenticate(cookie):
+            if positions is None:
+                LOG.warning(f"{method} to {url} rejected, its upload can't be sent again")
+                return status, body
+            for stream, position in positions:
+                stream.seek(position)
+            if files:
+                kwargs["data"] = self._form_data(files)
+            LOG.debug(f"Retrying {method} to {url} after re-authentication")
+            status, body = await self._request(method, url, **kwargs)
+        return status, body
+
+    async def _generic_call(self, method:str, uri_object:str, **kwargs):
+        """
+        :param method: HTTP method
+        :param uri_object: URI relative to the NDFC REST root
+        :return: tuple (bool, json)
+        """
+        url = "%s/%s" % (self.url, uri_object)
+        LOG.debug(f"{method} URL:{url}")
+        status, body = await self._authenticated_request(method, url, **kwargs)
+        if 199 < status < 300:
+            LOG.debug(f"{method} to {url} completed")
+            return True, body
+        else:
+            LOG.error(f"{method} failed, {status}, {body}")
+            return False, ""
+
+    async def generic_get(self, uri_object):
+        """
+        Get any data
+        """
+        return await self._generic_call("GET", uri_object)
+
+    async def generic_post(self, uri_object, payload=None, ig_name="", files=None):
+        """
+        Post any data. With files, the body is a multipart/form-data upload and payload is not sent, like
+        Ndfc.generic_post
+        """
+        if files:
+            return await self._generic_call("POST", uri_object, files=files)
+        return await self._generic_call("POST", uri_object, json=payload)
+
+    async def generic_delete(self, uri_object, ig_name=""):
+        """
+        Delete any data
+        """
+        return await self._generic_call("DELETE", uri_object)
+
+    async def get_all_fabrics(self)-> list:
+        """Retrieves all the sites managed by the NDFC Cluster
+
+        Returns:
+            list: A list of dictionaries. Every dict contains info about one site
+        """
+        result, data = await self.generic_get("control/fabrics")
+        if not result:
+            return False
+        return data
+
+    async def get_all_nodes_by_fabric(self, fabric:str)-> list:
+        """Retrieves a list of node discovered by the NDFC Cluster
+
+        Args:
+            fabric (str): NDFC Fabric Name
+
+        Returns:
+            list: A list of dictionaries. Every dict contains info about the switch
+        """
+        result, data = await self.generic_get(f"control/fabrics/{fabric}/inventory/switchesByFabric")
+        if not result:
+            return False
+        return data
+
+    async def get_all_interfaces_by_node(self, node_serial:str)-> list:
+        """Retrieves a list of interfaces associated to a single node
+
+        Args:
+            node_serial (str): node/switch Serial Number
+
+        Returns:
+            list: A list of dictionaries. Every dict contains info about the interface
+        """
+        result, data = await self.generic_get(f"interface/detail?serialNumber={node_serial}")
+        if not result:
+            return False
+        return data
+
+    async def get_all_vrfs_by_fabric(self, fabric:str)-> list:
+        """Retrieves a list of vrfs configured in a fabric
+
+        Args:
+            fabric (str): NDFC Fabric Name
+
+        Returns:
+            list: A list of dictionaries. Every dict contains info about the vrf
+        """
+        result, data = await self.generic_get(f"/top-down/fabrics/{fabric}/vrfs")
+        if not result:
+            return False
+        return data
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from urllib.parse import parse_qsl, urlencode
+
+LOG = logging.getLogger("__name__")
+
+
+def normalize(path:str) -> str:
+	"""Normalizes a request path so equivalent queries share the same cache entry
+
+	Args:
+		path (str): path relative to the controller API root, with or without a query string
+
+	Returns:
+		str: the path without leading or doubled slashes and with the query parameters sorted
+	"""
+	path, _, query = path.partition("?")
+	path = "/".join(segment for segment in path.split("/") if segment)
+	if query:
+		return "%s?%s" % (path, urlencode(sorted(parse_qsl(query, keep_blank_values=True))))
+	return path
+
+
+class _Flight(object):
+	"""A load in progress. Callers asking for the same key while it runs wait for its result"""
+
+	def __init__(self):
+		self.future = Future()
+		self.invalidated = False
+
+
+class ResponseCache(object):
+	"""
+	In process TTL cache for controller GET answers, bounded in size with LRU eviction.
+	Concurrent requests for the same path are coalesced into a single call to the controller.
+	A cache instance is meant to be owned by a single API handle, keys do not include the controller address.
+	"""
+
+	def __init__(self, default_ttl:float =10, ttls:dict =None, max_entries:int =1024):
+		"""
+		Args:
+			default_ttl (float, optional): seconds an answer is kept. Defaults to 10.
+			ttls (dict, optional): per path TTLs, {path prefix: seconds}, the longest matching prefix wins.
+				A TTL of 0 disables caching for that prefix, e.g. {"class/fvTenant.json": 60, "class/faultInfo": 0}
+			max_entries (int, optional): max number of answers kept. Defaults to 1024.
+		"""
+		self._default_ttl = default_ttl
+		self._ttls = sorted(((normalize(prefix), ttl) for prefix, ttl in (ttls or {}).items()),
+							key=lambda item: len(item[0]), reverse=True)
+		self._max_entries = max_entries
+		self._entries = OrderedDict()
+		self._in_flight = {}
+		self._lock = threading.Lock()
+		self._hits = 0
+		self._misses = 0
+		self._coalesced = 0
+		self._evictions = 0
+		self._invalidations = 0
+
+	@property
+	def stats(self) -> dict:
+		"""Get hit/miss/coalesced/eviction/invalidation counters and current size"""
+		with self._lock:
+			return {"hits": self._hits, "misses": self._misses, "coalesced": self._coalesced,
+					"evictions": self._evictions, "invalidations": self._invalidations, "size": len(self._entries)}
+
+	def ttl(self, key:str) -> float:
+		"""TTL applied to a normalized path"""
+		for prefix, ttl in self._ttls:
+			if key.startswith(prefix):
+				return ttl
+		return self._default_ttl
+
+	def get(self, path:str, loader, valid=bool):
+		"""Returns the cached answer for path, or calls loader to get it
+
+		Args:
+			path (str): path relative to the controller API root
+			loader (callable): performs the actual request, called without arguments
+			valid (callable, optional): tells if an answer can be cached. Defaults to bool, failures are not cached.
+
+		Returns:
+			object: what loader returned, now or for a previous call
+		"""
+		key = normalize(path)
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry and entry[0] > time.monotonic():
+				self._entries.move_to_end(key)
+				self._hits += 1
+				return entry[1]
+			if entry:
+				del self._entries[key]
+			flight = self._in_flight.get(key)
+			leader = flight is None
+			if leader:
+				flight = self._in_flight[key] = _Flight()
+				self._misses += 1
+			else:
+				self._coalesced += 1
+		if not leader:
+			return flight.future.result()
+
+		try:
+			result = loader()
+		except BaseException as e:
+			with self._lock:
+				del self._in_flight[key]
+			flight.future.set_exception(e)
+			raise
+		with self._lock:
+			del self._in_flight[key]
+			ttl = self.ttl(key)
+			if ttl > 0 and valid(result) and not flight.invalidated:
+				self._entries[key] = (time.monotonic() + ttl, result)
+				self._entries.move_to_end(key)
+				while len(self._entries) > self._max_entries:
+					self._entries.popitem(last=False)
+					self._evictions += 1
+		flight.future.set_result(result)
+		return result
+
+	def invalidate(self, match):
+		"""Drops the cached answers whose normalized path matches. Loads in flight are not stored when they complete.
+
+		Args:
+			match (callable): takes a normalized path, returns True if it has to be dropped
+		"""
+		with self._lock:
+			for key in [key for key in self._entries if match(key)]:
+				del self._entries[key]
+				self._invalidations += 1
+			for key, flight in self._in_flight.items():
+				if match(key):
+					flight.invalidated = True
+
+	def invalidate_prefix(self, prefix:str):
+		"""Drops the cached answers whose path starts with prefix"""
+		prefix = normalize(prefix)
+		self.invalidate(lambda key: key.startswith(prefix))
+
+	def clear(self):
+		"""Drops every cached answer"""
+		self.invalidate(lambda key: True)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import logging
+from . import dn
+from .aci_query import AciQuery, ne, wcard
+from .influx_writer import point
+
+LOG = logging.getLogger("__name__")
+
+# Queries of the APIC collectors, shared by the demos and collector.py
+HEALTH_QUERY = AciQuery.for_dn("topology/health")
+FAULTS_QUERY = AciQuery.for_class("faultInfo", query_target_filter=ne("faultInfo.severity", "cleared"),
+									properties=["dn", "ack", "severity", "domain", "type", "code", "lc"])
+PORTS_QUERY = AciQuery.for_class("ethpmPhysIf", properties=["dn", "operSt"])
+VLANS_QUERY = AciQuery.for_class("vlanCktEp", query_target_filter=wcard("vlanCktEp.epgDn", "epg"),
+									properties=["dn", "epgDn"])
+
+
+def health_points(health:dict, time_ns:int, fabric:str ="ACI-AMS"):
+	"""Yields the fabric health point of a topology/health answer"""
+	yield point("health",
+				{"fabric": fabric},
+				{"health": int(health["imdata"][0]["fabricHealthTotal"]["attributes"]["cur"])},
+				time_ns)
+
+
+def fault_points(faults, time_ns:int, fabric:str ="ACI-AMS"):
+	"""Yields one point per faultInst record"""
+	for fault in faults:
+		attributes = fault["faultInst"]["attributes"]
+		yield point("faults",
+					{"ack": attributes["ack"], "dn": attributes["dn"], "severity": attributes["severity"],
+					"domain": attributes["domain"], "fabric": fabric},
+					{"type": attributes["type"], "code": attributes["code"], "lifecycle": attributes["lc"]},
+					time_ns)
+
+
+def port_points(ports, time_ns:int, fabric:str ="ACI-AMS"):
+	"""Yields one point per ethpmPhysIf record"""
+	for port in ports:
+		attributes = port["ethpmPhysIf"]["attributes"]
+		parsed = dn.parse(attributes["dn"])
+		yield point("total_ports",
+					{"pod": parsed.pod, "node": parsed.node, "port": parsed.port, "fabric": fabric},
+					{"status": attributes["operSt"]},
+					time_ns)
+
+
+def vlan_points(vlans, time_ns:int, fabric:str ="ACI-AMS"):
+	"""Yields one point per vlanCktEp record"""
+	for vlan in vlans:
+		attributes = vlan["vlanCktEp"]["attributes"]
+		parsed, epg = dn.parse(attributes["dn"]), dn.parse(attributes["epgDn"])
+		yield point("aci_vlans",
+					{"pod": parsed.pod, "node": parsed.node, "tenant": epg.tenant, "ap": epg.ap, "epg": epg.epg,
+					"fabric": fabric},
+					{"vlan": parsed.vlan},
+					time_ns)
+
+
+def ndfc_port_points(node_results, time_ns:int, fabric:str ="NDFC-AMS"):
+	"""Yields one point per Ethernet interface of Ndfc.get_all_interfaces_by_fabric results"""
+	for node_result in node_results:
+		if node_result["error"]:
+			continue
+		node_data = node_result["node"]
+		for port in node_result["interfaces"]:
+			if not "Eth" in port["ifName"]:
+				continue
+			yield point("total_ports",
+						{"pod": "1", "node": node_data["hostName"], "port": port["ifName"], "fabric": fabric},
+						{"status": port["adminStatusStr"]},
+						time_ns)
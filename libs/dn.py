@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+import re
+import logging
+from functools import lru_cache
+from collections import namedtuple
+
+LOG = logging.getLogger("__name__")
+
+# A bracketed section, part of the RN it appears in, slashes included. Brackets nest up to two levels:
+# phys-[eth1/1], rspathAtt-[topology/pod-1/paths-101/pathep-[eth1/1]]
+_BRACKETS = r"\[[^\[\]]*(?:\[[^\[\]]*\][^\[\]]*)*\]"
+
+# One RN: anything up to the next slash outside brackets
+_RN = re.compile(r"(?:[^/\[]|%s)+" % _BRACKETS)
+
+# Walks a DN RN by RN in a single match. An RN carrying a tag matches its alternative as a whole, vxlan-... or
+# ctx-[vxlan-...] never yield a vlan, any other RN, bracketed sections included, matches the last one. A group
+# keeps the value of the last RN that set it, and the tags inside brackets are never looked at.
+_DN = re.compile(r"(?:(?:"
+				r"pod-(\d+)|"
+				r"node-(\d+)|paths-(\d+)|"
+				r"phys-\[eth(\d+/\d+(?:/\d+)?)\]|pathep-\[eth(\d+/\d+(?:/\d+)?)\]|"
+				r"tn-([^/\[]+)|ap-([^/\[]+)|epg-([^/\[]+)|"
+				r"vlan-\[vlan-(\d+)\]|"
+				r"[^/\[]*(?:%s[^/\[]*)*)(?:/|$))*" % _BRACKETS)
+
+
+class ParsedDn(namedtuple("ParsedDn", ["dn", "pod", "node", "port", "tenant", "ap", "epg", "vlan"])):
+	"""A parsed DN. Tags are None when the DN does not contain them"""
+	__slots__ = ()
+
+	@property
+	def rns(self) -> tuple:
+		"""The relative names of the DN, tokenized on first use"""
+		return split(self.dn)
+
+
+@lru_cache(maxsize=4096)
+def split(dn:str) -> tuple:
+	"""Tokenizes a DN into its RNs
+
+	Args:
+		dn (str): e.g. topology/pod-1/node-101/sys/phys-[eth1/1]
+
+	Returns:
+		tuple: ("topology", "pod-1", "node-101", "sys", "phys-[eth1/1]")
+	"""
+	return tuple(_RN.findall(dn))
+
+
+def parse(dn:str) -> ParsedDn:
+	"""Extracts pod, node, port, tenant, ap, epg and vlan from an ACI DN.
+	The DN is walked once, RN by RN, a bracketed section being part of its RN: tags are only taken from the DN own
+	RNs, the pod and node in rspathAtt-[topology/pod-1/paths-101/pathep-[eth1/1]] belong to the target DN.
+	Nothing is memoized, a DN costs the same on every poll and memory does not grow with the fabric size.
+
+	Args:
+		dn (str): e.g. topology/pod-1/node-101/sys/phys-[eth1/1]/phys or uni/tn-common/ap-app/epg-web
+
+	Returns:
+		ParsedDn: the parsed record
+	"""
+	pod, node, paths, phys, pathep, tenant, ap, epg, vlan = _DN.match(dn).groups()
+	return ParsedDn(dn, pod, node or paths, phys or pathep, tenant, ap, epg, vlan)
+
+
+def parse_many(dns) -> list:
+	"""Batch version of parse
+
+	Args:
+		dns (iterable): DNs
+
+	Returns:
+		list: ParsedDn records, in the same order
+	"""
+	return list(map(parse, dns))
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+import time
+import queue
+import random
+import logging
+import calendar
+import datetime
+import threading
+
+LOG = logging.getLogger("__name__")
+
+_MEASUREMENT_ESCAPE = str.maketrans({",": "\\,", " ": "\\ ", "\n": "\\n"})
+_TAG_ESCAPE = str.maketrans({",": "\\,", " ": "\\ ", "=": "\\=", "\n": "\\n"})
+_STRING_ESCAPE = str.maketrans({'"': '\\"', "\\": "\\\\", "\n": "\\n"})
+
+
+def timestamp(moment=None) -> int:
+	"""Converts a datetime to a line protocol timestamp. Compute it once per cycle and pass it to point()
+
+	Args:
+		moment (datetime.datetime, optional): naive datetimes are taken as UTC, like datetime.utcnow(). Defaults to now.
+
+	Returns:
+		int: nanoseconds since the epoch
+	"""
+	if moment is None:
+		return time.time_ns()
+	if moment.tzinfo is not None:
+		moment = moment.astimezone(datetime.timezone.utc)
+	return calendar.timegm(moment.timetuple()) * 1000000000 + moment.microsecond * 1000
+
+
+def _field_value(value) -> str:
+	"""Formats a field value the way InfluxDBClient does: integers get the i suffix, strings are quoted"""
+	if isinstance(value, bool):
+		return "true" if value else "false"
+	if isinstance(value, int):
+		return "%di" % value
+	if isinstance(value, float):
+		return repr(value)
+	return '"%s"' % str(value).translate(_STRING_ESCAPE)
+
+
+def point(measurement:str, tags:dict, fields:dict, time_ns:int =None) -> str:
+	"""Serializes one point to line protocol, without building the intermediate write_points dictionary
+
+	Args:
+		measurement (str): e.g. total_ports
+		tags (dict): tag name: value. Empty or None values are skipped
+		fields (dict): field name: value. None values are skipped
+		time_ns (int, optional): timestamp in ns, see timestamp(). Defaults to the server time.
+
+	Returns:
+		str: a line, e.g. total_ports,fabric=ACI-AMS,node=101 status="up" 1700000000000000000
+	"""
+	line = measurement.translate(_MEASUREMENT_ESCAPE)
+	for key in sorted(tags):
+		value = tags[key]
+		if value is not None and value != "":
+			line += ",%s=%s" % (key.translate(_TAG_ESCAPE), str(value).translate(_TAG_ESCAPE))
+	line += " " + ",".join("%s=%s" % (key.translate(_TAG_ESCAPE), _field_value(value))
+							for key, value in fields.items() if value is not None)
+	if time_ns is not None:
+		line += " %d" % time_ns
+	return line
+
+
+class InfluxWriter(object):
+	"""
+	Buffers line protocol points into batches and writes them from a background thread, with retries and backoff.
+	write() only blocks when max_pending batches are already waiting, so a slow database slows the collector down
+	instead of growing memory. A batch that still fails after the retries is dropped and counted, the rest of the
+	cycle goes through.
+	Usage:
+	with InfluxWriter(client, database="aci_db_stable") as writer:
+		writer.write_all(collect_ports(apic_conn))
+	print(writer.metrics)
+	"""
+
+	def __init__(self, client, database:str =None, batch_size:int =5000, max_pending:int =4, max_retries:int =3,
+				backoff:float =1, retention_policy:str =None):
+		"""
+		Args:
+			client (InfluxDBClient): influxdb client, only write_points is used
+			database (str, optional): target database. Defaults to the client one.
+			batch_size (int, optional): points per write. Defaults to 5000.
+			max_pending (int, optional): batches buffered before write() blocks. Defaults to 4.
+			max_retries (int, optional): retries of a failed write. Defaults to 3.
+			backoff (float, optional): seconds before the first retry, doubled every retry, with jitter. Defaults to 1.
+			retention_policy (str, optional): Defaults to the database default one.
+		"""
+		self._client = client
+		self._database = database
+		self._retention_policy = retention_policy
+		self._batch_size = batch_size
+		self._max_retries = max_retries
+		self._backoff = backoff
+		self._batch = []
+		self._batch_lock = threading.Lock()
+		self._queue = queue.Queue(maxsize=max_pending)
+		self._lock = threading.Lock()
+		self._started = time.monotonic()
+		self._points_written = 0
+		self._points_failed = 0
+		self._batches_written = 0
+		self._batches_failed = 0
+		self._retries = 0
+		self._write_time = 0.0
+		self._writer = threading.Thread(target=self._run, daemon=True, name="influx-writer")
+		self._writer.start()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	@property
+	def metrics(self) -> dict:
+		"""Get the counters, the number of batches waiting to be written and the throughput in points/s"""
+		with self._lock:
+			elapsed = time.monotonic() - self._started
+			return {"points_written": self._points_written, "points_failed": self._points_failed,
+					"batches_written": self._batches_written, "batches_failed": self._batches_failed,
+					"retries": self._retries, "queue_depth": self._queue.qsize(), "buffered": len(self._batch),
+					"points_per_second": self._points_written / elapsed if elapsed else 0.0,
+					"write_seconds": self._write_time}
+
+	def write(self, line:str):
+		"""Buffers one point, see point(). Thread safe, collectors running in parallel can share a writer"""
+		with self._batch_lock:
+			self._batch.append(line)
+			if len(self._batch) >= self._batch_size:
+				self._flush()
+
+	def write_all(self, lines):
+		"""Buffers every point of an iterable, typically a collector generator
+
+		Args:
+			lines (iterable): line protocol strings
+
+		Returns:
+			int: number of points consumed
+		"""
+		count = 0
+		for line in lines:
+			self.write(line)
+			count += 1
+		return count
+
+	def flush(self):
+		"""Hands the current partial batch to the writer thread"""
+		with self._batch_lock:
+			self._flush()
+
+	def _flush(self):
+		"""Must be called holding the batch lock"""
+		if self._batch:
+			batch, self._batch = self._batch, []
+			self._queue.put(batch)
+
+	def join(self):
+		"""Flushes and waits until every batch has been written or dropped"""
+		self.flush()
+		self._queue.join()
+
+	def close(self):
+		"""Flushes, waits for the pending writes and stops the writer thread"""
+		if not self._writer.is_alive():
+			return
+		self.join()
+		self._queue.put(None)
+		self._writer.join()
+
+	def _write(self, batch:list) -> bool:
+		"""Writes a batch, retrying with exponential backoff"""
+		for attempt in range(self._max_retries + 1):
+			if attempt:
+				delay = self._backoff * 2 ** (attempt - 1)
+				time.sleep(delay / 2 + random.uniform(0, delay / 2))
+				with self._lock:
+					self._retries += 1
+			start = time.monotonic()
+			try:
+				self._client.write_points(batch, protocol="line", database=self._database,
+										retention_policy=self._retention_policy)
+				return True
+			except Exception as e:
+				LOG.warning("Write of %s points failed (attempt %s/%s): %s" % (
+					len(batch), attempt + 1, self._max_retries + 1, e))
+			finally:
+				with self._lock:
+					self._write_time += time.monotonic() - start
+		return False
+
+	def _run(self):
+		"""Writer thread body"""
+		while True:
+			batch = self._queue.get()
+			if batch is None:
+				self._queue.task_done()
+				return
+			written = self._write(batch)
+			with self._lock:
+				if written:
+					self._points_written += len(batch)
+					self._batches_written += 1
+				else:
+					self._points_failed += len(batch)
+					self._batches_failed += 1
+			if not written:
+				LOG.error("Dropped a batch of %s points" % len(batch))
+			self._queue.task_done()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+import re
+import logging
+import threading
+from collections import namedtuple
+from urllib.parse import urlparse, parse_qsl
+from .influx_writer import point
+
+LOG = logging.getLogger("__name__")
+
+# One HTTP call as seen by RequestPolicy.send, retries included. status is None when no answer was received.
+# timings holds dns, connect, tls, ttfb and total seconds, the first three are None on a reused connection
+RequestSample = namedtuple("RequestSample", ["controller", "method", "url", "status", "bytes", "timings", "retries",
+											"error"])
+
+# Seconds, Prometheus style upper bounds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+PHASES = ("dns", "connect", "tls", "ttfb", "total")
+
+# rn-value in an APIC MO path, e.g. tn-common or phys-[eth1/1]
+_RN_VALUE = re.compile(r"(?<=/)([a-zA-Z]+)-(?:\[[^\]]*\]|[^/\[]+?)(?=/|\.json$|\.xml$|$)")
+# Path segments that are identifiers: numbers, IPs, UUIDs, serial numbers
+_ID_SEGMENT = re.compile(r"^(?:\d+|\d+\.\d+\.\d+\.\d+|[0-9a-fA-F-]{32,36}|(?=[A-Z0-9]*\d)[A-Z0-9]{9,})$")
+
+
+def path_template(url:str) -> str:
+	"""Groups URLs of the same kind of query: values are replaced by {}, query option values are dropped
+
+	Args:
+		url (str): full URL
+
+	Returns:
+		str: e.g. /api/mo/uni/tn-{}/ap-{}.json?rsp-subtree or /api/class/fvTenant.json?page,page-size
+	"""
+	parsed = urlparse(url)
+	path = parsed.path.replace("//", "/")
+	if "/mo/" in path:
+		prefix, _, dn = path.partition("/mo/")
+		path = "%s/mo/%s" % (prefix, _RN_VALUE.sub(r"\1-{}", "/" + dn)[1:])
+	path = "/".join("{}" if _ID_SEGMENT.match(segment) else segment for segment in path.split("/"))
+	if parsed.query:
+		return "%s?%s" % (path, ",".join(sorted({name for name, _ in parse_qsl(parsed.query,
+																				keep_blank_values=True)})))
+	return path
+
+
+class Histogram(object):
+	"""Cumulative histogram, not thread safe on its own"""
+
+	def __init__(self, buckets=DEFAULT_BUCKETS):
+		self.buckets = tuple(buckets)
+		self.counts = [0] * (len(self.buckets) + 1)
+		self.count = 0
+		self.sum = 0.0
+
+	def observe(self, value:float):
+		for index, bound in enumerate(self.buckets):
+			if value <= bound:
+				break
+		else:
+			index = len(self.buckets)
+		self.counts[index] += 1
+		self.count += 1
+		self.sum += value
+
+	def quantile(self, q:float) -> float:
+		"""Estimates a quantile by linear interpolation inside its bucket, None without observations"""
+		if not self.count:
+			return None
+		rank = q * self.count
+		seen = 0
+		for index, count in enumerate(self.counts):
+			if seen + count >= rank and count:
+				low = self.buckets[index - 1] if index else 0.0
+				high = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+				return low + (high - low) * (rank - seen) / count
+			seen += count
+		return self.buckets[-1]
+
+
+class _Series(object):
+	"""Aggregates of one controller, method, path template and status"""
+
+	def __init__(self, buckets):
+		self.count = 0
+		self.errors = 0
+		self.retries = 0
+		self.bytes = 0
+		self.phases = {phase: Histogram(buckets) for phase in PHASES}
+
+
+class Instruments(object):
+	"""
+	Request hook aggregating every HTTP call into per query latency histograms.
+	Series are keyed by controller, method, path template and status (or error).
+	Usage:
+	instruments = Instruments()
+	apic_conn.policy.add_hook(instruments)
+	...
+	print(instruments.top())
+	open("/var/lib/node_exporter/aci.prom", "w").write(instruments.prometheus())
+	writer.write_all(instruments.influx_points())
+	"""
+
+	def __init__(self, buckets=DEFAULT_BUCKETS, template=path_template):
+		"""
+		Args:
+			buckets (tuple, optional): histogram upper bounds in seconds. Defaults to DEFAULT_BUCKETS.
+			template (callable, optional): maps a URL to the path series are grouped by. Defaults to path_template.
+		"""
+		self._buckets = tuple(buckets)
+		self._template = template
+		self._series = {}
+		self._lock = threading.Lock()
+
+	def __call__(self, sample:RequestSample):
+		key = (sample.controller, sample.method, self._template(sample.url),
+				str(sample.status) if sample.status is not None else sample.error)
+		with self._lock:
+			series = self._series.get(key)
+			if series is None:
+				series = self._series[key] = _Series(self._buckets)
+			series.count += 1
+			series.retries += sample.retries
+			series.bytes += sample.bytes or 0
+			if sample.status is None or sample.status >= 400:
+				series.errors += 1
+			for phase in PHASES:
+				if sample.timings.get(phase) is not None:
+					series.phases[phase].observe(sample.timings[phase])
+
+	def reset(self):
+		"""Drops every series"""
+		with self._lock:
+			self._series.clear()
+
+	def snapshot(self) -> list:
+		"""
+		Returns:
+			list: one dictionary per series: controller, method, path, status, count, errors, retries, bytes and
+				for every phase its mean, p50, p95 and p99 in seconds
+		"""
+		with self._lock:
+			rows = []
+			for (controller, method, path, status), series in self._series.items():
+				row = {"controller": controller, "method": method, "path": path, "status": status,
+						"count": series.count, "errors": series.errors, "retries": series.retries,
+						"bytes": series.bytes}
+				for phase, histogram in series.phases.items():
+					row["%s_mean" % phase] = histogram.sum / histogram.count if histogram.count else None
+					for q in (50, 95, 99):
+						row["%s_p%s" % (phase, q)] = histogram.quantile(q / 100)
+				row["total_seconds"] = series.phases["total"].sum
+				rows.append(row)
+			return rows
+
+	def top(self, n:int =10) -> list:
+		"""The n series the controllers spent the most time on, i.e. the hot queries"""
+		return sorted(self.snapshot(), key=lambda row: row["total_seconds"], reverse=True)[:n]
+
+	def prometheus(self, prefix:str ="controller_http") -> str:
+		"""Exports the series in the Prometheus text format, e.g. for the node exporter textfile collector
+
+		Args:
+			prefix (str, optional): metric name prefix. Defaults to controller_http.
+
+		Returns:
+			str: the exposition text
+		"""
+		lines = ["# TYPE %s_request_duration_seconds histogram" % prefix,
+				"# TYPE %s_requests_total counter" % prefix,
+				"# TYPE %s_request_errors_total counter" % prefix,
+				"# TYPE %s_request_retries_total counter" % prefix,
+				"# TYPE %s_response_bytes_total counter" % prefix]
+		with self._lock:
+			for (controller, method, path, status), series in sorted(self._series.items()):
+				labels = 'controller="%s",method="%s",path="%s",status="%s"' % tuple(
+					_label(value) for value in (controller, method, path, status))
+				lines.append("%s_requests_total{%s} %s" % (prefix, labels, series.count))
+				lines.append("%s_request_errors_total{%s} %s" % (prefix, labels, series.errors))
+				lines.append("%s_request_retries_total{%s} %s" % (prefix, labels, series.retries))
+				lines.append("%s_response_bytes_total{%s} %s" % (prefix, labels, series.bytes))
+				for phase, histogram in series.phases.items():
+					if not histogram.count:
+						continue
+					phase_labels = '%s,phase="%s"' % (labels, phase)
+					cumulative = 0
+					for bound, count in zip(histogram.buckets, histogram.counts):
+						cumulative += count
+						lines.append('%s_request_duration_seconds_bucket{%s,le="%s"} %s' % (
+							prefix, phase_labels, bound, cumulative))
+					lines.append('%s_request_duration_seconds_bucket{%s,le="+Inf"} %s' % (
+						prefix, phase_labels, histogram.count))
+					lines.append("%s_request_duration_seconds_sum{%s} %s" % (prefix, phase_labels, histogram.sum))
+					lines.append("%s_request_duration_seconds_count{%s} %s" % (prefix, phase_labels, histogram.count))
+		return "\n".join(lines) + "\n"
+
+	def influx_points(self, time_ns:int =None, measurement:str ="http_requests"):
+		"""Yields one line protocol point per series, to be written with libs.influx_writer.InfluxWriter
+
+		Args:
+			time_ns (int, optional): timestamp, see libs.influx_writer.timestamp. Defaults to the server time.
+			measurement (str, optional): Defaults to http_requests.
+		"""
+		for row in self.snapshot():
+			tags = {key: row[key] for key in ("controller", "method", "path", "status")}
+			fields = {key: value for key, value in row.items() if key not in tags and value is not None}
+			yield point(measurement, tags, fields, time_ns)
+
+
+def _label(value) -> str:
+	"""Escapes a Prometheus label value"""
+	return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
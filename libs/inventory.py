@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+import json
+import time
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from .apic import Apic
+from .apic_cluster import ApicCluster
+from .ndfc import Ndfc
+
+LOG = logging.getLogger("__name__")
+
+# One controller. kind is "apic" or "ndfc", options holds the rest of its inventory entry (e.g. the NDFC fabrics)
+Target = namedtuple("Target", ["fabric", "kind", "address", "handle", "options"])
+
+# Outcome of a call on one target. error is None on success, result is None on failure
+FabricResult = namedtuple("FabricResult", ["fabric", "result", "error", "latency"])
+
+
+class Inventory(object):
+	"""
+	A set of controllers, one handle each, loaded from a JSON file:
+	{
+		"apic": [{"fabric": "ACI-AMS", "address": "10.0.0.1", "credentials": {"username": "", "password": "", "domain": ""}}],
+		"ndfc": [{"fabric": "NDFC-AMS", "address": "10.0.0.2", "api_key": {"api_key": "", "username": ""},
+				"fabrics": ["AMS-CML-VXLAN"]}]
+	}
+	Entries without credentials or api_key use the ones of libs.variables. An APIC entry can list the cluster members
+	in "addresses" instead of "address", it is then handled by an ApicCluster.
+	run() calls the same function on every target in parallel threads, with a deadline. A target that does not
+	answer in time is reported as failed and skipped by the next runs until that call returns, so a dead controller
+	holds one worker instead of stalling every cycle.
+	Usage:
+	with Inventory.from_file("inventory.json") as inventory:
+		for result in inventory.run(lambda target: target.handle.get_aci_object("topology/health"), kind="apic"):
+			print(result.fabric, result.result)
+	"""
+
+	def __init__(self, entries:dict, max_workers:int =16):
+		"""
+		Args:
+			entries (dict): {"apic": [entry, ...], "ndfc": [entry, ...]}, like the file content
+			max_workers (int, optional): targets queried at the same time. Defaults to 16.
+		"""
+		self._entries = entries
+		self._max_workers = max_workers
+		self._targets = []
+		self._stalled = set()
+		self._lock = threading.Lock()
+		self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fabric")
+
+	@classmethod
+	def from_file(cls, path:str, **kwargs):
+		"""Loads an inventory file"""
+		with open(path) as inventory_file:
+			return cls(json.load(inventory_file), **kwargs)
+
+	@classmethod
+	def from_variables(cls, apic_fabric:str ="ACI-AMS", ndfc_fabric:str ="NDFC-AMS", ndfc_address:str =None,
+						ndfc_fabrics:list =None, **kwargs):
+		"""Single APIC inventory built from libs.variables, plus an NDFC if ndfc_address is given"""
+		entries = {"apic": [{"fabric": apic_fabric, "address": _variables().apic_host}], "ndfc": []}
+		if ndfc_address:
+			entries["ndfc"].append({"fabric": ndfc_fabric, "address": ndfc_address, "fabrics": ndfc_fabrics or []})
+		return cls(entries, **kwargs)
+
+	def __enter__(self):
+		self.connect()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def __len__(self):
+		return len(self._targets)
+
+	def targets(self, kind:str =None) -> list:
+		"""Get the connected targets, all of them or the ones of a kind"""
+		return [target for target in self._targets if kind is None or target.kind == kind]
+
+	def _connect(self, kind:str, entry:dict) -> Target:
+		"""Creates and authenticates the handle of an inventory entry"""
+		options = {key: value for key, value in entry.items() if key not in ("fabric", "address", "addresses",
+																			"credentials", "api_key")}
+		if kind == "apic" and entry.get("addresses"):
+			handle = ApicCluster(entry["addresses"], pool_maxsize=options.get("pool_maxsize", 10),
+								balancing=options.get("balancing", "round_robin"))
+			if not handle.get_apic_token(entry.get("credentials") or _variables().apic_credentials):
+				handle.close()
+				raise ConnectionError("No APIC of the cluster could be authenticated")
+			handle.start_token_refresher()
+		elif kind == "apic":
+			handle = Apic(entry["address"], pool_maxsize=options.get("pool_maxsize", 10))
+			if not handle.get_apic_token(entry.get("credentials") or _variables().apic_credentials):
+				handle.close()
+				raise ConnectionError("APIC authentication failed")
+			handle.start_token_refresher()
+		elif kind == "ndfc":
+			if entry.get("credentials"):
+				handle = Ndfc(entry["address"], credentials=entry["credentials"])
+			else:
+				handle = Ndfc(entry["address"], api_key=entry.get("api_key") or _variables().ndfc_api_key)
+		else:
+			raise ValueError("Unknown controller kind %s" % kind)
+		return Target(entry["fabric"], kind, entry.get("address") or ",".join(entry["addresses"]), handle, options)
+
+	def connect(self, timeout:float =30) -> list:
+		"""Creates the handles of every entry in parallel. Controllers failing to log in are left out
+
+		Args:
+			timeout (float, optional): seconds to wait for all the logins. Defaults to 30.
+
+		Returns:
+			list: FabricResult of the entries that could not be connected
+		"""
+		entries = [(kind, entry) for kind in ("apic", "ndfc") for entry in self._entries.get(kind, [])]
+		results = self._fan_out([(entry["fabric"], self._connect, (kind, entry)) for kind, entry in entries],
+								timeout)
+		self._targets = [result.result for result in results if result.error is None]
+		failed = [result for result in results if result.error is not None]
+		for result in failed:
+			LOG.error("Fabric %s left out: %s" % (result.fabric, result.error))
+		LOG.info("Inventory connected to %s of %s controllers" % (len(self._targets), len(entries)))
+		return failed
+
+	def close(self):
+		"""Closes every handle. Calls still running on dead controllers are not waited for"""
+		for target in self._targets:
+			target.handle.close()
+		self._targets = []
+		self._executor.shutdown(wait=False)
+
+	def run(self, function, kind:str =None, timeout:float =60, args:tuple =()) -> list:
+		"""Calls function(target, *args) on every target in parallel
+
+		Args:
+			function (callable): receives the Target, its return value is the result
+			kind (str, optional): "apic" or "ndfc". Defaults to every target.
+			timeout (float, optional): seconds each target has to answer. Defaults to 60.
+			args (tuple, optional): extra positional arguments. Defaults to ().
+
+		Returns:
+			list: one FabricResult per target
+		"""
+		return self._fan_out([(target.fabric, function, (target,) + tuple(args)) for target in self.targets(kind)],
+							timeout)
+
+	def _fan_out(self, calls:list, timeout:float) -> list:
+		"""Runs (fabric, function, args) calls on the pool, each bounded by the same deadline"""
+		results, futures = [], {}
+		start = time.perf_counter()
+		for fabric, function, args in calls:
+			with self._lock:
+				stalled = fabric in self._stalled
+			if stalled:
+				results.append(FabricResult(fabric, None, "previous call timed out and is still running", 0.0))
+				continue
+			futures[self._executor.submit(self._call, fabric, function, args)] = fabric
+		done, not_done = wait(futures, timeout=timeout)
+		for future in done:
+			results.append(future.result())
+		for future in not_done:
+			fabric = futures[future]
+			LOG.warning("Fabric %s did not answer within %ss" % (fabric, timeout))
+			results.append(FabricResult(fabric, None, "timeout after %ss" % timeout, time.perf_counter() - start))
+			with self._lock:
+				self._stalled.add(fabric)
+			future.add_done_callback(lambda future, fabric=fabric: self._recovered(fabric))
+		return results
+
+	def _recovered(self, fabric:str):
+		"""Called when the call that timed out on a fabric finally returns"""
+		with self._lock:
+			self._stalled.discard(fabric)
+		LOG.info("Fabric %s answered again" % fabric)
+
+	def _call(self, fabric:str, function, args:tuple) -> FabricResult:
+		"""Worker body, never raises"""
+		start = time.perf_counter()
+		try:
+			return FabricResult(fabric, function(*args), None, time.perf_counter() - start)
+		except Exception as e:
+			LOG.exception("Fabric %s failed" % fabric)
+			return FabricResult(fabric, None, str(e) or e.__class__.__name__, time.perf_counter() - start)
+
+
+def _variables():
+	"""libs.variables is only needed, and imported, when an entry has no credentials"""
+	from . import variables
+	return variables
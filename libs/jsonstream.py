@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import re
+import json
+import codecs
+import logging
+
+LOG = logging.getLogger("__name__")
+
+_WHITESPACE = " \t\n\r,"
+_SEPARATORS = _WHITESPACE + "]}"
+# Once the consumed part of the buffer grows past this size it gets dropped
+_TRIM_SIZE = 65536
+
+
+def iter_items(chunks, key:str, every:bool =False):
+	"""Parses a json document incrementally and yields, one at a time, the items of the array stored under key.
+	Only the item being decoded, and at most as much of the document after it, is kept in memory, not the whole
+	document. A key holding an object instead of an array, like the NX-API tables of a single row, yields that
+	object.
+
+	Args:
+		chunks (iterable): bytes (or str) chunks of the json document, like requests' Response.iter_content()
+		key (str): name of the array to walk, e.g. "imdata"
+		every (bool, optional): walk every array stored under key, not only the first one, e.g. the ROW_prefix
+			of every vrf of show ip route. Defaults to False.
+
+	Yields:
+		object: every item of the array, already decoded
+	"""
+	decoder = json.JSONDecoder()
+	text_decoder = codecs.getincrementaldecoder("utf-8")()
+	array_start = re.compile(r'"%s"\s*:\s*([\[{])' % re.escape(key))
+	chunks = iter(chunks)
+	buffer = ""
+	exhausted = False
+	found = False
+
+	def read():
+		nonlocal buffer, exhausted
+		try:
+			chunk = next(chunks)
+		except StopIteration:
+			exhausted = True
+			buffer += text_decoder.decode(b"", final=True)
+			return
+		buffer += chunk if isinstance(chunk, str) else text_decoder.decode(chunk)
+
+	def decode(position):
+		"""Decodes the value starting at position, reading chunks until it is complete. After every failed
+		attempt the buffer grows by at least the size of the partial value, so a value spread over many chunks
+		is decoded a few times only, not once per chunk"""
+		while True:
+			try:
+				item, end = decoder.raw_decode(buffer, position)
+			except json.JSONDecodeError:
+				end = None
+			# A value not followed by a separator may be incomplete, e.g. a number split across two chunks
+			if end is not None and (exhausted or (end < len(buffer) and buffer[end] in _SEPARATORS)):
+				return item, end
+			if exhausted:
+				raise ValueError("json document invalid or truncated inside the %s array" % key)
+			target = max(len(buffer) + 1, 2 * len(buffer) - position)
+			while not exhausted and len(buffer) < target:
+				read()
+
+	position = 0
+	while True:
+		# Look for the beginning of the array
+		match = array_start.search(buffer, position)
+		if not match:
+			if exhausted:
+				if not found:
+					LOG.debug("Key %s not found in the json document" % key)
+				return
+			# Keep enough of the tail to match a key split across two chunks
+			buffer = buffer[max(position, len(buffer) - (len(key) + 16)):]
+			position = 0
+			read()
+			continue
+		found = True
+		if match.group(1) == "{":
+			item, position = decode(match.start(1))
+			yield item
+			if not every:
+				return
+			continue
+		position = match.end()
+
+		while True:
+			while position < len(buffer) and buffer[position] in _WHITESPACE:
+				position += 1
+			if position == len(buffer):
+				if exhausted:
+					raise ValueError("json document truncated inside the %s array" % key)
+				read()
+				continue
+			if buffer[position] == "]":
+				position += 1
+				break
+			item, position = decode(position)
+			yield item
+			if position > _TRIM_SIZE:
+				buffer = buffer[position:]
+				position = 0
+		if not every:
+			return
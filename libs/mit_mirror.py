@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+import logging
+import threading
+from collections import namedtuple
+
+LOG = logging.getLogger("__name__")
+
+# Every member is a dictionary {dn: imdata record}. Deleted records are the last known copy
+Delta = namedtuple("Delta", ["added", "modified", "deleted"])
+
+
+def _split(record:dict):
+	"""Returns class name and attributes of an imdata record"""
+	class_name, body = next(iter(record.items()))
+	return class_name, body["attributes"]
+
+
+class MitMirror(object):
+	"""
+	In memory copy of a set of APIC objects, keyed by dn. It is seeded with a full query, then kept current either
+	by re-polling (sync) or by subscription events (apply_event). changes() tells what was added, modified or
+	deleted since it was last called, so consumers only process deltas.
+	Usage:
+	mirror = MitMirror(properties=["operSt"])
+	mirror.seed(apic_conn.get_aci_object_paged("/class/ethpmPhysIf.json"))
+	...
+	mirror.sync(apic_conn.get_aci_object_paged("/class/ethpmPhysIf.json"))
+	delta = mirror.changes()
+	"""
+
+	def __init__(self, properties=None):
+		"""
+		Args:
+			properties (list, optional): only these properties are compared and stored, so volatile ones like
+				modTs do not show up as modifications. Defaults to all of them.
+		"""
+		self._properties = list(properties) if properties else None
+		self._records = {}
+		self._pending = {}
+		self._deleted = {}
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return len(self._records)
+
+	def __contains__(self, dn):
+		return dn in self._records
+
+	def get(self, dn:str) -> dict:
+		"""Get the current record of a dn, None if unknown"""
+		return self._records.get(dn)
+
+	def records(self) -> list:
+		"""Get a copy of all the current records"""
+		with self._lock:
+			return list(self._records.values())
+
+	def _normalize(self, record:dict) -> dict:
+		"""Keeps the tracked properties only, children are dropped"""
+		class_name, attributes = _split(record)
+		if self._properties:
+			attributes = {prop: attributes[prop] for prop in ["dn"] + self._properties if prop in attributes}
+		return {class_name: {"attributes": dict(attributes)}}
+
+	def _mark(self, dn:str, status:str, previous:dict =None):
+		"""Folds a change into the pending delta. Must be called holding the lock"""
+		current = self._pending.get(dn)
+		if status == "added":
+			if current == "deleted":
+				del self._deleted[dn]
+				self._pending[dn] = "modified"
+			else:
+				self._pending[dn] = "added"
+		elif status == "modified":
+			if current != "added":
+				self._pending[dn] = "modified"
+		elif current == "added":
+			del self._pending[dn]
+		else:
+			self._pending[dn] = "deleted"
+			self._deleted[dn] = previous
+
+	def seed(self, records):
+		"""Replaces the content of the mirror, without recording any change
+
+		Args:
+			records (iterable): imdata records, e.g. get_aci_object(...)["imdata"] or a paged generator
+		"""
+		seeded = {}
+		for record in records:
+			record = self._normalize(record)
+			seeded[_split(record)[1]["dn"]] = record
+		with self._lock:
+			self._records = seeded
+			self._pending.clear()
+			self._deleted.clear()
+		LOG.debug("MIT mirror seeded with %s records" % len(seeded))
+
+	def sync(self, records) -> Delta:
+		"""Compares a full re-poll with the mirror and updates it. Runs in linear time.
+
+		Args:
+			records (iterable): imdata records of the same query used to seed
+
+		Returns:
+			Delta: what changed with this poll only. Changes are also accumulated for changes()
+		"""
+		added, modified, deleted = {}, {}, {}
+		with self._lock:
+			seen = set()
+			for record in records:
+				record = self._normalize(record)
+				dn = _split(record)[1]["dn"]
+				seen.add(dn)
+				previous = self._records.get(dn)
+				if previous is None:
+					added[dn] = record
+				elif previous != record:
+					modified[dn] = record
+				else:
+					continue
+				self._records[dn] = record
+				self._mark(dn, "added" if previous is None else "modified")
+			for dn in [dn for dn in self._records if dn not in seen]:
+				deleted[dn] = self._records.pop(dn)
+				self._mark(dn, "deleted", deleted[dn])
+		return Delta(added, modified, deleted)
+
+	def apply_event(self, event):
+		"""Applies a subscription event (libs.apic_subscription.Event). Modified events only carry the changed
+		properties, they are merged into the known record.
+
+		Args:
+			event (Event): created, modified or deleted notification
+		"""
+		record = self._normalize({event.class_name: {"attributes": event.attributes}})
+		attributes = record[event.class_name]["attributes"]
+		attributes.pop("status", None)
+		with self._lock:
+			previous = self._records.get(event.dn)
+			if event.status == "deleted":
+				if previous is not None:
+					del self._records[event.dn]
+					self._mark(event.dn, "deleted", previous)
+				return
+			if previous is None:
+				self._records[event.dn] = record
+				self._mark(event.dn, "added")
+				return
+			merged = {event.class_name: {"attributes": dict(_split(previous)[1], **attributes)}}
+			if merged != previous:
+				self._records[event.dn] = merged
+				self._mark(event.dn, "modified")
+
+	def changes(self) -> Delta:
+		"""Returns what changed since the previous call (or since seed) and starts a new cycle
+
+		Returns:
+			Delta: added, modified and deleted records
+		"""
+		with self._lock:
+			delta = Delta({}, {}, dict(self._deleted))
+			for dn, status in self._pending.items():
+				if status == "added":
+					delta.added[dn] = self._records[dn]
+				elif status == "modified":
+					delta.modified[dn] = self._records[dn]
+			self._pending.clear()
+			self._deleted.clear()
+		return delta
@@ -1,8 +1,16 @@
 #!/usr/bin/env python3
 
+import json
+import time
+import base64
 import logging
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
+from .session import build_session, set_cookies
+from .cache import normalize
+from .policy import RequestPolicy
 
 LOG = logging.getLogger("__name__")
 
@@ -11,13 +19,19 @@ class Ndfc(object):
     Master Class for NDFC API
     """
 
-    def __init__(self, address:str, credentials:dict=None, api_key:dict=None):
+    def __init__(self, address:str, credentials:dict=None, api_key:dict=None, pool_maxsize:int=10,
+                 max_retries:int=0, pool_block:bool=False, cache=None, policy=None):
         """Initialises an NDFC API object
 
         Args:
             address (str): IP Address or FQDN
             credentials (dict, optional): dictionay {"userName":"","userPasswd":"","domain":""}
             api_key (dict, optional): A string to authorize all the API calls. Can be generated from the NDI Web UI
+            pool_maxsize (int, optional): Max number of keep-alive connections towards NDFC. Defaults to 10.
+            max_retries (int, optional): Connection level retries. Defaults to 0.
+            pool_block (bool, optional): Wait for a free pooled connection instead of opening a new one. Defaults to False.
+            cache (ResponseCache, optional): libs.cache.ResponseCache used by generic_get. Writes invalidate the affected entries.
+            policy (RequestPolicy, optional): libs.policy.RequestPolicy with timeouts, retries and rate limit. Defaults to RequestPolicy().
             
         """
         
@@ -25,9 +39,18 @@ class Ndfc(object):
 
         LOG.info("A new NDI Instance is being started")
         # Attribute initialization
+        self._session = build_session(pool_maxsize=pool_maxsize, max_retries=max_retries, pool_block=pool_block)
         self._address = address
         self._url = "https://%s//appcenter/cisco/ndfc/api/v1/lan-fabric/rest/" % address
         self._token = None
+        self._cookie = None
+        self._cache = cache
+        self._policy = policy or RequestPolicy()
+        self._token_timeout = None
+        self._token_relogins = 0
+        self._token_lock = threading.Lock()
+        self._login_failures = 0
+        self._login_retry_at = 0
         self._credentials = credentials
         if api_key:
             # API KEY TAKES PRECEDENCE
@@ -40,9 +63,21 @@ class Ndfc(object):
             self.token = None
             self.get_nd_token(self.credentials)
 
-    def __str__():
+    def __str__(self):
         return "This is an NDI object"
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Closes all the pooled connections towards NDFC
+        """
+        LOG.debug(f"Closing NDFC handle on {self.address}")
+        self._session.close()
+
     @property
     def address(self):
         """Get credentials"""
@@ -70,8 +105,10 @@ class Ndfc(object):
 
     @cookie.setter
     def cookie(self, value):
-        """Set the cookie"""
+        """Set the cookie. It is shared by every call made through the session"""
         self._cookie = value
+        if value:
+            set_cookies(self._session, value)
 
     @property
     def token(self):
@@ -80,8 +117,35 @@ class Ndfc(object):
 
     @token.setter
     def token(self, value):
-        """Set the token"""
+        """Set the token. Headers are shared by every call made through the session"""
         self._token = value
+        if value:
+            self._session.headers.update(value)
+
+    @property
+    def token_timeout(self):
+        """Get token_timeout, the JWT expiry as epoch"""
+        return self._token_timeout
+
+    @token_timeout.setter
+    def token_timeout(self, value):
+        """Set the token_timeout"""
+        self._token_timeout = value
+
+    @property
+    def cache(self):
+        """Get the response cache"""
+        return self._cache
+
+    @property
+    def policy(self):
+        """Get the request policy"""
+        return self._policy
+
+    @property
+    def token_relogins(self):
+        """Number of times the handle had to authenticate again"""
+        return self._token_relogins
 
     @property
     def url(self):
@@ -96,30 +160,194 @@ class Ndfc(object):
     def get_nd_token(self, credentials):
         """
         To be used in case you want to authenticate with user credentials. Token received will be
-        used as cookie. No Cookie refresh yet.
-        TODO: Add Cookie refresh feature
+        used as cookie. The JWT expiry is tracked so the handle can authenticate again before it expires.
         :param credentials:
         :return:  Bool()
         """
         auth_url = "https://%s/login" % self.address
         LOG.debug(f"Running Auth query at {auth_url}")
-        auth_result = requests.post(auth_url, json=credentials, verify=False)
+        auth_result = self._request("POST", auth_url, json=credentials)
 
         if auth_result.status_code == 200:
-            self.cookie = {"AuthCookie": auth_result.json()["jwttoken"]}
+            jwt = auth_result.json()["jwttoken"]
+            self.cookie = {"AuthCookie": jwt}
+            self.token_timeout = self._jwt_expiry(jwt)
             LOG.info(f"Authentication succeded")
         else:
             LOG.error(f"Authentication failed, {auth_result.status_code}, {auth_result.text}")
             return  False
         return True
 
+    @staticmethod
+    def _jwt_expiry(jwt:str) -> int:
+        """Reads the exp claim of a JWT. Signature is not verified, the value is only used to plan re-authentication
+
+        Args:
+            jwt (str): the token returned by the login
+
+        Returns:
+            int: expiry as epoch, None if it can't be read
+        """
+        try:
+            payload = jwt.split(".")[1]
+            payload += "=" * (-len(payload) % 4)
+            return int(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+        except (IndexError, ValueError, KeyError, TypeError):
+            LOG.warning("Unable to read the JWT expiry, relying on 401 answers to re-authenticate")
+            return None
+
+    def _uses_jwt(self) -> bool:
+        """True if the handle authenticates with credentials rather than with an API key"""
+        return bool(self.credentials) and not self.token
+
+    def check_token_validity(self) -> bool:
+        """Authenticates again when the JWT expires in less than 60 seconds.
+        Only one thread logs in, the others sharing the handle wait for it and reuse the new cookie.
+
+        Returns:
+            bool: False if the re-authentication failed
+        """
+        if not self._uses_jwt() or not self.token_timeout or self.token_timeout - time.time() > 60:
+            return True
+        with self._token_lock:
+            if self.token_timeout - time.time() > 60:
+                return True
+            LOG.info("JWT about to expire, authenticating again")
+            return self._login()
+
+    def _login(self) -> bool:
+        """Logs in again, called holding the token lock. A failed login is not attempted again before 5 seconds,
+        doubled on every consecutive failure up to 5 minutes, so an unreachable NDFC is not sent a login by every
+        call once the JWT expired
+
+        Returns:
+            bool: True if the login succeeded
+        """
+        if time.monotonic() < self._login_retry_at:
+            LOG.debug("Skipping the login, the previous one failed too recently")
+            return False
+        self._token_relogins += 1
+        logged_in = False
+        try:
+            logged_in = self.get_nd_token(self.credentials)
+            return logged_in
+        finally:
+            if logged_in:
+                self._login_failures = 0
+                self._login_retry_at = 0
+            else:
+                self._login_failures += 1
+                delay = min(5 * 2 ** (self._login_failures - 1), 300)
+                self._login_retry_at = time.monotonic() + delay
+                LOG.warning(f"Login to {self.address} failed, next attempt in {delay}s at the earliest")
+
+    def _reauthenticate(self, rejected_cookie:dict) -> bool:
+        """Called when NDFC answers 401. Threads that got rejected with the same cookie trigger a single login.
+
+        Args:
+            rejected_cookie (dict): the cookie used by the rejected call
+
+        Returns:
+            bool: True if the call can be retried
+        """
+        with self._token_lock:
+            if self.cookie != rejected_cookie:
+                return True
+            LOG.info("JWT rejected, authenticating again")
+            return self._login()
+
+    @staticmethod
+    def _file_positions(files) -> list:
+        """Where the streams of a requests files argument start, to rewind them before sending them again
+
+        Args:
+            files: dict or list of (field, value), value being a file, a string or a tuple (filename, file, ...)
+
+        Returns:
+            list: (stream, position) pairs, None if a stream can't be rewound
+        """
+        positions = []
+        for _, value in (files.items() if isinstance(files, dict) else files or []):
+            stream = value[1] if isinstance(value, (tuple, list)) else value
+            if isinstance(stream, (str, bytes)):
+                continue
+            try:
+                positions.append((stream, stream.tell()))
+            except (AttributeError, OSError):
+                return None
+        return positions
+
+    def _authenticated_request(self, method:str, url:str, **kwargs):
+        """Same as _request, but keeps the JWT valid and retries once after re-authenticating on 401.
+        Uploaded files are rewound before the retry, a request with a stream that can't be rewound is not retried
+
+        Args:
+            method (str): HTTP method
+            url (str): full URL
+
+        Returns:
+            requests.Response: the raw answer
+        """
+        self.check_token_validity()
+        cookie = self.cookie
+        positions = self._file_positions(kwargs.get("files"))
+        result = self._request(method, url, **kwargs)
+        if result.status_code == 401 and self._uses_jwt() and self._reauthenticate(cookie):
+            if positions is None:
+                LOG.warning(f"{method} to {url} rejected, its upload can't be sent again")
+                return result
+            for stream, position in positions:
+                stream.seek(position)
+            LOG.debug(f"Retrying {method} to {url} after re-authentication")
+            result = self._request(method, url, **kwargs)
+        return result
+
+    def _request(self, method:str, url:str, **kwargs):
+        """Every HTTP call towards NDFC goes through here so it reuses the pooled session and applies the request policy
+
+        Args:
+            method (str): HTTP method
+            url (str): full URL
+
+        Returns:
+            requests.Response: the raw answer
+        """
+        return self._policy.send(self._session.request, method, url, **kwargs)
+
+    def _invalidate_cache(self, uri_object:str):
+        """Drops the cached answers a write may have changed: the written resource, its ancestors and
+        descendants. A write below a fabric, e.g. control/fabrics/{fabric}/config-deploy, covers the whole
+        fabric subtree, the other fabrics are kept. Answers outside the written tree, e.g. interface/detail
+        after a deploy, are only refreshed once their TTL expires
+
+        Args:
+            uri_object (str): the URI written to
+        """
+        if not self._cache:
+            return
+        segments = normalize(uri_object).split("?")[0].split("/")
+        if "fabrics" in segments[:-1]:
+            segments = segments[:segments.index("fabrics") + 2]
+        path = "/".join(segments)
+
+        def affected(key):
+            key_path = key.split("?")[0]
+            return key_path == path or key_path.startswith(path + "/") or path.startswith(key_path + "/")
+
+        self._cache.invalidate(affected)
+
     def generic_get(self, uri_object):
         """
-        Get any data
+        Get any data. Answers are served from the cache, if any, while fresh. The raw answer is cached and
+        decoded on every call, so callers never share the returned objects
         """
         url = "%s/%s" % (self.url, uri_object)
         LOG.debug(f"GET URL:{url}")
-        result = requests.get(url, verify=False, cookies=self.cookie, headers=self.token)
+        if self._cache:
+            result = self._cache.get(uri_object, lambda: self._authenticated_request("GET", url),
+                                     valid=lambda result: 199 < result.status_code < 300)
+        else:
+            result = self._authenticated_request("GET", url)
         if 199 < result.status_code < 300:
             LOG.debug(f"GET to {url} completed")
             return True, result.json()
@@ -133,7 +361,8 @@ class Ndfc(object):
         """
         url = "%s/%s" % (self.url, uri_object)
         LOG.debug(f"POST URL:{url}")
-        result = requests.post(url, verify=False, cookies=self.cookie, headers=self.token, json=payload, files=files)
+        result = self._authenticated_request("POST", url, json=payload, files=files)
+        self._invalidate_cache(uri_object)
         if 199 < result.status_code < 300:
             LOG.debug(f"POST to {url} completed")
             return True, result.json()
@@ -149,7 +378,8 @@ class Ndfc(object):
         """
         url = "%s/%s" % (self.url, uri_object)
         LOG.debug(f"DELETE URL:{url}")
-        result = requests.delete(url, verify=False, cookies=self.cookie, headers=self.token)
+        result = self._authenticated_request("DELETE", url)
+        self._invalidate_cache(uri_object)
         if 199 < result.status_code < 300:
             LOG.debug(f"DELETE to {url} completed")
             return True, result.json()
@@ -205,6 +435,44 @@ class Ndfc(object):
         else:
             return(data)
         
+    def get_all_interfaces_by_fabric(self, fabric:str, max_workers:int=8):
+        """Retrieves the interfaces of every node in a fabric, querying the nodes concurrently.
+        A node failing does not stop the collection of the others.
+
+        Args:
+            fabric (str): NDFC Fabric Name
+            max_workers (int, optional): Max number of nodes queried at the same time. Keep it within pool_maxsize. Defaults to 8.
+
+        Yields:
+            dict: One per node, as soon as it completes:
+                {"node": switch dict, "interfaces": list or False, "latency": seconds, "error": None or reason}
+                Closing the generator early cancels the queries not started yet.
+        """
+        nodes = self.get_all_nodes_by_fabric(fabric)
+        if not nodes:
+            LOG.error(f"Unable to retrieve the nodes of fabric {fabric}")
+            return
+
+        def get_node_interfaces(node):
+            start = time.perf_counter()
+            try:
+                interfaces = self.get_all_interfaces_by_node(node["serialNumber"])
+                error = None if interfaces is not False else "interface query failed"
+            except requests.exceptions.RequestException as e:
+                interfaces, error = False, str(e)
+            return {"node": node, "interfaces": interfaces, "latency": time.perf_counter() - start, "error": error}
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            for future in as_completed([executor.submit(get_node_interfaces, node) for node in nodes]):
+                result = future.result()
+                if result["error"]:
+                    LOG.warning(f"Node {result['node']['serialNumber']} of fabric {fabric} failed: {result['error']}")
+                yield result
+        finally:
+            # A caller stopping early, e.g. breaking out of the loop, drops the nodes not queried yet
+            executor.shutdown(wait=False, cancel_futures=True)
+
     def get_all_vrfs_by_fabric(self, fabric:str)-> list:
         """Retrieves a list of node discovered by the NDFC Cluster
 
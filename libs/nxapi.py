@@ -3,28 +3,55 @@
 import json
 import logging
 import requests
+from collections import namedtuple
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
+from .session import build_session
+from .policy import RequestPolicy
+from .jsonstream import iter_items
 
 LOG = logging.getLogger("__name__")
 
+# Outcome of one command of show_commands. body is None and error the reason when the command failed
+CommandResult = namedtuple("CommandResult", ["command", "body", "error"])
+
 
 class Nexus_api(object):
 
-	def __init__(self, address:str, credentials:dict):
+	def __init__(self, address:str, credentials:dict, pool_maxsize:int =10, max_retries:int =0, pool_block:bool =False,
+				policy:RequestPolicy =None):
 		"""Creates an handler to make API calls towards an NX-OS switch
 
 		Args:
 			address (str): IP Address or FQDN
 			credentials (dict): username and password in a dictionary {"username":"","password":""}
+			pool_maxsize (int, optional): Max number of keep-alive connections towards the switch. Defaults to 10.
+			max_retries (int, optional): Connection level retries. Defaults to 0.
+			pool_block (bool, optional): Wait for a free pooled connection instead of opening a new one. Defaults to False.
+			policy (RequestPolicy, optional): timeouts, retries and rate limit. Defaults to RequestPolicy().
 		"""
 		requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 		LOG.debug("Creating a new NXAPI handle on %s address" % address)
 
 		# Attribute initialization
+		self._session = build_session(pool_maxsize=pool_maxsize, max_retries=max_retries, pool_block=pool_block)
+		self._session.headers.update({'content-type':'application/json'})
 		self._address = address
 		self._url = f"https://{address}/ins"
-		self._credentials = credentials
-		
+		self._policy = policy or RequestPolicy()
+		self._credentials = None
+		self.credentials = credentials
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def close(self):
+		"""Closes all the pooled connections towards the switch
+		"""
+		LOG.debug("Closing NXAPI handle on %s address" % self.address)
+		self._session.close()
 
 	@property
 	def address(self):
@@ -43,8 +70,14 @@ class Nexus_api(object):
 
 	@credentials.setter
 	def credentials(self, value):
-		"""Set the credentials"""
+		"""Set the credentials. Basic auth is shared by every call made through the session"""
 		self._credentials = value
+		self._session.auth = (value["username"], value["password"])
+
+	@property
+	def policy(self):
+		"""Get the request policy"""
+		return self._policy
 
 	@property
 	def url(self):
@@ -56,16 +89,34 @@ class Nexus_api(object):
 		"""Set the url"""
 		self._url = value
 
-	def show_command(self, command:str) -> dict:
+	def _request(self, method:str, url:str, **kwargs) -> requests.Response:
+		"""Every HTTP call towards the switch goes through here so it reuses the pooled session and applies the
+		request policy
+
+		Args:
+			method (str): HTTP method
+			url (str): full URL
+		Returns:
+			requests.Response: the raw answer
+		"""
+		return self._policy.send(self._session.request, method, url, **kwargs)
+
+	def show_command(self, command:str, chunked:bool =False) -> dict:
 		""" This function takes a series of commands and pushes them to the device
 
 		Args:
 			commands (str): show command
+			chunked (bool, optional): fetch the output in NX-API chunk mode, for outputs too large for a single
+				answer, see show_command_chunks. Defaults to False.
 		Returns:
-			bool: API Call Result
+			bool: API Call Result. False as well when a chunk failed or the chunks did not end with eoc
 		"""
-		myheaders={'content-type':'application/json'}
-
+		if chunked:
+			try:
+				return json.loads("".join(self.show_command_chunks(command)))
+			except ValueError as e:
+				LOG.error("Chunked %s failed: %s" % (command, e))
+				return False
 		payload={
 		  "ins_api": {
 		    "version": "1.0",
@@ -76,13 +127,131 @@ class Nexus_api(object):
 		    "output_format": "json",
 		  }
 		}
-		response = requests.post(self.url,data=json.dumps(payload), headers=myheaders,auth=(
-			self.credentials["username"],self.credentials["password"]),verify=False).json()
+		response = self._request("POST", self.url, data=json.dumps(payload)).json()
 		if not response["ins_api"]["outputs"]["output"]["code"] == "200":
 			return False
 		else:
 			return response["ins_api"]["outputs"]["output"]["body"]
 
+	def show_command_chunks(self, command:str):
+		""" Runs a show command in NX-API chunk mode: the switch splits the json output in pieces of text, each one
+		fetched with its own request carrying the sid returned by the previous one, until the sid is eoc.
+
+		Args:
+			command (str): a single show command
+		Yields:
+			str: the pieces of the json output, in order
+		Raises:
+			ValueError: a chunk failed or was not valid json, or an answer had no sid before eoc, the output is
+				incomplete
+		"""
+		sid = "sid"
+		while True:
+			payload={
+			  "ins_api": {
+			    "version": "1.0",
+			    "type": "cli_show",
+			    "chunk": "1",
+			    "sid": sid,
+			    "input": command,
+			    "output_format": "json",
+			  }
+			}
+			response = self._request("POST", self.url, data=json.dumps(payload)).json()
+			output = response["ins_api"]["outputs"]["output"]
+			if not output["code"] == "200":
+				raise ValueError("chunk failed: %s %s" % (output["code"],
+														(output.get("clierror") or output.get("msg") or "").strip()))
+			body = output.get("body", "")
+			# Outputs fitting in one answer may come back already decoded
+			yield body if isinstance(body, str) else json.dumps(body)
+			sid = response["ins_api"].get("sid")
+			if sid == "eoc":
+				return
+			if not sid:
+				raise ValueError("answer without sid before eoc, the output is truncated")
+
+	def show_command_stream(self, command:str, rows:str):
+		""" Runs a show command in chunk mode and yields the rows of its output as they arrive, decoding the json
+		incrementally so memory does not grow with the size of the output.
+		Example:
+		for route in switch.show_command_stream("show ip route vrf all", "ROW_prefix"):
+			print(route["ipprefix"])
+
+		Args:
+			command (str): a single show command
+			rows (str): key of the rows to yield, e.g. ROW_prefix. The rows of every table with that key are
+				yielded, like the prefixes of every VRF
+		Yields:
+			dict: one row at a time
+		Raises:
+			ValueError: the output failed or is incomplete, see show_command_chunks
+		"""
+		return iter_items(self.show_command_chunks(command), rows, every=True)
+
+	def show_commands(self, commands:list, max_commands:int =10, timeout=None) -> dict:
+		""" Runs many show commands with as few requests as possible: commands are sent max_commands at a time,
+		separated by " ;" in a single cli_show input, and every output is mapped back to its command.
+
+		Args:
+			commands (list): show commands. Duplicates are run once
+			max_commands (int, optional): commands per request, NX-API accepts up to 10 show commands at once.
+				Defaults to 10.
+			timeout (float or tuple, optional): requests timeout of every request, overriding the policy one.
+		Returns:
+			dict: {command: CommandResult} in the order of commands. A command failing does not affect the others
+		"""
+		commands = list(dict.fromkeys(command.strip() for command in commands))
+		results = {}
+		for start in range(0, len(commands), max_commands):
+			for result in self._show_batch(commands[start:start + max_commands], timeout):
+				results[result.command] = result
+		return results
+
+	def _show_batch(self, commands:list, timeout=None) -> list:
+		"""One cli_show request carrying every command
+
+		Args:
+			commands (list): at most 10 show commands
+			timeout (float or tuple, optional): requests timeout, overriding the policy one
+		Returns:
+			list: one CommandResult per command
+		"""
+		payload={
+		  "ins_api": {
+		    "version": "1.0",
+		    "type": "cli_show",
+		    "chunk": "0",
+		    "sid": "sid",
+		    "input": " ;".join(commands),
+		    "output_format": "json",
+		  }
+		}
+		kwargs = {"timeout": timeout} if timeout is not None else {}
+		response = self._request("POST", self.url, data=json.dumps(payload), **kwargs)
+		try:
+			outputs = response.json()["ins_api"]["outputs"]["output"]
+		except (ValueError, KeyError, TypeError):
+			error = "HTTP %s: %s" % (response.status_code, response.text[:200])
+			LOG.warning("Batch of %s show commands failed, %s" % (len(commands), error))
+			return [CommandResult(command, None, error) for command in commands]
+		# A single command gets an object instead of a list
+		if isinstance(outputs, dict):
+			outputs = [outputs]
+		results = []
+		for index, command in enumerate(commands):
+			if index >= len(outputs):
+				results.append(CommandResult(command, None, "not executed"))
+				continue
+			output = outputs[index]
+			if output.get("code") == "200":
+				results.append(CommandResult(command, output.get("body"), None))
+				continue
+			error = "%s %s" % (output.get("code"), (output.get("clierror") or output.get("msg") or "").strip())
+			LOG.debug("Command %s failed: %s" % (command, error))
+			results.append(CommandResult(command, None, error))
+		return results
+
 	def push_config(self, commands:str, rollback:str ="rollback-on-error") -> bool:
 		""" This function takes a series of commands and pushes them to the device
 
@@ -94,8 +263,6 @@ class Nexus_api(object):
 		Returns:
 			bool: True if all the commands have been executed, False if any of them failed. Result is decoupled from the rollback option.
 		"""
-		myheaders={'content-type':'application/json'}
-
 		payload={
 		  "ins_api": {
 		    "version": "1.0",
@@ -107,8 +274,7 @@ class Nexus_api(object):
 		    "rollback": rollback
 		  }
 		}
-		response = requests.post(self.url,data=json.dumps(payload), headers=myheaders,auth=(
-			self.credentials["username"],self.credentials["password"]),verify=False).json()
+		response = self._request("POST", self.url, data=json.dumps(payload)).json()
 		for command_response in response["ins_api"]["outputs"]["output"]:
 			if not command_response["msg"] == "Success":
 				return False
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+import time
+import logging
+import threading
+import requests
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .nxapi import Nexus_api
+from .policy import RequestPolicy
+
+LOG = logging.getLogger("__name__")
+
+# Outcome of the commands on one switch. outputs is {command: body}, a failed command is None there and its reason
+# is in errors {command: reason}. latency is the seconds spent on the switch
+DeviceResult = namedtuple("DeviceResult", ["address", "outputs", "errors", "latency"])
+
+
+class Fleet(object):
+	"""
+	Runs show commands on many NX-OS switches in parallel, one Nexus_api handle per switch kept across runs.
+	Commands are sent up to max_commands per request. Every switch has timeout seconds for all its commands: each
+	request gets the time left as read timeout, and batches not started by then are reported as failed.
+	Results are yielded as soon as a switch is done.
+	Usage:
+	with Fleet(["10.0.0.1", "10.0.0.2"]) as fleet:
+		results = []
+		for result in fleet.run(["show version", "show interface brief"]):
+			print(result.address, result.errors or result.outputs)
+			results.append(result)
+		print(summarize(results))
+	"""
+
+	def __init__(self, addresses, credentials:dict =None, max_workers:int =32, timeout:float =30,
+				policy:RequestPolicy =None, max_commands:int =10):
+		"""
+		Args:
+			addresses (list): switch IP addresses or FQDNs
+			credentials (dict, optional): {"username": "", "password": ""}. Defaults to
+				libs.variables.device_credentials.
+			max_workers (int, optional): switches queried at the same time. Defaults to 32.
+			timeout (float, optional): seconds each switch has for all the commands of a run. Defaults to 30.
+			policy (RequestPolicy, optional): shared by the handles. Defaults to timeout as read timeout, 5 seconds
+				to connect and no retries, a switch that does not answer is not worth waiting for twice.
+			max_commands (int, optional): commands sent in one request, see Nexus_api.show_commands. Defaults to 10.
+		"""
+		self._addresses = list(dict.fromkeys(addresses))
+		self._credentials = credentials
+		self._timeout = timeout
+		self._max_commands = max_commands
+		self._policy = policy or RequestPolicy(connect_timeout=min(5, timeout), read_timeout=timeout, retries=0)
+		self._handles = {}
+		self._lock = threading.Lock()
+		self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="nxapi")
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def __len__(self):
+		return len(self._addresses)
+
+	@property
+	def addresses(self) -> list:
+		"""Get the switch addresses"""
+		return list(self._addresses)
+
+	@property
+	def policy(self) -> RequestPolicy:
+		"""Get the request policy of the handles, e.g. to add an instrumentation hook"""
+		return self._policy
+
+	def close(self):
+		"""Closes the connections towards every switch. Switches not started yet are dropped, the running ones
+		are waited for, at most timeout seconds, so no handle is closed under a worker"""
+		self._executor.shutdown(wait=True, cancel_futures=True)
+		with self._lock:
+			for handle in self._handles.values():
+				handle.close()
+			self._handles.clear()
+
+	def handle(self, address:str) -> Nexus_api:
+		"""Get the handle of a switch, created on first use"""
+		with self._lock:
+			handle = self._handles.get(address)
+			if handle is None:
+				credentials = self._credentials or _variables().device_credentials
+				# Commands of a switch run one after the other, one connection is enough
+				handle = self._handles[address] = Nexus_api(address, credentials, pool_maxsize=1, policy=self._policy)
+			return handle
+
+	def _run_device(self, address:str, commands:list) -> DeviceResult:
+		"""Worker body, never raises. Commands are sent in batches, see Nexus_api.show_commands"""
+		start = time.perf_counter()
+		deadline = start + self._timeout
+		outputs, errors = dict.fromkeys(commands), {}
+		unreachable = None
+		for index in range(0, len(commands), self._max_commands):
+			batch = commands[index:index + self._max_commands]
+			remaining = deadline - time.perf_counter()
+			if unreachable or remaining <= 0:
+				# A switch that did not answer or ran out of time gets no more requests
+				errors.update(dict.fromkeys(batch, unreachable or "timeout after %ss" % self._timeout))
+				continue
+			connect_timeout, read_timeout = self._policy.timeout
+			try:
+				results = self.handle(address).show_commands(
+					batch, self._max_commands, timeout=(min(connect_timeout, remaining), min(read_timeout, remaining)))
+			except requests.exceptions.RequestException as e:
+				unreachable = str(e) or e.__class__.__name__
+				errors.update(dict.fromkeys(batch, unreachable))
+				continue
+			except Exception as e:
+				errors.update(dict.fromkeys(batch, str(e) or e.__class__.__name__))
+				continue
+			for command, result in results.items():
+				if result.error:
+					errors[command] = result.error
+				else:
+					outputs[command] = result.body
+		if errors:
+			LOG.warning("Switch %s: %s of %s commands failed" % (address, len(errors), len(commands)))
+		return DeviceResult(address, outputs, errors, time.perf_counter() - start)
+
+	def run(self, commands, addresses:list =None):
+		"""Runs show commands on every switch in parallel
+
+		Args:
+			commands (list): show commands, or a single one
+			addresses (list, optional): subset of the switches. Defaults to all of them.
+
+		Yields:
+			DeviceResult: one per switch, in completion order
+		"""
+		if isinstance(commands, str):
+			commands = [commands]
+		commands = list(dict.fromkeys(command.strip() for command in commands))
+		futures = [self._executor.submit(self._run_device, address, commands)
+					for address in (addresses or self._addresses)]
+		try:
+			for future in as_completed(futures):
+				yield future.result()
+		finally:
+			# The consumer stopped early, switches not started yet are dropped
+			for future in futures:
+				future.cancel()
+
+	def run_all(self, commands, addresses:list =None) -> dict:
+		"""run() collected in a dictionary {address: DeviceResult}"""
+		return {result.address: result for result in self.run(commands, addresses)}
+
+
+def summarize(results) -> dict:
+	"""Aggregates the DeviceResult of a run
+
+	Args:
+		results (iterable): DeviceResult
+
+	Returns:
+		dict: devices, succeeded and failed counts, failures {address: errors}, latency min, p50, p95 and max in
+			seconds, and the 5 slowest switches
+	"""
+	results = list(results)
+	latencies = sorted(result.latency for result in results)
+
+	def percentile(q):
+		return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else None
+
+	failures = {result.address: result.errors for result in results if result.errors}
+	return {"devices": len(results), "succeeded": len(results) - len(failures), "failed": len(failures),
+			"failures": failures,
+			"latency": {"min": latencies[0] if latencies else None, "p50": percentile(0.5), "p95": percentile(0.95),
+						"max": latencies[-1] if latencies else None},
+			"slowest": [(result.address, result.latency)
+						for result in sorted(results, key=lambda result: result.latency, reverse=True)[:5]]}
+
+
+def _variables():
+	"""libs.variables is only needed, and imported, when no credentials are given"""
+	from . import variables
+	return variables
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+import time
+import random
+import logging
+import threading
+import email.utils
+from urllib.parse import urlparse
+import requests
+from requests.packages.urllib3.exceptions import NewConnectionError
+
+LOG = logging.getLogger("__name__")
+
+
+def _not_sent(error:requests.exceptions.ConnectionError) -> bool:
+	"""True when the connection could not be opened, so the controller can't have seen the request"""
+	if isinstance(error, requests.exceptions.ConnectTimeout):
+		return True
+	reason = getattr(error.args[0], "reason", None) if error.args else None
+	return isinstance(reason, NewConnectionError)
+
+
+class TokenBucket(object):
+	"""Thread safe token bucket: rate requests per second on average, bursts of up to burst requests"""
+
+	def __init__(self, rate:float, burst:int =None):
+		"""
+		Args:
+			rate (float): tokens added per second
+			burst (int, optional): bucket size. Defaults to one second worth of tokens.
+		"""
+		self._rate = rate
+		self._burst = burst or max(1, int(rate))
+		self._tokens = float(self._burst)
+		self._updated = time.monotonic()
+		self._lock = threading.Lock()
+
+	def acquire(self) -> float:
+		"""Takes a token, waiting for one if the bucket is empty
+
+		Returns:
+			float: seconds waited
+		"""
+		waited = 0.0
+		while True:
+			with self._lock:
+				now = time.monotonic()
+				self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+				self._updated = now
+				if self._tokens >= 1:
+					self._tokens -= 1
+					return waited
+				delay = (1 - self._tokens) / self._rate
+			time.sleep(delay)
+			waited += delay
+
+
+class RequestPolicy(object):
+	"""
+	Timeouts, retries and rate limiting applied to every HTTP call of the API handles it is given to.
+	A policy can be shared by many handles: rate limiting is per controller (URL host), counters are global.
+	Retries:
+	- connection errors: retry_methods, plus any method when the connection could not even be opened
+	- read timeouts and retry_statuses: only retry_methods, as the controller may have applied a write
+	- 429, if in retry_statuses: any method, a throttled request is not processed
+	The delay before a retry is the Retry-After header when the controller sends one, otherwise an exponential
+	backoff with full jitter.
+	Usage:
+	policy = RequestPolicy(rate=20)
+	apic_conn = apic.Apic(variables.apic_host, policy=policy)
+	"""
+
+	def __init__(self, connect_timeout:float =5, read_timeout:float =60, retries:int =3, backoff:float =0.5,
+				max_backoff:float =30, retry_statuses=(429, 502, 503, 504), retry_methods=("GET", "HEAD"),
+				rate:float =None, burst:int =None, hooks=None):
+		"""
+		Args:
+			connect_timeout (float, optional): seconds to open a connection. Defaults to 5.
+			read_timeout (float, optional): seconds to wait for the controller between two bytes. Defaults to 60.
+			retries (int, optional): retries after the first attempt. Defaults to 3.
+			backoff (float, optional): base delay in seconds, doubled at every retry. Defaults to 0.5.
+			max_backoff (float, optional): cap of the delay, Retry-After included. Defaults to 30.
+			retry_statuses (tuple, optional): HTTP codes worth retrying. Defaults to (429, 502, 503, 504).
+			retry_methods (tuple, optional): methods retried after a read timeout or retry_statuses. Defaults to
+				("GET", "HEAD").
+			rate (float, optional): max requests per second towards each controller. Defaults to no limit.
+			burst (int, optional): requests allowed at once above rate. Defaults to one second worth.
+			hooks (list, optional): callables receiving a libs.instrumentation.RequestSample after every call,
+				see add_hook. Defaults to none.
+		"""
+		self.timeout = (connect_timeout, read_timeout)
+		self.retries = retries
+		self.backoff = backoff
+		self.max_backoff = max_backoff
+		self.retry_statuses = frozenset(retry_statuses)
+		self.retry_methods = frozenset(method.upper() for method in retry_methods)
+		self.rate = rate
+		self.burst = burst
+		self._buckets = {}
+		self._hooks = list(hooks or [])
+		self._lock = threading.Lock()
+		self._requests = 0
+		self._retries = 0
+		self._throttled = 0
+		self._rate_limited_seconds = 0.0
+
+	@property
+	def stats(self) -> dict:
+		"""Get requests, retries, throttled answers (429) and seconds spent waiting for the rate limiter"""
+		with self._lock:
+			return {"requests": self._requests, "retries": self._retries, "throttled": self._throttled,
+					"rate_limited_seconds": self._rate_limited_seconds}
+
+	def add_hook(self, hook):
+		"""Registers a callable receiving a libs.instrumentation.RequestSample after every call, e.g. Instruments.
+		Hooks run in the calling thread and must be fast, their exceptions are logged and ignored"""
+		with self._lock:
+			self._hooks.append(hook)
+
+	def remove_hook(self, hook):
+		"""Unregisters a hook"""
+		with self._lock:
+			self._hooks.remove(hook)
+
+	def _bucket(self, url:str) -> TokenBucket:
+		"""Token bucket of the controller of url"""
+		host = urlparse(url).netloc
+		with self._lock:
+			bucket = self._buckets.get(host)
+			if bucket is None:
+				bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+			return bucket
+
+	def delay(self, attempt:int, response:requests.Response =None) -> float:
+		"""Seconds to wait before retry number attempt (1 based), Retry-After wins when present"""
+		retry_after = response.headers.get("Retry-After") if response is not None else None
+		if retry_after:
+			try:
+				return min(max(float(retry_after), 0), self.max_backoff)
+			except ValueError:
+				pass
+			try:
+				moment = email.utils.parsedate_to_datetime(retry_after)
+				return min(max(moment.timestamp() - time.time(), 0), self.max_backoff)
+			except (TypeError, ValueError):
+				LOG.debug("Ignoring invalid Retry-After %s" % retry_after)
+		return random.uniform(0, min(self.backoff * 2 ** (attempt - 1), self.max_backoff))
+
+	def send(self, send, method:str, url:str, **kwargs) -> requests.Response:
+		"""Calls send(method, url, **kwargs) with the timeouts, retries and rate limit of the policy
+
+		Args:
+			send (callable): e.g. a requests Session request method
+			method (str): HTTP method
+			url (str): full URL
+			kwargs: passed to send. An explicit timeout wins over the policy one
+
+		Returns:
+			requests.Response: the last answer. Exceptions are raised once retries are exhausted
+		"""
+		if not self._hooks:
+			return self._send(send, method, url, [0], **kwargs)
+		start = time.perf_counter()
+		attempts = [0]
+		response = error = None
+		try:
+			response = self._send(send, method, url, attempts, **kwargs)
+			return response
+		except Exception as e:
+			error = e.__class__.__name__
+			raise
+		finally:
+			self._emit(method, url, response, error, attempts[0], time.perf_counter() - start, kwargs.get("stream"))
+
+	def _emit(self, method:str, url:str, response, error, retries:int, elapsed:float, stream:bool):
+		"""Builds the RequestSample of a call and hands it to the hooks"""
+		# Imported here, libs.instrumentation imports the influx writer which the policy does not need otherwise
+		from .instrumentation import RequestSample
+		timings = {"dns": None, "connect": None, "tls": None, "ttfb": None}
+		size = None
+		if response is not None:
+			timings.update(getattr(response.raw, "timings", None) or {})
+			if stream or response.raw is None:
+				size = int(response.headers.get("Content-Length", 0)) or None
+			else:
+				size = len(response.content)
+		timings["total"] = elapsed
+		sample = RequestSample(urlparse(url).netloc, method.upper(), url,
+								response.status_code if response is not None else None, size, timings, retries, error)
+		for hook in list(self._hooks):
+			try:
+				hook(sample)
+			except Exception:
+				LOG.exception("Request hook failed")
+
+	def _send(self, send, method:str, url:str, attempts:list, **kwargs) -> requests.Response:
+		"""send without the hooks. attempts[0] is set to the number of retries done"""
+		kwargs.setdefault("timeout", self.timeout)
+		method = method.upper()
+		bucket = self._bucket(url) if self.rate else None
+		for attempt in range(self.retries + 1):
+			attempts[0] = attempt
+			if attempt:
+				with self._lock:
+					self._retries += 1
+			if bucket:
+				waited = bucket.acquire()
+				if waited:
+					with self._lock:
+						self._rate_limited_seconds += waited
+			with self._lock:
+				self._requests += 1
+			last = attempt == self.retries
+			try:
+				response = send(method, url, **kwargs)
+			except requests.exceptions.ConnectionError as e:
+				if last or (method not in self.retry_methods and not _not_sent(e)):
+					raise
+				LOG.warning("%s %s failed: %s, retrying" % (method, url, e))
+				time.sleep(self.delay(attempt + 1))
+				continue
+			except requests.exceptions.Timeout as e:
+				if last or method not in self.retry_methods:
+					raise
+				LOG.warning("%s %s timed out: %s, retrying" % (method, url, e))
+				time.sleep(self.delay(attempt + 1))
+				continue
+			if response.status_code == 429:
+				with self._lock:
+					self._throttled += 1
+			retryable = response.status_code in self.retry_statuses and (
+				response.status_code == 429 or method in self.retry_methods)
+			if last or not retryable:
+				return response
+			delay = self.delay(attempt + 1, response)
+			LOG.warning("%s %s answered %s, retrying in %.2fs" % (method, url, response.status_code, delay))
+			# Release the connection before sleeping, a streamed answer would keep it busy
+			response.close()
+			time.sleep(delay)
+		return response
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+LOG = logging.getLogger("__name__")
+
+
+class _Job(object):
+	"""A scheduled function and its counters"""
+
+	def __init__(self, name, function, interval, jitter, args, kwargs):
+		self.name = name
+		self.function = function
+		self.interval = interval
+		self.jitter = jitter
+		self.args = args
+		self.kwargs = kwargs
+		self.base = time.monotonic()
+		self.next_run = self.base + self._jitter()
+		self.future = None
+		self.runs = 0
+		self.failures = 0
+		self.skipped = 0
+		self.last_duration = None
+		self.last_error = None
+
+	def _jitter(self) -> float:
+		return random.uniform(0, self.jitter * self.interval)
+
+	def reschedule(self, now:float):
+		"""Next run one interval after the previous slot, not after the previous run, so jobs don't drift"""
+		self.base += self.interval
+		if self.base < now:
+			# The scheduler fell behind, restart from now instead of firing the missed slots in a row
+			self.base = now
+		self.next_run = self.base + self._jitter()
+
+
+class Scheduler(object):
+	"""
+	Runs jobs at fixed intervals on a shared thread pool.
+	Every run is delayed by a random jitter so jobs with the same interval do not hit the controllers together.
+	A job is never run twice at the same time: if its previous run is still going when it is due, the slot is skipped.
+	Usage:
+	scheduler = Scheduler(max_workers=4)
+	scheduler.add_job("health", collect_health, 30)
+	scheduler.run_forever()
+	"""
+
+	def __init__(self, max_workers:int =4):
+		"""
+		Args:
+			max_workers (int, optional): jobs running at the same time. Defaults to 4.
+		"""
+		self._max_workers = max_workers
+		self._jobs = {}
+		self._lock = threading.Lock()
+		self._wakeup = threading.Event()
+		self._stopping = threading.Event()
+		self._executor = None
+		self._thread = None
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.stop()
+
+	@property
+	def stats(self) -> dict:
+		"""Get per job counters, {name: {"runs", "failures", "skipped", "last_duration", "last_error", "running"}}"""
+		with self._lock:
+			return {name: {"runs": job.runs, "failures": job.failures, "skipped": job.skipped,
+							"last_duration": job.last_duration, "last_error": job.last_error,
+							"running": bool(job.future and not job.future.done())}
+					for name, job in self._jobs.items()}
+
+	def add_job(self, name:str, function, interval:float, jitter:float =0.1, args:tuple =(), kwargs:dict =None):
+		"""Schedules a function. The first run happens within jitter * interval seconds
+
+		Args:
+			name (str): unique job name, used in logs and stats
+			function (callable): called as function(*args, **kwargs) from a worker thread
+			interval (float): seconds between two runs
+			jitter (float, optional): random delay added to every run, as a fraction of interval. Defaults to 0.1.
+			args (tuple, optional): positional arguments. Defaults to ().
+			kwargs (dict, optional): keyword arguments. Defaults to None.
+		"""
+		with self._lock:
+			if name in self._jobs:
+				raise ValueError("Job %s already exists" % name)
+			self._jobs[name] = _Job(name, function, interval, jitter, args, kwargs or {})
+		self._wakeup.set()
+
+	def remove_job(self, name:str):
+		"""Unschedules a job, a run in progress is not interrupted"""
+		with self._lock:
+			self._jobs.pop(name, None)
+
+	def start(self):
+		"""Starts the scheduler thread and the worker pool"""
+		if self._thread:
+			return
+		self._stopping.clear()
+		self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="job")
+		self._thread = threading.Thread(target=self._run, daemon=True, name="scheduler")
+		self._thread.start()
+
+	def stop(self, wait:bool =True):
+		"""Stops scheduling new runs
+
+		Args:
+			wait (bool, optional): wait for the runs in progress to complete. Defaults to True.
+		"""
+		self._stopping.set()
+		self._wakeup.set()
+		if self._thread:
+			self._thread.join()
+			self._thread = None
+		if self._executor:
+			self._executor.shutdown(wait=wait)
+			self._executor = None
+
+	def run_forever(self):
+		"""Starts the scheduler and blocks until stop() is called, e.g. from a signal handler"""
+		self.start()
+		while not self._stopping.wait(1):
+			pass
+
+	def _execute(self, job:_Job):
+		"""Worker body, one run of a job"""
+		start = time.monotonic()
+		error = None
+		try:
+			job.function(*job.args, **job.kwargs)
+		except Exception as e:
+			LOG.exception("Job %s failed" % job.name)
+			error = str(e)
+		with self._lock:
+			job.runs += 1
+			job.last_duration = time.monotonic() - start
+			job.last_error = error
+			if error is not None:
+				job.failures += 1
+		LOG.debug("Job %s ran in %.3fs" % (job.name, time.monotonic() - start))
+
+	def _run(self):
+		"""Scheduler thread body"""
+		while not self._stopping.is_set():
+			now = time.monotonic()
+			with self._lock:
+				for job in self._jobs.values():
+					if job.next_run > now:
+						continue
+					if job.future and not job.future.done():
+						job.skipped += 1
+						LOG.warning("Job %s is still running, skipping this run" % job.name)
+					else:
+						job.future = self._executor.submit(self._execute, job)
+					job.reschedule(now)
+				next_run = min((job.next_run for job in self._jobs.values()), default=now + 1)
+			self._wakeup.wait(max(0, next_run - time.monotonic()))
+			self._wakeup.clear()
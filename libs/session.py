@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+import time
+import socket
+import logging
+import ipaddress
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+from requests.packages.urllib3.connection import HTTPConnection, HTTPSConnection
+from requests.packages.urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from requests.packages.urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+LOG = logging.getLogger("__name__")
+
+
+def _is_ip(host:str) -> bool:
+	try:
+		ipaddress.ip_address(host.strip("[]"))
+		return True
+	except ValueError:
+		return False
+
+
+class _TimedConnectionMixin(object):
+	"""
+	Measures the phases of a request on the connection: dns, connect (TCP), tls and ttfb (request sent to response
+	headers). They are attached to the urllib3 answer as a timings dictionary, requests exposes it as
+	response.raw.timings. dns, connect and tls are None when a pooled connection was reused.
+	"""
+
+	_connect_timings = None
+	_sent = None
+
+	def _new_conn(self):
+		host = self._dns_host
+		dns = None
+		addresses = [host]
+		if not _is_ip(host):
+			start = time.perf_counter()
+			try:
+				# Resolve here to time DNS apart from the TCP handshake
+				addresses = list(dict.fromkeys(
+					info[4][0] for info in socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM))) or addresses
+			except socket.gaierror:
+				pass
+			dns = time.perf_counter() - start
+		start = time.perf_counter()
+		try:
+			# Every resolved address is tried in turn, like socket.create_connection does
+			for index, address in enumerate(addresses):
+				self._dns_host = address
+				try:
+					sock = super()._new_conn()
+					break
+				except (NewConnectionError, ConnectTimeoutError) as e:
+					if index == len(addresses) - 1:
+						raise
+					LOG.debug("Connection to %s (%s) failed: %s, trying the next address" % (host, address, e))
+		finally:
+			self._dns_host = host
+		self._connect_timings = {"dns": dns, "connect": time.perf_counter() - start, "tls": None}
+		return sock
+
+	def connect(self):
+		start = time.perf_counter()
+		super().connect()
+		if self._connect_timings is not None and isinstance(self, HTTPSConnection):
+			self._connect_timings["tls"] = max(time.perf_counter() - start - self._connect_timings["connect"] - (
+				self._connect_timings["dns"] or 0), 0)
+
+	def request(self, *args, **kwargs):
+		super().request(*args, **kwargs)
+		self._sent = time.perf_counter()
+
+	def getresponse(self, *args, **kwargs):
+		response = super().getresponse(*args, **kwargs)
+		timings = self._connect_timings or {"dns": None, "connect": None, "tls": None}
+		timings["ttfb"] = time.perf_counter() - self._sent if self._sent else None
+		response.timings = timings
+		self._connect_timings = None
+		self._sent = None
+		return response
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+	pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+	pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+	ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+	ConnectionCls = TimedHTTPSConnection
+
+
+def build_session(pool_maxsize:int =10, max_retries:int =0, pool_block:bool =False, verify:bool =False) -> requests.Session:
+	"""Creates a keep-alive requests Session backed by a sized urllib3 connection pool
+
+	Args:
+		pool_maxsize (int, optional): Max number of connections kept open towards the controller. Defaults to 10.
+		max_retries (int, optional): Connection level retries handled by urllib3. Defaults to 0.
+		pool_block (bool, optional): If True, callers wait for a free connection when the pool is exhausted
+			instead of opening a throw-away one. Defaults to False.
+		verify (bool, optional): TLS certificate verification. Defaults to False.
+
+	Returns:
+		requests.Session: A session to be owned by a single API handle
+	"""
+	LOG.debug("Creating a new HTTP session. Pool size: %s, retries: %s, block: %s" % (
+		pool_maxsize, max_retries, pool_block))
+	session = requests.Session()
+	adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize,
+						max_retries=Retry(total=max_retries, read=False),
+						pool_block=pool_block)
+	# Pools are created on first use, they will use the timed connections
+	adapter.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+	session.mount("https://", adapter)
+	session.mount("http://", adapter)
+	session.verify = verify
+	return session
+
+
+def set_cookies(session:requests.Session, cookies:dict):
+	"""Replaces session cookies by name, whatever domain they were stored for by a previous Set-Cookie
+
+	Args:
+		session (requests.Session): session owned by an API handle
+		cookies (dict): cookie name: value
+	"""
+	for name, value in cookies.items():
+		for cookie in [cookie for cookie in session.cookies if cookie.name == name]:
+			session.cookies.clear(cookie.domain, cookie.path, cookie.name)
+		session.cookies.set(name, value)
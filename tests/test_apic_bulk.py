@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Run from the repository root: python -m unittest discover -s tests
+"""
+
+import time
+import threading
+import unittest
+from unittest import mock
+import requests
+from libs.apic import Apic
+
+
+def _epg(name, tenant="T"):
+	return {"fvAEPg": {"attributes": {"dn": "uni/tn-%s/ap-A/epg-%s" % (tenant, name), "descr": name}}}
+
+
+def _answer(status_code, text=None):
+	body = {"imdata": [{"error": {"attributes": {"code": "103", "text": text}}}]} if text else {"imdata": []}
+	return mock.Mock(status_code=status_code, json=mock.Mock(return_value=body), text=str(body))
+
+
+class BulkPostTest(unittest.TestCase):
+
+	def setUp(self):
+		self.apic = Apic("10.0.0.1")
+		self.apic.token_timeout = int(time.time()) + 3600
+		self.addCleanup(self.apic.close)
+		self.posts = []
+		self.lock = threading.Lock()
+
+	def _stub(self, answer):
+		"""Every POST is recorded as (url relative to the API root, json body) and answered by answer(url, body)"""
+		def request(method, url, json=None, **kwargs):
+			url = url.replace(self.apic.url + "/", "")
+			with self.lock:
+				self.posts.append((url, json))
+			return answer(url, json)
+		self.apic._request = request
+
+	def test_objects_of_a_tenant_share_one_post(self):
+		self._stub(lambda url, body: _answer(200))
+		results = self.apic.api_post_bulk([_epg("E1"), _epg("E2"), _epg("E3")])
+		self.assertEqual([url for url, _ in self.posts], ["mo/uni.json"])
+		self.assertEqual([(result.dn, result.success, result.batched) for result in results],
+						[("uni/tn-T/ap-A/epg-E%s" % index, True, True) for index in range(1, 4)])
+
+	def test_rejected_batch_falls_back_to_one_post_per_object(self):
+		def answer(url, body):
+			if url == "mo/uni.json":
+				return _answer(400, "batch rejected")
+			if url.endswith("epg-E2.json"):
+				return _answer(400, "bad descr")
+			return _answer(200)
+		self._stub(answer)
+		objects = [_epg("E1"), _epg("E2"), _epg("E3")]
+		results = self.apic.api_post_bulk(objects)
+		self.assertEqual([url for url, _ in self.posts], ["mo/uni.json", "mo/uni/tn-T/ap-A/epg-E1.json",
+														"mo/uni/tn-T/ap-A/epg-E2.json", "mo/uni/tn-T/ap-A/epg-E3.json"])
+		self.assertEqual([body for _, body in self.posts[1:]], objects)
+		self.assertEqual([(result.success, result.error, result.batched) for result in results],
+						[(True, None, False), (False, "HTTP 400: bad descr", False), (True, None, False)])
+
+	def test_batches_are_cut_at_max_objects(self):
+		self._stub(lambda url, body: _answer(200))
+		results = self.apic.api_post_bulk([_epg("E%s" % index) for index in range(5)], max_objects=2)
+		self.assertEqual(len(self.posts), 3)
+		self.assertTrue(all(result.success for result in results))
+
+	def test_tenants_are_posted_separately(self):
+		self._stub(lambda url, body: _answer(400, "rejected") if "tn-U" in str(body) else _answer(200))
+		results = self.apic.api_post_bulk([_epg("E1"), _epg("E1", tenant="U"), _epg("E2")])
+		self.assertEqual([result.success for result in results], [True, False, True])
+		self.assertEqual(len(self.posts), 2)
+
+	def test_connection_error_and_missing_dn_are_reported(self):
+		def answer(url, body):
+			raise requests.exceptions.ConnectionError("Connection refused")
+		self._stub(answer)
+		results = self.apic.api_post_bulk([_epg("E1"), {"fvAEPg": {"attributes": {"name": "E2"}}}])
+		self.assertEqual([(result.success, result.error) for result in results],
+						[(False, "Connection refused"), (False, "missing dn attribute")])
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Run from the repository root: python -m unittest discover -s tests
+"""
+
+import time
+import unittest
+from unittest import mock
+import requests
+from urllib3.connection import HTTPConnection
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+from libs.apic_cluster import ApicCluster
+from libs.policy import RequestPolicy
+
+
+class FailoverTest(unittest.TestCase):
+
+	def setUp(self):
+		self.cluster = ApicCluster(["10.0.0.1", "10.0.0.2"])
+		self.calls = []
+		for member in self.cluster._members:
+			member.handle.token_timeout = int(time.time()) + 3600
+		self.addCleanup(self.cluster.close)
+
+	def _fail_first(self, error):
+		"""The first member raises error, the second one answers"""
+		first, second = self.cluster._members
+		answer = mock.Mock(status_code=200)
+
+		def failing(method, url, **kwargs):
+			self.calls.append(first.handle.address)
+			raise error
+
+		def answering(method, url, **kwargs):
+			self.calls.append(second.handle.address)
+			return answer
+
+		first.handle._request = failing
+		second.handle._request = answering
+		return answer
+
+	def test_write_reset_after_send_is_not_failed_over(self):
+		# The APIC may have applied the write before resetting the connection
+		reset = ProtocolError("Connection aborted.", ConnectionResetError(104, "Connection reset by peer"))
+		self._fail_first(requests.exceptions.ConnectionError(reset))
+		with self.assertRaises(requests.exceptions.ConnectionError):
+			self.cluster._request("POST", self.cluster.url + "/mo/uni.json", json={})
+		self.assertEqual(self.calls, ["10.0.0.1"])
+		self.assertEqual(self.cluster._members[0].failures, 1)
+
+	def test_write_not_sent_is_failed_over(self):
+		refused = NewConnectionError(HTTPConnection("10.0.0.1"), "Connection refused")
+		answer = self._fail_first(requests.exceptions.ConnectionError(MaxRetryError(None, "/", refused)))
+		self.assertIs(self.cluster._request("POST", self.cluster.url + "/mo/uni.json", json={}), answer)
+		self.assertEqual(self.calls, ["10.0.0.1", "10.0.0.2"])
+
+	def test_read_reset_is_failed_over(self):
+		reset = ProtocolError("Connection aborted.", ConnectionResetError(104, "Connection reset by peer"))
+		answer = self._fail_first(requests.exceptions.ConnectionError(reset))
+		self.assertIs(self.cluster._request("GET", self.cluster.url + "/class/fvTenant.json"), answer)
+		self.assertEqual(self.calls, ["10.0.0.1", "10.0.0.2"])
+
+
+class OptionsTest(unittest.TestCase):
+
+	def test_policy_is_the_members_request_policy(self):
+		policy = RequestPolicy(retries=0)
+		cluster = ApicCluster(["10.0.0.1", "10.0.0.2"], balancing="least_latency", policy=policy)
+		self.addCleanup(cluster.close)
+		self.assertIs(cluster.policy, policy)
+		self.assertTrue(all(member.handle.policy is policy for member in cluster._members))
+
+	def test_unknown_balancing_is_refused(self):
+		with self.assertRaises(ValueError):
+			ApicCluster(["10.0.0.1"], balancing="random")
+
+
+if __name__ == "__main__":
+	unittest.main()
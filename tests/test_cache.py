@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Run from the repository root: python -m unittest discover -s tests
+"""
+
+import threading
+import unittest
+from unittest import mock
+from libs.apic import Apic
+from libs.cache import ResponseCache
+from libs.ndfc import Ndfc
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+	def test_answer_expires_after_its_ttl(self):
+		cache = ResponseCache(default_ttl=10, ttls={"class/faultInfo": 0})
+		loads = []
+		with mock.patch("libs.cache.time.monotonic", return_value=100):
+			self.assertEqual(cache.get("class/fvTenant.json", lambda: loads.append(1) or "first"), "first")
+			self.assertEqual(cache.get("/class//fvTenant.json", lambda: "unused"), "first")
+		with mock.patch("libs.cache.time.monotonic", return_value=110):
+			self.assertEqual(cache.get("class/fvTenant.json", lambda: "second"), "second")
+		cache.get("class/faultInfo.json", lambda: "fault")
+		self.assertEqual(loads, [1])
+		self.assertEqual(cache.stats["hits"], 1)
+		self.assertEqual(cache.stats["size"], 1)
+
+	def test_least_recently_used_answer_is_evicted(self):
+		cache = ResponseCache(max_entries=2)
+		cache.get("a", lambda: "a")
+		cache.get("b", lambda: "b")
+		cache.get("a", lambda: "unused")
+		cache.get("c", lambda: "c")
+		self.assertEqual(cache.stats["evictions"], 1)
+		self.assertEqual(cache.get("a", lambda: "reloaded"), "a")
+		self.assertEqual(cache.get("b", lambda: "reloaded"), "reloaded")
+
+	def test_failures_are_not_cached(self):
+		cache = ResponseCache()
+		cache.get("a", lambda: False)
+		self.assertEqual(cache.get("a", lambda: "a"), "a")
+
+	def test_concurrent_misses_are_coalesced(self):
+		cache = ResponseCache()
+		started, release = threading.Event(), threading.Event()
+		loads, results = [], []
+
+		def loader():
+			loads.append(1)
+			started.set()
+			release.wait(5)
+			return "answer"
+
+		leader = threading.Thread(target=lambda: results.append(cache.get("class/fvTenant.json", loader)))
+		leader.start()
+		started.wait(5)
+		followers = [threading.Thread(target=lambda: results.append(cache.get("class/fvTenant.json", loader)))
+					for _ in range(3)]
+		for follower in followers:
+			follower.start()
+		while cache.stats["coalesced"] < 3:
+			threading.Event().wait(0.01)
+		release.set()
+		for thread in [leader] + followers:
+			thread.join(5)
+		self.assertEqual(loads, [1])
+		self.assertEqual(results, ["answer"] * 4)
+		self.assertEqual(cache.stats["misses"], 1)
+
+	def test_load_invalidated_in_flight_is_not_stored(self):
+		cache = ResponseCache()
+
+		def loader():
+			cache.invalidate_prefix("class/")
+			return "stale"
+
+		self.assertEqual(cache.get("class/fvTenant.json", loader), "stale")
+		self.assertEqual(cache.get("class/fvTenant.json", lambda: "fresh"), "fresh")
+
+
+class ApicInvalidationTest(unittest.TestCase):
+
+	KEYS = ["class/fvTenant.json", "class/fvBD.json?query-target-filter=eq(fvBD.name,\"bd\")", "mo/uni.json",
+			"mo/uni/tn-T.json?rsp-subtree=full", "mo/uni/tn-T/ap-A.json", "mo/uni/tn-U.json", "mo/uni/tn-T2.json",
+			"node/mo/topology/pod-1.json"]
+
+	def setUp(self):
+		self.cache = ResponseCache()
+		self.apic = Apic("10.0.0.1", cache=self.cache)
+		self.addCleanup(self.apic.close)
+		for key in self.KEYS:
+			self.cache.get(key, lambda: key)
+
+	def cached(self):
+		return [key for key in self.KEYS if self.cache.get(key, lambda: None) is not None]
+
+	def test_write_outside_mo_clears_everything(self):
+		self.apic._invalidate_cache(self.apic.url + "/node/class/fvTenant.json")
+		self.assertEqual(self.cached(), [])
+
+	def test_mo_write_drops_its_tree_and_class_queries(self):
+		self.apic._invalidate_cache(self.apic.url + "/mo/uni/tn-T.json")
+		self.assertEqual(self.cached(), ["mo/uni/tn-U.json", "mo/uni/tn-T2.json", "node/mo/topology/pod-1.json"])
+
+
+class NdfcInvalidationTest(unittest.TestCase):
+
+	KEYS = ["control/fabrics", "control/fabrics/F1", "control/fabrics/F1/inventory/switchesByFabric",
+			"control/fabrics/F2/inventory/switchesByFabric", "interface/detail?serialNumber=ABC"]
+
+	def setUp(self):
+		self.cache = ResponseCache()
+		self.ndfc = Ndfc("10.0.0.1", api_key={"api_key": "key", "username": "admin"}, cache=self.cache)
+		self.addCleanup(self.ndfc.close)
+		for key in self.KEYS:
+			self.cache.get(key, lambda: key)
+
+	def cached(self):
+		return [key for key in self.KEYS if self.cache.get(key, lambda: None) is not None]
+
+	def test_fabric_write_drops_the_fabric_subtree(self):
+		self.ndfc._invalidate_cache("control/fabrics/F1/config-deploy?forceShowRun=false")
+		self.assertEqual(self.cached(), ["control/fabrics/F2/inventory/switchesByFabric",
+										"interface/detail?serialNumber=ABC"])
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Run from the repository root: python -m unittest discover -s tests
+"""
+
+import threading
+import unittest
+from libs.influx_writer import InfluxWriter, point
+
+
+class _Client(object):
+	"""Stands for InfluxDBClient: records the batches and fails as many writes as failures. A write waits for
+	release to be set"""
+
+	def __init__(self, failures=0):
+		self.batches = []
+		self.failures = failures
+		self.release = threading.Event()
+		self.release.set()
+
+	def write_points(self, points, protocol=None, database=None, retention_policy=None):
+		self.release.wait(5)
+		if self.failures:
+			self.failures -= 1
+			raise ConnectionError("influxdb unreachable")
+		self.batches.append(list(points))
+
+
+class InfluxWriterTest(unittest.TestCase):
+
+	def test_points_are_written_in_batches(self):
+		client = _Client()
+		with InfluxWriter(client, batch_size=3) as writer:
+			self.assertEqual(writer.write_all("line %s" % index for index in range(7)), 7)
+		self.assertEqual([len(batch) for batch in client.batches], [3, 3, 1])
+		self.assertEqual(writer.metrics["points_written"], 7)
+		self.assertEqual(writer.metrics["batches_written"], 3)
+
+	def test_failed_write_is_retried(self):
+		client = _Client(failures=2)
+		with InfluxWriter(client, batch_size=2, max_retries=3, backoff=0) as writer:
+			writer.write_all(["a", "b"])
+		self.assertEqual(client.batches, [["a", "b"]])
+		self.assertEqual(writer.metrics["retries"], 2)
+		self.assertEqual(writer.metrics["points_failed"], 0)
+
+	def test_batch_failing_every_retry_is_dropped(self):
+		client = _Client(failures=3)
+		with InfluxWriter(client, batch_size=2, max_retries=2, backoff=0) as writer:
+			writer.write_all(["a", "b", "c", "d"])
+		self.assertEqual(client.batches, [["c", "d"]])
+		self.assertEqual(writer.metrics["batches_failed"], 1)
+		self.assertEqual(writer.metrics["points_failed"], 2)
+		self.assertEqual(writer.metrics["points_written"], 2)
+
+	def test_write_blocks_once_max_pending_batches_wait(self):
+		client = _Client()
+		client.release.clear()
+		writer = InfluxWriter(client, batch_size=1, max_pending=1)
+		self.addCleanup(writer.close)
+		producer = threading.Thread(target=writer.write_all, args=(["a", "b", "c"],))
+		producer.start()
+		# "a" is being written, "b" waits in the queue, "c" can't be handed over
+		producer.join(0.2)
+		self.assertTrue(producer.is_alive())
+		self.assertEqual(writer.metrics["queue_depth"], 1)
+		client.release.set()
+		producer.join(5)
+		self.assertFalse(producer.is_alive())
+		writer.join()
+		self.assertEqual(client.batches, [["a"], ["b"], ["c"]])
+
+
+class PointTest(unittest.TestCase):
+
+	def test_escaping_and_field_types(self):
+		line = point("total ports", {"node": 101, "fabric": "ACI AMS", "tenant": ""},
+					{"speed": 10, "util": 0.5, "up": True, "descr": 'to "core"', "missing": None}, 1700000000000000000)
+		self.assertEqual(line, 'total\\ ports,fabric=ACI\\ AMS,node=101 '
+								'speed=10i,util=0.5,up=true,descr="to \\"core\\"" 1700000000000000000')
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Run from the repository root: python -m unittest discover -s tests
+"""
+
+import json
+import unittest
+from unittest import mock
+from libs.jsonstream import iter_items
+from libs.nxapi import Nexus_api
+
+
+def _chunks(document, size):
+	"""document encoded and cut in pieces of size bytes"""
+	data = document.encode("utf-8")
+	return [data[index:index + size] for index in range(0, len(data), size)]
+
+
+class IterItemsTest(unittest.TestCase):
+
+	DOCUMENT = json.dumps({"totalCount": "3", "imdata": [{"fvTenant": {"attributes": {"name": "tenant-%s" % index,
+							"descr": "café à l'étage"}}} for index in range(3)] + [12345, 0.5]},
+							ensure_ascii=False)
+
+	def test_items_are_the_same_whatever_the_chunk_size(self):
+		expected = json.loads(self.DOCUMENT)["imdata"]
+		for size in (1, 2, 3, 7, 64, 100000):
+			with self.subTest(size=size):
+				self.assertEqual(list(iter_items(_chunks(self.DOCUMENT, size), "imdata")), expected)
+
+	def test_str_chunks(self):
+		self.assertEqual(list(iter_items(['{"imdata": [1', '2, 3]}'], "imdata")), [12, 3])
+
+	def test_missing_key_yields_nothing(self):
+		self.assertEqual(list(iter_items(_chunks(self.DOCUMENT, 5), "ROW_prefix")), [])
+
+	def test_object_under_key_is_yielded_as_is(self):
+		document = '{"TABLE_vrf": {"ROW_vrf": {"vrf-name-out": "default"}}}'
+		self.assertEqual(list(iter_items(_chunks(document, 4), "ROW_vrf")), [{"vrf-name-out": "default"}])
+
+	def test_every_walks_all_arrays(self):
+		vrfs = [{"TABLE_prefix": {"ROW_prefix": [{"ipprefix": "10.0.0.0/8"}]}},
+				{"TABLE_prefix": {"ROW_prefix": {"ipprefix": "0.0.0.0/0"}}}]
+		document = json.dumps({"TABLE_vrf": {"ROW_vrf": vrfs}})
+		self.assertEqual(list(iter_items(_chunks(document, 3), "ROW_prefix")), [{"ipprefix": "10.0.0.0/8"}])
+		self.assertEqual(list(iter_items(_chunks(document, 3), "ROW_prefix", every=True)),
+						[{"ipprefix": "10.0.0.0/8"}, {"ipprefix": "0.0.0.0/0"}])
+
+	def test_truncated_document_raises(self):
+		for document in ('{"imdata": [{"a": 1}, {"b": ', '{"imdata": [{"a": 1}, ', '{"imdata": [1, 2'):
+			with self.subTest(document=document):
+				with self.assertRaises(ValueError):
+					list(iter_items(_chunks(document, 4), "imdata"))
+
+	def test_large_item_is_decoded_a_few_times_only(self):
+		document = json.dumps({"imdata": [{"blob": "x" * 100000}]})
+		decode = json.JSONDecoder.raw_decode
+		with mock.patch("json.JSONDecoder.raw_decode", autospec=True, side_effect=decode) as raw_decode:
+			items = list(iter_items(_chunks(document, 100), "imdata"))
+		self.assertEqual(items, [{"blob": "x" * 100000}])
+		self.assertLess(raw_decode.call_count, 20)
+
+
+class ShowCommandStreamTest(unittest.TestCase):
+
+	def setUp(self):
+		self.switch = Nexus_api("10.0.0.1", {"username": "admin", "password": "secret"})
+		self.addCleanup(self.switch.close)
+
+	def _answers(self, *answers):
+		"""Stubs the switch with chunk mode answers, (code, body, sid) tuples"""
+		answers, self.sids = list(answers), []
+
+		def request(method, url, data=None, **kwargs):
+			self.sids.append(json.loads(data)["ins_api"]["sid"])
+			code, body, sid = answers.pop(0)
+			answer = {"ins_api": {"outputs": {"output": {"code": code, "msg": "Success", "body": body}}}}
+			if sid:
+				answer["ins_api"]["sid"] = sid
+			return mock.Mock(json=mock.Mock(return_value=answer))
+		self.switch._request = request
+
+	def test_rows_are_yielded_across_chunks(self):
+		document = json.dumps({"TABLE_vrf": {"ROW_vrf": [{"TABLE_prefix": {"ROW_prefix": [{"ipprefix": "10.0.0.0/8"},
+																						{"ipprefix": "0.0.0.0/0"}]}}]}})
+		self._answers(("200", document[:30], "1"), ("200", document[30:70], "2"), ("200", document[70:], "eoc"))
+		rows = list(self.switch.show_command_stream("show ip route vrf all", "ROW_prefix"))
+		self.assertEqual(rows, [{"ipprefix": "10.0.0.0/8"}, {"ipprefix": "0.0.0.0/0"}])
+		self.assertEqual(self.sids, ["sid", "1", "2"])
+
+	def test_failed_chunk_raises(self):
+		self._answers(("200", '{"TABLE_vrf": {"ROW_vrf": [{"TABLE_prefix": {"ROW_prefix": [', "1"),
+						("400", "", None))
+		with self.assertRaises(ValueError):
+			list(self.switch.show_command_stream("show ip route vrf all", "ROW_prefix"))
+
+	def test_answer_without_sid_before_eoc_raises(self):
+		self._answers(("200", '{"TABLE_vrf": {"ROW_vrf": [{"TABLE_prefix": {"ROW_prefix": [{"ipprefix": "0.0.0.0/0"}, ',
+						None))
+		with self.assertRaises(ValueError):
+			list(self.switch.show_command_stream("show ip route vrf all", "ROW_prefix"))
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Run from the repository root: python -m unittest discover -s tests
+"""
+
+import time
+import unittest
+from unittest import mock
+from libs.ndfc import Ndfc
+
+
+class LoginBackoffTest(unittest.TestCase):
+
+	def setUp(self):
+		self.ndfc = Ndfc("10.0.0.1")
+		self.ndfc.credentials = {"userName": "admin", "userPasswd": "secret", "domain": "DefaultAuth"}
+		self.ndfc.token_timeout = int(time.time()) + 10
+		self.addCleanup(self.ndfc.close)
+		self.logins = []
+		self.answer = mock.Mock(status_code=503, text="unavailable")
+
+		def request(method, url, **kwargs):
+			self.logins.append(url)
+			return self.answer
+		self.ndfc._request = request
+
+	def test_failed_login_is_not_retried_right_away(self):
+		for _ in range(10):
+			self.assertFalse(self.ndfc.check_token_validity())
+		self.assertEqual(len(self.logins), 1)
+
+	def test_backoff_doubles_up_to_five_minutes_and_resets_on_success(self):
+		now = 1000.0
+		with mock.patch("libs.ndfc.time.monotonic", lambda: now):
+			delays = []
+			for _ in range(8):
+				self.ndfc.check_token_validity()
+				delays.append(self.ndfc._login_retry_at - now)
+				now = self.ndfc._login_retry_at
+			self.assertEqual(delays, [5, 10, 20, 40, 80, 160, 300, 300])
+			self.answer = mock.Mock(status_code=200, json=mock.Mock(return_value={"jwttoken": "not.a-jwt"}))
+			self.assertTrue(self.ndfc.check_token_validity())
+		self.assertEqual(self.ndfc._login_failures, 0)
+		self.assertEqual(len(self.logins), 9)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Run from the repository root: python -m unittest discover -s tests
+"""
+
+import time
+import email.utils
+import unittest
+from unittest import mock
+import requests
+from urllib3.connection import HTTPConnection
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+from libs.policy import RequestPolicy, TokenBucket
+
+URL = "https://10.0.0.1/api/class/fvTenant.json"
+
+
+def _response(status_code, headers=None):
+	return mock.Mock(status_code=status_code, headers=headers or {})
+
+
+class RetryTest(unittest.TestCase):
+
+	def setUp(self):
+		self.sleeps = []
+		patcher = mock.patch("libs.policy.time.sleep", self.sleeps.append)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		self.policy = RequestPolicy(retries=2)
+
+	def _send(self, *outcomes):
+		"""A send callable returning or raising outcomes in turn, and the list of methods it was called with"""
+		outcomes, calls = list(outcomes), []
+
+		def send(method, url, **kwargs):
+			calls.append(method)
+			outcome = outcomes.pop(0)
+			if isinstance(outcome, Exception):
+				raise outcome
+			return outcome
+		return send, calls
+
+	def test_get_is_retried_on_retry_statuses(self):
+		answer = _response(200)
+		send, calls = self._send(_response(503), _response(502), answer)
+		self.assertIs(self.policy.send(send, "get", URL), answer)
+		self.assertEqual(calls, ["GET"] * 3)
+		self.assertEqual(self.policy.stats["retries"], 2)
+
+	def test_post_is_not_retried_on_retry_statuses(self):
+		failure = _response(503)
+		send, calls = self._send(failure)
+		self.assertIs(self.policy.send(send, "POST", URL), failure)
+		self.assertEqual(calls, ["POST"])
+
+	def test_post_is_retried_when_throttled(self):
+		answer = _response(200)
+		send, calls = self._send(_response(429), answer)
+		self.assertIs(self.policy.send(send, "POST", URL), answer)
+		self.assertEqual(self.policy.stats["throttled"], 1)
+
+	def test_post_reset_after_send_is_not_retried(self):
+		reset = ProtocolError("Connection aborted.", ConnectionResetError(104, "Connection reset by peer"))
+		send, calls = self._send(requests.exceptions.ConnectionError(reset))
+		with self.assertRaises(requests.exceptions.ConnectionError):
+			self.policy.send(send, "POST", URL)
+		self.assertEqual(calls, ["POST"])
+
+	def test_post_not_sent_is_retried(self):
+		refused = NewConnectionError(HTTPConnection("10.0.0.1"), "Connection refused")
+		answer = _response(200)
+		send, calls = self._send(requests.exceptions.ConnectionError(MaxRetryError(None, "/", refused)),
+								requests.exceptions.ConnectTimeout(), answer)
+		self.assertIs(self.policy.send(send, "POST", URL), answer)
+		self.assertEqual(calls, ["POST"] * 3)
+
+	def test_post_read_timeout_is_not_retried(self):
+		send, calls = self._send(requests.exceptions.ReadTimeout())
+		with self.assertRaises(requests.exceptions.ReadTimeout):
+			self.policy.send(send, "POST", URL)
+		self.assertEqual(calls, ["POST"])
+
+	def test_last_error_is_raised_once_retries_are_exhausted(self):
+		send, calls = self._send(*[requests.exceptions.ReadTimeout()] * 3)
+		with self.assertRaises(requests.exceptions.ReadTimeout):
+			self.policy.send(send, "HEAD", URL)
+		self.assertEqual(len(calls), 3)
+		self.assertEqual(len(self.sleeps), 2)
+
+
+class DelayTest(unittest.TestCase):
+
+	def setUp(self):
+		self.policy = RequestPolicy(backoff=0.5, max_backoff=30)
+
+	def test_retry_after_seconds(self):
+		self.assertEqual(self.policy.delay(1, _response(429, {"Retry-After": "7"})), 7)
+		self.assertEqual(self.policy.delay(1, _response(429, {"Retry-After": "120"})), 30)
+
+	def test_retry_after_http_date(self):
+		moment = email.utils.formatdate(time.time() + 12, usegmt=True)
+		self.assertAlmostEqual(self.policy.delay(1, _response(503, {"Retry-After": moment})), 12, delta=1.5)
+		past = email.utils.formatdate(time.time() - 60, usegmt=True)
+		self.assertEqual(self.policy.delay(1, _response(503, {"Retry-After": past})), 0)
+
+	def test_invalid_retry_after_falls_back_to_backoff(self):
+		self.assertLessEqual(self.policy.delay(1, _response(503, {"Retry-After": "soon"})), 0.5)
+
+	def test_backoff_doubles_up_to_its_cap(self):
+		with mock.patch("libs.policy.random.uniform", lambda low, high: high):
+			self.assertEqual([self.policy.delay(attempt) for attempt in range(1, 9)],
+							[0.5, 1, 2, 4, 8, 16, 30, 30])
+
+
+class TokenBucketTest(unittest.TestCase):
+
+	def setUp(self):
+		# A fake clock, rates are powers of two so the refills add up exactly
+		self.now = 1000.0
+
+		def sleep(seconds):
+			self.now += seconds
+		for name, fake in (("monotonic", lambda: self.now), ("sleep", sleep)):
+			patcher = mock.patch("libs.policy.time.%s" % name, fake)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def test_burst_then_rate(self):
+		bucket = TokenBucket(rate=4, burst=5)
+		self.assertEqual([bucket.acquire() for _ in range(5)], [0] * 5)
+		start = self.now
+		for _ in range(8):
+			self.assertEqual(bucket.acquire(), 0.25)
+		self.assertEqual(self.now - start, 2)
+
+	def test_idle_time_refills_up_to_burst(self):
+		bucket = TokenBucket(rate=2, burst=3)
+		for _ in range(3):
+			bucket.acquire()
+		self.now += 60
+		self.assertEqual([bucket.acquire() for _ in range(3)], [0] * 3)
+		self.assertEqual(bucket.acquire(), 0.5)
+
+	def test_policy_paces_each_controller(self):
+		policy = RequestPolicy(rate=4, burst=1)
+		send = mock.Mock(return_value=_response(200))
+		for _ in range(3):
+			policy.send(send, "GET", URL)
+			policy.send(send, "GET", "https://10.0.0.2/api/class/fvTenant.json")
+		# Each controller has its own bucket, the wait for one refills the other
+		self.assertEqual(policy.stats["rate_limited_seconds"], 0.5)
+
+
+if __name__ == "__main__":
+	unittest.main()